@@ -2,6 +2,7 @@ import os
 import sys
 import threading
 import io
+import tempfile
 # Disable all CrewAI telemetry and tracing
 os.environ['CREWAI_TRACING'] = 'false'
 os.environ['CREWAI_DISABLE_TELEMETRY'] = 'true'
@@ -30,25 +31,32 @@ sys.stdin = None
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
-from src.legal_agent.brand_legal_crew import ContentCreatorLegalCrew
-from src.legal_agent.legal_crew import LegalAgent
-import pdfplumber
-from datetime import date, datetime, timedelta
+from flask import Flask, Request, render_template, request, jsonify, redirect, url_for, session
+from src.legal_agent.delivery import (
+    send_summary_email, send_summary_text, send_calendar_invites, calendar_delivery_status,
+    calendar_api_enabled, calendar_file_enabled
+)
+from src.legal_agent.ics import render_ics, count_events
+from src.legal_agent.pipeline import (
+    CREW_TIMEOUT, run_crew_with_timeout, extract_company_name, process_job, record_delivery
+)
+from src.legal_agent import metrics
+from src.legal_agent.logs import setup_logging
+from src.legal_agent.admission import AdmissionRejected, admitted
+from src.legal_agent.coordination import COORDINATION_RETRY_AFTER, coordinator, reserve_submission
+from src.legal_agent.scheduling import estimate_job
+from src.legal_agent.store import ResultStore, SUMMARY, DELIVERABLES
+from src.legal_agent.uploads import (
+    MAX_UPLOAD_BYTES, MAX_UPLOAD_MB, UPLOAD_SPOOL_THRESHOLD, UploadRejected, check_pdf, memory_accounting
+)
+from src.legal_agent.worker import worker_health
 import time
 
 from werkzeug.security import check_password_hash
 import secrets
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import markdown2
-import re
 import json
-import pytz
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+
+setup_logging()
 
 # Patch CrewAI's tracing after import - more aggressive version
 try:
@@ -68,10 +76,23 @@ try:
 except Exception as e:
     print(f"Note: Could not patch CrewAI tracing: {e}")
 
+class SpoolingRequest(Request):
+    """Keeps small uploads in memory and spools anything over UPLOAD_SPOOL_THRESHOLD to disk."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_THRESHOLD, mode="rb+")
+
+
 app = Flask(__name__)
+app.request_class = SpoolingRequest
+# Larger requests are answered with 413 before the body is read
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
 # Use a fixed secret key for session consistency, but ensure it changes in production
 app.secret_key = os.getenv("SECRET_KEY") or "dev-secret-key-change-in-production"
 
+# "inline" runs the crew inside the web worker; "queue" hands uploads to the crew worker pool
+CREW_EXECUTION = os.getenv("CREW_EXECUTION", "inline")
+
 # Load hashed password
 APP_PASSWORD_HASH = os.getenv("APP_PASSWORD_HASH")
 if not APP_PASSWORD_HASH:
@@ -85,259 +106,11 @@ def before_request():
     """Initialize session with default values if they don't exist"""
     if 'mode' not in session:
         session['mode'] = 'legal'  # Default mode
+    if 'sid' not in session:
+        session['sid'] = secrets.token_hex(16)  # Identifies the session for admission control
     # Ensure session is saved
     session.modified = True
 
-# -------------------------
-# Email Functions
-# -------------------------
-def send_summary_email(recipient: str, subject: str, summary_file: str):
-    sender_email = os.getenv("SENDER_EMAIL")
-    sender_password = os.getenv("EMAIL_PASSWORD")
-    
-    if not sender_email or not sender_password:
-        raise RuntimeError("Missing email credentials")
-    
-    with open(summary_file, "r", encoding="utf-8") as f:
-        summary_text = f.read()
-
-    summary_text = summary_text.strip()
-    if summary_text.startswith("```"):
-        summary_text = summary_text[summary_text.find("\n")+1:]
-    if summary_text.endswith("```"):
-        summary_text = summary_text[:summary_text.rfind("\n")]
-
-    msg = MIMEMultipart("alternative")
-    msg["From"] = sender_email
-    msg["To"] = recipient
-    msg["Subject"] = subject
-
-    full_body = f"{summary_text}\n\n"
-    html_body = markdown2.markdown(full_body)
-    plain_part = MIMEText(full_body, "plain")
-    html_part = MIMEText(html_body, "html")
-    
-    msg.attach(plain_part)
-    msg.attach(html_part)
-    
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-        server.login(sender_email, sender_password)
-        server.send_message(msg)
-
-    return f"✅ Email successfully sent to {recipient}"
-
-def extract_company_name(contract_text: str) -> str:
-    patterns = [
-        r"between\s+(.*?)\s+(?:and|&)",
-        r"by and between\s+(.*?)\s+(?:and|&)",
-        r"entered into by\s+(.*?)\s+(?:and|&)",
-        r"Agreement is made between\s+(.*?)\s+(?:and|&)",
-        r"This Agreement is made by\s+(.*?)\s+(?:and|&)",
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, contract_text, flags=re.IGNORECASE)
-        if match:
-            possible_name = match.group(1).strip()
-            if len(possible_name.split()) <= 6 and not possible_name.lower().startswith("the influencer"):
-                return possible_name.replace('"', '').replace("'", "")
-    
-    company_match = re.search(r"\b([A-Z][A-Za-z0-9&,\.\s]+(?:Inc\.|LLC|Ltd\.|Corporation|Company))\b", contract_text)
-    if company_match:
-        return company_match.group(1).strip()
-
-    return ""
-
-# -------------------------
-# Calendar Functions
-# -------------------------
-# -------------------------
-# Calendar Functions
-# -------------------------
-def send_calendar_invites(user_email: str) -> str:
-    """Send calendar invites for deliverables with time handling."""
-    try:
-        if not os.path.exists('calendar_deliverables.json'):
-            return "No calendar deliverables found."
-        
-        with open('calendar_deliverables.json', 'r') as f:
-            deliverables = json.load(f)
-        
-        if not deliverables:
-            return "No deliverables to process."
-        
-        # Get Google Calendar credentials
-        token_json_str = os.getenv('GOOGLE_CALENDAR_TOKEN_JSON')
-        if not token_json_str:
-            return "Calendar not configured."
-        
-        token_data = json.loads(token_json_str)
-        creds = Credentials.from_authorized_user_info(token_data, ['https://www.googleapis.com/auth/calendar'])
-        
-        # Refresh token if needed
-        if not creds.valid and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        
-        service = build('calendar', 'v3', credentials=creds)
-        
-        results = []
-        created_count = 0
-        existing_count = 0
-        
-        for deliverable in deliverables:
-            result = create_calendar_event(service, deliverable, user_email)
-            if "created" in result.lower():
-                created_count += 1
-            elif "exists" in result.lower():
-                existing_count += 1
-            results.append(result)
-        
-        summary = f"Calendar invites: {created_count} created, {existing_count} existing"
-        print(f"📅 Calendar results: {results}")
-        return summary
-        
-    except Exception as e:
-        return f"Calendar error: {str(e)}"
-
-def create_calendar_event(service, deliverable: dict, user_email: str) -> str:
-    """Create a calendar event with time handling and timezone conversion."""
-    try:
-        summary = deliverable.get('summary', '')
-        description = deliverable.get('description', '')
-        start_date = deliverable.get('start_date', '')
-        start_time = deliverable.get('start_time')
-        timezone_str = deliverable.get('timezone')
-        
-        if not all([summary, start_date]):
-            return f"Skipped: Missing data for {summary}"
-        
-        # Parse the base date
-        start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-        pst = pytz.timezone('America/Los_Angeles')
-        
-        # Determine if this is an all-day event or timed event
-        if start_time and start_time != 'null':
-            # Timed event - parse time and handle timezone conversion
-            event_config = create_timed_event(start_dt, start_time, timezone_str, pst)
-            event_type = "timed"
-        else:
-            # All-day event
-            event_config = create_all_day_event(start_dt)
-            event_type = "all-day"
-        
-        # Check for existing events
-        if event_type == "timed":
-            time_min = (event_config['start_dt'] - timedelta(hours=2)).isoformat()
-            time_max = (event_config['start_dt'] + timedelta(hours=4)).isoformat()
-        else:
-            time_min = start_dt.isoformat() + 'Z'
-            time_max = (start_dt + timedelta(days=1)).isoformat() + 'Z'
-        
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=time_min,
-            timeMax=time_max,
-            q=summary[:20],
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
-        
-        for event in events:
-            existing_summary = event.get('summary', '').lower()
-            if f"📋 {summary}".lower() in existing_summary:
-                return f"Exists: {summary} on {start_date}"
-        
-        # Create the event
-        event = {
-            "summary": f"📋 {summary}",
-            "description": f"Contract Deliverable\n\n{description}",
-            "reminders": {"useDefault": True},
-            "attendees": [{"email": user_email}],
-        }
-        
-        # Add start/end based on event type
-        event.update(event_config['event_times'])
-        
-        created_event = service.events().insert(
-            calendarId="primary",
-            body=event,
-            sendUpdates="all"
-        ).execute()
-        
-        return f"Created {event_type}: {summary} on {start_date} {start_time or ''}".strip()
-        
-    except Exception as e:
-        return f"Error with {summary}: {str(e)}"
-
-def create_timed_event(start_dt, start_time, original_timezone, target_timezone):
-    """Create configuration for a timed event with timezone conversion."""
-    # Parse the time
-    time_obj = datetime.strptime(start_time, '%H:%M').time()
-    combined_dt = datetime.combine(start_dt, time_obj)
-    
-    # Apply original timezone if specified, otherwise assume it's already in target timezone
-    if original_timezone and original_timezone != 'null':
-        original_tz = convert_timezone_string(original_timezone)
-        if original_tz:
-            combined_dt = original_tz.localize(combined_dt)
-            # Convert to target timezone
-            combined_dt = combined_dt.astimezone(target_timezone)
-        else:
-            # If timezone not recognized, assume target timezone
-            combined_dt = target_timezone.localize(combined_dt)
-    else:
-        # No original timezone specified, assume target timezone
-        combined_dt = target_timezone.localize(combined_dt)
-    
-    end_dt = combined_dt + timedelta(hours=1)
-    
-    return {
-        'start_dt': combined_dt,
-        'event_times': {
-            "start": {"dateTime": combined_dt.isoformat(), "timeZone": "America/Los_Angeles"},
-            "end": {"dateTime": end_dt.isoformat(), "timeZone": "America/Los_Angeles"},
-        }
-    }
-
-def create_all_day_event(start_dt):
-    """Create configuration for an all-day event."""
-    return {
-        'start_dt': start_dt,
-        'event_times': {
-            "start": {"date": start_dt.strftime('%Y-%m-%d')},
-            "end": {"date": (start_dt + timedelta(days=1)).strftime('%Y-%m-%d')},
-        }
-    }
-
-def convert_timezone_string(tz_string):
-    """Convert common timezone abbreviations to pytz timezone objects."""
-    tz_mapping = {
-        'PST': 'America/Los_Angeles',
-        'PDT': 'America/Los_Angeles',
-        'PT': 'America/Los_Angeles',
-        'EST': 'America/New_York', 
-        'EDT': 'America/New_York',
-        'ET': 'America/New_York',
-        'CST': 'America/Chicago',
-        'CDT': 'America/Chicago',
-        'CT': 'America/Chicago',
-        'MST': 'America/Denver',
-        'MDT': 'America/Denver',
-        'MT': 'America/Denver',
-        'UTC': 'UTC',
-        'GMT': 'GMT'
-    }
-    
-    tz_string_upper = tz_string.upper().strip()
-    if tz_string_upper in tz_mapping:
-        try:
-            return pytz.timezone(tz_mapping[tz_string_upper])
-        except:
-            return None
-    return None
-
 # -------------------------
 # Authentication helpers
 # -------------------------
@@ -350,6 +123,19 @@ def login_required(fn):
         return fn(*args, **kwargs)
     return wrapper
 
+def login_or_bearer_required(fn):
+    """Like login_required, but also lets scrapers send the app password as a bearer token."""
+    from functools import wraps
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if session.get("logged_in"):
+            return fn(*args, **kwargs)
+        auth_header = request.headers.get("Authorization", "")
+        if auth_header.startswith("Bearer ") and check_password_hash(APP_PASSWORD_HASH, auth_header[len("Bearer "):]):
+            return fn(*args, **kwargs)
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    return wrapper
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
@@ -393,27 +179,17 @@ def get_mode():
     """Get the current mode - useful for page reloads"""
     return jsonify({"mode": session.get("mode", "legal")})
 
-# --- Configuration ---
-CREW_TIMEOUT = 15 * 60
-
-def run_crew_with_timeout(crew, inputs, timeout=CREW_TIMEOUT):
-    result_container = [None]
-    def target():
-        try:
-            result_container[0] = crew.kickoff(inputs=inputs)
-        except Exception as e:
-            result_container[0] = e
-
-    thread = threading.Thread(target=target)
-    thread.start()
-    thread.join(timeout)
-    if thread.is_alive():
-        raise TimeoutError("⏰ Crew run exceeded 15 minutes. Aborting.")
-    return result_container[0]
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"success": False, "message": f"File too large. The limit is {MAX_UPLOAD_MB:g} MB."}), 413
 
 @app.route("/upload", methods=["POST"])
 @login_required
 def upload():
+    with memory_accounting("upload"):
+        return _upload()
+
+def _upload():
     mode = session.get("mode", "legal")
     contract_file = request.files.get("contract")
     user_email = request.form.get("user_email")
@@ -421,53 +197,149 @@ def upload():
     if not contract_file or not user_email:
         return jsonify({"success": False, "message": "Missing file or email"}), 400
 
+    # Invalid and duplicate uploads are answered before admission, so they don't spend the user's tokens
     try:
-        with pdfplumber.open(contract_file.stream) as pdf:
-            contract_text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-        
-        company_name = extract_company_name(contract_text)
-        print(f"🧾 Detected company name: {company_name}")
-
-        today = date.today()
-        subject_line = f"Contract Summary Report - {today} - {company_name}" if company_name else f"Contract Summary Report - {today}"
+        check_pdf(contract_file.stream)
+    except UploadRejected as e:
+        return jsonify({"success": False, "message": str(e)}), e.status_code
 
-        if mode == "creator":
-            print("🎬 Using Content Creator Legal Agent crew")
-            crew = ContentCreatorLegalCrew().crew()
-        else:
-            print("⚖️ Using Base Legal Agent crew")
-            crew = LegalAgent().crew()
+    result_store = ResultStore()
+    coordination = coordinator()
+    try:
+        job_id, existing = reserve_submission(result_store, user_email, mode, contract_file.stream, coordination)
+    except OSError as e:
+        # A remote coordination server that is down or unreachable (URLError is an OSError)
+        print(f"⚠️ Coordination store unavailable: {e}")
+        response = jsonify({"success": False,
+                            "message": "The review service is temporarily unavailable. Please try again shortly.",
+                            "retry_after": COORDINATION_RETRY_AFTER})
+        response.headers["Retry-After"] = str(COORDINATION_RETRY_AFTER)
+        return response, 503
+    if existing:
+        return jsonify({
+            "success": True,
+            "message": f"This contract is already being reviewed. The summary will be emailed to {user_email}.",
+            "job_id": existing,
+            "duplicate": True,
+        }), 202
+
+    queue_depth = result_store.queue_depth() if CREW_EXECUTION == "queue" else 0
+    try:
+        with admitted(session["sid"], user_email, queue_depth):
+            return _review_upload(result_store, mode, contract_file, user_email, coordination, job_id)
+    except AdmissionRejected as e:
+        # Nothing will run under this id
+        coordination.release_submission(job_id)
+        response = jsonify({"success": False, "message": str(e), "retry_after": e.retry_after})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, e.status_code
+
+def _review_upload(result_store, mode, contract_file, user_email, coordination, job_id):
+    metrics.UPLOADS.inc(mode=mode, execution=CREW_EXECUTION)
+    if CREW_EXECUTION == "queue":
+        try:
+            estimate = estimate_job(contract_file.stream, mode)
+            result_store.create_job(user_email, mode, contract_file.stream, status="queued", estimate=estimate,
+                                    job_id=job_id)
+        except Exception:
+            # No job will ever finish under this id, so don't hold the PDF's key until it expires
+            coordination.release_submission(job_id)
+            raise
+        print(f"📥 Queued job {job_id}")
+        return jsonify({
+            "success": True,
+            "message": f"Contract queued for review. The summary will be emailed to {user_email}.",
+            "job_id": job_id,
+        }), 202
 
-        result = run_crew_with_timeout(
-            crew,
-            inputs={"user_email": user_email, "contract_text": contract_text},
-            timeout=CREW_TIMEOUT
-        )
+    try:
+        result_store.create_job(user_email, mode, contract_file.stream, job_id=job_id)
+        payload = process_job(job_id, result_store)
+    finally:
+        coordination.release_submission(job_id)
+    return jsonify(payload), (200 if payload["success"] else 422 if payload.get("rejected") else 500)
 
-        print("✅ Crew completed with result:", result)
+@app.route("/workers/health", methods=["GET"])
+@login_required
+def workers_health():
+    """Heartbeats and capacity of the crew worker pool."""
+    health = worker_health()
+    health["execution"] = CREW_EXECUTION
+    return jsonify(health)
+
+@app.route("/metrics", methods=["GET"])
+@login_or_bearer_required
+def metrics_endpoint():
+    """Prometheus scrape endpoint, aggregated across all local processes."""
+    body = metrics.render_latest({
+        "legal_agent_queue_depth": ("Jobs waiting for a crew worker.", ResultStore().queue_depth()),
+    })
+    return app.response_class(body, mimetype="text/plain; version=0.0.4; charset=utf-8")
 
+# -------------------------
+# History API
+# -------------------------
+@app.route("/history", methods=["GET"])
+@login_required
+def history():
+    """Paginated list of processed contracts, newest first."""
+    page = request.args.get("page", 1, type=int)
+    per_page = request.args.get("per_page", 20, type=int)
+    user_email = request.args.get("user_email")
+    return jsonify(ResultStore().list_jobs(page=page, per_page=per_page, user_email=user_email))
+
+@app.route("/history/<job_id>", methods=["GET"])
+@login_required
+def history_detail(job_id):
+    """A single job with its stored outputs and delivery attempts."""
+    result_store = ResultStore()
+    job = result_store.get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+    job["summary"] = result_store.get_output(job_id, SUMMARY)
+    return jsonify(job)
+
+@app.route("/history/<job_id>/resend", methods=["POST"])
+@login_required
+def resend(job_id):
+    """Deliver a stored report again without re-running the crew."""
+    result_store = ResultStore()
+    job = result_store.get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+
+    summary = result_store.get_output(job_id, SUMMARY)
+    if summary is None:
+        return jsonify({"success": False, "message": "No stored summary for this job"}), 409
+
+    payload = request.get_json(silent=True) or request.form
+    recipient = payload.get("user_email") or job["user_email"]
+
+    deliverables = None
+    deliverables_json = result_store.get_output(job_id, DELIVERABLES)
+    if job["mode"] == "creator" and deliverables_json:
         try:
-            # Send email summary
-            summary_file = "contract_summary.md"
-            send_summary_email(user_email, subject_line, summary_file)
-            
-            # Send calendar invites (only for creator mode)
-            calendar_result = ""
-            if mode == "creator":
-                calendar_result = send_calendar_invites(user_email)
-                print(f"📅 Calendar result: {calendar_result}")
-            
-            message = f"Contract processed! Check your email ({user_email})."
-            if calendar_result:
-                message += f" {calendar_result}"
-                
-            return jsonify({"success": True, "message": message})
-            
-        except Exception as e:
-            return jsonify({"success": False, "message": f"Error: {str(e)}"}), 500
-
+            deliverables = json.loads(deliverables_json)
+        except json.JSONDecodeError as e:
+            print(f"Note: stored deliverables for {job_id} are not valid JSON: {e}")
+    calendar_ics = (render_ics(deliverables, recipient, job["company_name"])
+                    if deliverables and calendar_file_enabled() else None)
+    try:
+        send_summary_text(recipient, job["subject"], summary, calendar_ics)
+        record_delivery(result_store, job_id, "email", "resent", recipient)
     except Exception as e:
-        return jsonify({"success": False, "message": f"Crew Error: {str(e)}"}), 500
+        record_delivery(result_store, job_id, "email", "failed", str(e))
+        return jsonify({"success": False, "message": f"Error: {str(e)}"}), 500
+
+    message = f"Report re-sent to {recipient}."
+    if calendar_ics:
+        message += f" Calendar file attached: {count_events(calendar_ics)} deliverables."
+    if deliverables and calendar_api_enabled() and payload.get("calendar") in (True, "true", "1"):
+        calendar_result = send_calendar_invites(recipient, deliverables)
+        record_delivery(result_store, job_id, "calendar", calendar_delivery_status(calendar_result), calendar_result)
+        message += f" {calendar_result}"
+
+    return jsonify({"success": True, "message": message})
 
 # if __name__ == "__main__":
 #     app.run(debug=True)
@@ -0,0 +1,223 @@
+"""
+Async serving mode.
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+
+Serves the same routes as app.py. The review path (/login, /set_mode, /get_mode
+and /upload) runs on the event loop, and the summary email and Calendar
+invites use non-blocking clients (see async_pipeline.py). The crew itself
+still runs in a thread of the loop's default executor, so the number of
+reviews in flight per process is bounded by ASYNC_CREW_CONCURRENCY. Every
+other route (history, metrics, worker health) is the Flask app mounted
+underneath through a2wsgi. Sessions use Flask's signed cookie, so the two
+halves share a login.
+"""
+
+import asyncio
+import secrets
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, JSONResponse, RedirectResponse
+from starlette.routing import Mount, Route
+from werkzeug.security import check_password_hash
+
+from app import app as flask_app, APP_PASSWORD_HASH, CREW_EXECUTION
+from flask import render_template
+from src.legal_agent import metrics
+from src.legal_agent.admission import AdmissionController, AdmissionRejected
+from src.legal_agent.async_pipeline import process_job_async
+from src.legal_agent.coordination import COORDINATION_RETRY_AFTER, CoordinationStore, coordinator, reserve_submission
+from src.legal_agent.scheduling import estimate_job
+from src.legal_agent.store import ResultStore
+from src.legal_agent.uploads import MAX_UPLOAD_BYTES, MAX_UPLOAD_MB, UploadRejected, check_pdf, memory_accounting
+
+SESSION_COOKIE = flask_app.config["SESSION_COOKIE_NAME"]
+_session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+
+
+# -------------------------
+# Sessions (Flask-compatible)
+# -------------------------
+def load_session(request: Request) -> dict:
+    cookie = request.cookies.get(SESSION_COOKIE)
+    session = {}
+    if cookie:
+        try:
+            session = dict(_session_serializer.loads(
+                cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds())
+            ))
+        except BadSignature:
+            session = {}
+    session.setdefault("mode", "legal")  # Default mode
+    return session
+
+
+def save_session(response, session: dict):
+    response.set_cookie(SESSION_COOKIE, _session_serializer.dumps(session), httponly=True, samesite="lax")
+    return response
+
+
+def render(request: Request, template: str, status_code: int = 200, **context) -> HTMLResponse:
+    # Render through Flask so url_for() in the templates keeps working
+    with flask_app.test_request_context(base_url=str(request.base_url)):
+        return HTMLResponse(render_template(template, **context), status_code=status_code)
+
+
+def login_required(fn):
+    from functools import wraps
+    @wraps(fn)
+    async def wrapper(request: Request):
+        session = load_session(request)
+        if not session.get("logged_in"):
+            return RedirectResponse(f"/login?next={request.url.path}", status_code=302)
+        return await fn(request, session)
+    return wrapper
+
+
+# -------------------------
+# Routes
+# -------------------------
+async def login(request: Request):
+    if request.method == "POST":
+        form = await request.form()
+        password = form.get("password", "")
+        if check_password_hash(APP_PASSWORD_HASH, password):
+            next_url = request.query_params.get("next") or "/"
+            response = RedirectResponse(next_url, status_code=302)
+            return save_session(response, {"logged_in": True, "mode": "legal", "sid": secrets.token_hex(16)})
+        return render(request, "login.html", status_code=403, error="Invalid password")
+    return render(request, "login.html")
+
+
+async def logout(request: Request):
+    response = RedirectResponse("/login", status_code=302)
+    response.delete_cookie(SESSION_COOKIE)
+    return response
+
+
+@login_required
+async def index(request: Request, session: dict):
+    return render(request, "index.html")
+
+
+@login_required
+async def set_mode(request: Request, session: dict):
+    mode = request.path_params["mode"]
+    if mode not in ["legal", "creator"]:
+        return JSONResponse({"success": False, "message": "Invalid mode"}, status_code=400)
+    session["mode"] = mode
+    print(f"🔄 Switched mode to: {mode}")
+    return save_session(JSONResponse({"success": True, "mode": mode}), session)
+
+
+@login_required
+async def get_mode(request: Request, session: dict):
+    """Get the current mode - useful for page reloads"""
+    return JSONResponse({"mode": session.get("mode", "legal")})
+
+
+@login_required
+async def upload(request: Request, session: dict):
+    new_session = "sid" not in session
+    session.setdefault("sid", secrets.token_hex(16))  # Identifies the session for admission control
+    with memory_accounting("upload"):
+        response = await _upload(request, session)
+    return save_session(response, session) if new_session else response
+
+
+async def _upload(request: Request, session: dict):
+    mode = session.get("mode", "legal")
+    if int(request.headers.get("content-length") or 0) > MAX_UPLOAD_BYTES:
+        return JSONResponse({"success": False, "message": f"File too large. The limit is {MAX_UPLOAD_MB:g} MB."},
+                            status_code=413)
+
+    # Starlette spools uploaded files over 1 MB to disk
+    form = await request.form()
+    contract_file = form.get("contract")
+    user_email = form.get("user_email")
+
+    if not contract_file or not user_email or isinstance(contract_file, str):
+        return JSONResponse({"success": False, "message": "Missing file or email"}, status_code=400)
+
+    # Invalid and duplicate uploads are answered before admission, so they don't spend the user's tokens
+    contract_pdf = contract_file.file
+    try:
+        await asyncio.to_thread(check_pdf, contract_pdf)
+    except UploadRejected as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=e.status_code)
+
+    result_store = ResultStore()
+    coordination = coordinator()
+    try:
+        job_id, existing = await asyncio.to_thread(reserve_submission, result_store, user_email, mode, contract_pdf,
+                                                   coordination)
+    except OSError as e:
+        # A remote coordination server that is down or unreachable (URLError is an OSError)
+        print(f"⚠️ Coordination store unavailable: {e}")
+        return JSONResponse({"success": False,
+                             "message": "The review service is temporarily unavailable. Please try again shortly.",
+                             "retry_after": COORDINATION_RETRY_AFTER},
+                            status_code=503, headers={"Retry-After": str(COORDINATION_RETRY_AFTER)})
+    if existing:
+        return JSONResponse({
+            "success": True,
+            "message": f"This contract is already being reviewed. The summary will be emailed to {user_email}.",
+            "job_id": existing,
+            "duplicate": True,
+        }, status_code=202)
+
+    controller = AdmissionController()
+    queue_depth = await asyncio.to_thread(result_store.queue_depth) if CREW_EXECUTION == "queue" else 0
+    try:
+        lease = await asyncio.to_thread(controller.admit, session["sid"], user_email, queue_depth)
+    except AdmissionRejected as e:
+        # Nothing will run under this id
+        await asyncio.to_thread(coordination.release_submission, job_id)
+        return JSONResponse({"success": False, "message": str(e), "retry_after": e.retry_after},
+                            status_code=e.status_code, headers={"Retry-After": str(e.retry_after)})
+    try:
+        return await _review_upload(result_store, mode, contract_pdf, user_email, coordination, job_id)
+    finally:
+        await asyncio.to_thread(controller.release, lease)
+
+
+async def _review_upload(result_store: ResultStore, mode: str, contract_pdf, user_email: str,
+                         coordination: CoordinationStore, job_id: str):
+    metrics.UPLOADS.inc(mode=mode, execution=f"{CREW_EXECUTION}-async")
+    if CREW_EXECUTION == "queue":
+        try:
+            estimate = await asyncio.to_thread(estimate_job, contract_pdf, mode)
+            await asyncio.to_thread(result_store.create_job, user_email, mode, contract_pdf, "queued", estimate,
+                                    job_id)
+        except Exception:
+            # No job will ever finish under this id, so don't hold the PDF's key until it expires
+            await asyncio.to_thread(coordination.release_submission, job_id)
+            raise
+        print(f"📥 Queued job {job_id}")
+        return JSONResponse({
+            "success": True,
+            "message": f"Contract queued for review. The summary will be emailed to {user_email}.",
+            "job_id": job_id,
+        }, status_code=202)
+
+    try:
+        await asyncio.to_thread(result_store.create_job, user_email, mode, contract_pdf, job_id=job_id)
+        payload = await process_job_async(job_id, result_store)
+    finally:
+        await asyncio.to_thread(coordination.release_submission, job_id)
+    return JSONResponse(payload, status_code=200 if payload["success"] else 422 if payload.get("rejected") else 500)
+
+
+app = Starlette(routes=[
+    Route("/login", login, methods=["GET", "POST"], name="login"),
+    Route("/logout", logout, name="logout"),
+    Route("/", index, name="index"),
+    Route("/set_mode/{mode}", set_mode, methods=["POST"]),
+    Route("/get_mode", get_mode, methods=["GET"]),
+    Route("/upload", upload, methods=["POST"]),
+    # Static files, history, metrics and worker health are served by the Flask app
+    Mount("/", app=WSGIMiddleware(flask_app)),
+])
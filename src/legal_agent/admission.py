@@ -0,0 +1,175 @@
+"""
+Admission control for /upload.
+
+Every upload starts a crew run of up to 15 minutes. Before any of that
+happens, an upload needs a lease from the AdmissionController. The checks,
+in order:
+
+    queue length     at most ADMIT_MAX_QUEUE jobs waiting for a worker (queue mode)
+    global cap       at most ADMIT_MAX_GLOBAL reviews running at once
+    session cap      at most ADMIT_MAX_PER_SESSION reviews per login session
+    token bucket     ADMIT_BURST uploads per user, refilled at ADMIT_RATE_PER_HOUR
+
+A refused upload raises AdmissionRejected. The routes turn that into a 429
+with a Retry-After header. The routes only ask for a lease once the upload
+has passed check_pdf and is not a duplicate of a job in flight, so rejected
+files and repeated uploads never spend a token.
+
+Leases and buckets live in a small SQLite database under DATA_DIR, and every
+decision runs in one immediate transaction. The limits therefore hold across
+gunicorn workers and the ASGI process on the same host. A lease is released
+when the upload request ends. In queue mode that is as soon as the job is
+queued, so the worker pool size bounds concurrency there, and the queue
+length and the buckets bound the backlog. Leases left behind by a crashed
+process expire after ADMIT_LEASE_TTL.
+"""
+
+import math
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+
+from src.legal_agent import metrics
+from src.legal_agent.store import DATA_DIR
+
+ADMISSION_DB = os.path.join(DATA_DIR, "admission.db")
+ADMIT_MAX_GLOBAL = int(os.getenv("ADMIT_MAX_GLOBAL", "8"))
+ADMIT_MAX_PER_SESSION = int(os.getenv("ADMIT_MAX_PER_SESSION", "1"))
+ADMIT_MAX_QUEUE = int(os.getenv("ADMIT_MAX_QUEUE", "20"))
+ADMIT_BURST = float(os.getenv("ADMIT_BURST", "3"))
+ADMIT_RATE_PER_HOUR = float(os.getenv("ADMIT_RATE_PER_HOUR", "10"))
+# Rough duration of one review, used to estimate Retry-After
+ADMIT_JOB_SECONDS = float(os.getenv("ADMIT_JOB_SECONDS", "180"))
+ADMIT_LEASE_TTL = float(os.getenv("ADMIT_LEASE_TTL", str(20 * 60)))
+
+
+class AdmissionRejected(Exception):
+    """An upload refused by admission control; carries the Retry-After delay in seconds."""
+
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: float, reason: str):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+        self.reason = reason
+
+
+@dataclass
+class Lease:
+    id: str
+    session_id: str
+    user_key: str
+
+
+def user_key(user_email: str) -> str:
+    return (user_email or "").strip().lower()
+
+
+class AdmissionController:
+    """Leases for running reviews and per-user token buckets, shared through SQLite."""
+
+    def __init__(self, path: str = ADMISSION_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS leases (
+                    id TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    user_key TEXT NOT NULL,
+                    started_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_leases_session ON leases (session_id);
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                """
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def admit(self, session_id: str, user_email: str, queue_depth: int = 0) -> Lease:
+        """Take a lease for one review or raise AdmissionRejected."""
+        key = user_key(user_email)
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+
+            if queue_depth >= ADMIT_MAX_QUEUE:
+                overflow = queue_depth - ADMIT_MAX_QUEUE + 1
+                self._reject(f"The review queue is full ({queue_depth} waiting).",
+                             overflow * ADMIT_JOB_SECONDS / max(1, ADMIT_MAX_GLOBAL), "queue_full")
+
+            running = conn.execute("SELECT session_id, started_at FROM leases ORDER BY started_at").fetchall()
+            if len(running) >= ADMIT_MAX_GLOBAL:
+                self._reject("The server is busy with other reviews.", self._wait_for(running, now), "global_limit")
+
+            own = [row for row in running if row["session_id"] == session_id]
+            if len(own) >= ADMIT_MAX_PER_SESSION:
+                self._reject("You already have a review running. Wait for it to finish.",
+                             self._wait_for(own, now), "session_limit")
+
+            tokens = self._refill(conn, key, now)
+            if tokens < 1:
+                rate = ADMIT_RATE_PER_HOUR / 3600
+                self._reject("Too many uploads. Try again later.",
+                             (1 - tokens) / rate if rate > 0 else ADMIT_LEASE_TTL, "rate_limit")
+
+            conn.execute("UPDATE buckets SET tokens = ? WHERE key = ?", (tokens - 1, key))
+            lease = Lease(uuid.uuid4().hex, session_id, key)
+            conn.execute(
+                "INSERT INTO leases (id, session_id, user_key, started_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (lease.id, session_id, key, now, now + ADMIT_LEASE_TTL),
+            )
+        return lease
+
+    def release(self, lease: Lease):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM leases WHERE id = ?", (lease.id,))
+
+    def in_flight(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM leases WHERE expires_at >= ?", (time.time(),)).fetchone()[0]
+
+    @staticmethod
+    def _refill(conn, key: str, now: float) -> float:
+        row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            conn.execute("INSERT INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)", (key, ADMIT_BURST, now))
+            return ADMIT_BURST
+        tokens = min(ADMIT_BURST, row["tokens"] + (now - row["updated_at"]) * ADMIT_RATE_PER_HOUR / 3600)
+        conn.execute("UPDATE buckets SET tokens = ?, updated_at = ? WHERE key = ?", (tokens, now, key))
+        return tokens
+
+    @staticmethod
+    def _wait_for(rows, now: float) -> float:
+        # The oldest running review is the likeliest to free a slot first
+        return max(1.0, rows[0]["started_at"] + ADMIT_JOB_SECONDS - now)
+
+    @staticmethod
+    def _reject(message: str, retry_after: float, reason: str):
+        metrics.ADMISSION_REJECTIONS.inc(reason=reason)
+        print(f"🚦 Upload refused ({reason}), retry after {retry_after:.0f}s")
+        raise AdmissionRejected(message, retry_after, reason)
+
+
+@contextmanager
+def admitted(session_id: str, user_email: str, queue_depth: int = 0, controller: AdmissionController = None):
+    """Hold a lease for the duration of the block."""
+    controller = controller or AdmissionController()
+    lease = controller.admit(session_id, user_email, queue_depth)
+    try:
+        yield lease
+    finally:
+        controller.release(lease)
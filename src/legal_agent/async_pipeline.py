@@ -0,0 +1,144 @@
+"""
+Async form of the review pipeline for the ASGI app.
+
+The planning and bookkeeping phases are short blocking calls (pdfplumber,
+SQLite) and run via asyncio.to_thread. Delivery uses aiosmtplib and an async
+HTTP client for Google Calendar, so waiting on SMTP and Calendar holds no
+thread.
+
+The crew is different. In CrewAI 1.2, kickoff_async is asyncio.to_thread
+around the blocking kickoff, so every running crew holds a thread of the
+loop's default executor for its whole run. A crew that hits CREW_TIMEOUT
+keeps running in its thread, because a thread cannot be cancelled. At most
+ASYNC_CREW_CONCURRENCY crews run at once, and a slot is only freed when the
+crew's thread returns. The default leaves a few of the executor's
+min(32, CPUs + 4) threads free for the bookkeeping calls. Further uploads
+wait for a slot.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import time
+
+from src.legal_agent import metrics
+from src.legal_agent.checkpoints import resume_crew
+from src.legal_agent.delivery import send_summary_text_async, send_calendar_invites_async
+from src.legal_agent.logs import job_context
+from src.legal_agent.pipeline import (
+    CREW_TIMEOUT, CALENDAR_RESPONSE_WAIT, EarlyDelivery, plan_review, record_review, record_delivery,
+    delivered_payload, crew_failed_payload, delivery_failed_payload, stop_early, _observe_crew, _set_status
+)
+from src.legal_agent.store import ResultStore
+from src.legal_agent.tracing import span, bind_crew, current_span
+
+
+# asyncio's default executor size, minus threads kept for bookkeeping calls
+EXECUTOR_THREADS = min(32, (os.cpu_count() or 1) + 4)
+ASYNC_CREW_CONCURRENCY = int(os.getenv("ASYNC_CREW_CONCURRENCY", str(max(1, EXECUTOR_THREADS - 4))))
+_crew_slots = asyncio.Semaphore(ASYNC_CREW_CONCURRENCY)
+
+
+def _free_slot(run: asyncio.Future):
+    if not run.cancelled():
+        # Retrieve the outcome of a crew nobody waits for any more, so it isn't logged as unhandled
+        run.exception()
+    _crew_slots.release()
+
+
+async def run_crew_async(crew, inputs, timeout=CREW_TIMEOUT):
+    with span("crew kickoff", tasks=len(crew.tasks)) as crew_span:
+        bind_crew(crew, crew_span)
+        await _crew_slots.acquire()
+        run = asyncio.ensure_future(crew.kickoff_async(inputs=inputs))
+        # The slot follows the thread, which outlives a timeout
+        run.add_done_callback(_free_slot)
+        try:
+            return await asyncio.wait_for(asyncio.shield(run), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("⏰ Crew run exceeded 15 minutes. Aborting.")
+
+
+async def process_job_async(job_id: str, result_store: ResultStore = None) -> dict:
+    """process_job for the event loop; returns the same JSON payload."""
+    result_store = result_store or ResultStore()
+    job = await asyncio.to_thread(result_store.get_job, job_id)
+    with job_context(job_id), span("review job", job_id=job_id) as job_span, \
+            metrics.JOBS_IN_FLIGHT.track_inprogress(mode=job["mode"]):
+        payload = await _process_job_async(job, result_store)
+        job_span.set_attribute("job.success", payload["success"])
+        return payload
+
+
+async def calendar_sync_async(user_email: str, deliverables) -> str:
+    with span("calendar sync"):
+        return await send_calendar_invites_async(user_email, deliverables)
+
+
+def submit_on_loop(loop):
+    """EarlyDelivery submit function that runs coroutine deliveries on `loop` from the crew's thread."""
+    def submit(fn, *args):
+        future = concurrent.futures.Future()
+        # Keep the caller's context so delivery spans stay under the job's span
+        context = contextvars.copy_context()
+
+        def settle(task):
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def start():
+            asyncio.ensure_future(fn(*args)).add_done_callback(settle)
+
+        loop.call_soon_threadsafe(start, context=context)
+        return future
+    return submit
+
+
+async def _process_job_async(job: dict, result_store: ResultStore) -> dict:
+    job_id, mode, user_email = job["id"], job["mode"], job["user_email"]
+    current_span().set_attribute("job.mode", mode)
+    await asyncio.to_thread(_set_status, result_store, job, "processing")
+
+    try:
+        plan = await asyncio.to_thread(plan_review, job, result_store)
+        delivery = EarlyDelivery(plan, result_store, send_email=send_summary_text_async,
+                                 send_calendar=calendar_sync_async, submit=submit_on_loop(asyncio.get_running_loop()))
+        delivery.attach()
+        if plan.crew is not None:
+            plan.resumed = await asyncio.to_thread(resume_crew, plan.crew, plan.checkpoints)
+        result = None
+        if plan.runs_crew:
+            started = time.perf_counter()
+            try:
+                result = await run_crew_async(plan.crew, plan.inputs)
+            except TimeoutError as e:
+                metrics.CREW_TIMEOUTS.inc(mode=mode)
+                stop_early(plan, e)
+            _observe_crew(plan.crew, mode, started)
+        await asyncio.to_thread(record_review, plan, result_store, result)
+        await asyncio.to_thread(delivery.start_remaining)
+
+    except Exception as e:
+        return await asyncio.to_thread(crew_failed_payload, job, result_store, e)
+
+    try:
+        await asyncio.wrap_future(delivery.email)
+        await asyncio.to_thread(record_delivery, result_store, job_id, "email", "sent", user_email)
+
+        calendar_result = ""
+        if delivery.calendar is not None:
+            try:
+                calendar_result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(delivery.calendar)),
+                                                         CALENDAR_RESPONSE_WAIT)
+            except asyncio.TimeoutError:
+                calendar_result = "Calendar sync still running."
+
+        return await asyncio.to_thread(delivered_payload, plan, result_store, calendar_result)
+
+    except Exception as e:
+        return await asyncio.to_thread(delivery_failed_payload, job, result_store, e)
@@ -11,7 +11,8 @@ from crewai.project import CrewBase, agent, crew, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
 from typing import List
 from dotenv import load_dotenv
-from src.legal_agent.tools.web_search import WebSearchTool
+from src.legal_agent.logs import CREW_VERBOSE
+from src.legal_agent.tools.knowledge_search import LEGAL_RESEARCH, research_tools
 load_dotenv()
 
 ## make more tailored to content creation and brand deal contracts
@@ -52,7 +53,7 @@ class ContentCreatorLegalCrew():
                 "exclusivity, content ownership, licensing (perpetual/limited), attribution, moral clauses, "
                 "and termination/kill fees. Produce structured outputs that downstream agents can consume."
             ),
-            verbose=True
+            verbose=CREW_VERBOSE
         )
 
     @agent
@@ -71,7 +72,7 @@ class ContentCreatorLegalCrew():
                 "royalty clauses, and unfair deliverable obligations. You help creators protect their interests "
                 "by identifying and explaining potential pitfalls clearly."
             ),
-            verbose=True,
+            verbose=CREW_VERBOSE,
         )
 
 
@@ -96,22 +97,22 @@ class ContentCreatorLegalCrew():
     #         allow_delegation=False,
     #     )
 
-    # @agent
-    # def legal_researcher(self) -> Agent:
-    #     """Finds and summarizes relevant influencer marketing and contract info online."""
-    #     return Agent(
-    #         role="Influencer Contract Legal Researcher",
-    #         goal=(
-    #             "Quickly research unclear contract terms if needed."
-    #         ),
-    #         backstory=(
-    #             "Fast legal researcher."
-    #         ),
-    #         verbose=True,
-    #         tools=[WebSearchTool()],
-    #         allow_delegation=False,
-    #         max_iter=1
-    #     )
+    # Not decorated with @agent: only added to the crews when LEGAL_RESEARCH is enabled
+    def legal_researcher(self) -> Agent:
+        """Looks up unclear influencer contract terms in the legal knowledge index (or online)."""
+        return Agent(
+            role="Influencer Contract Legal Researcher",
+            goal=(
+                "Quickly research unclear contract terms if needed."
+            ),
+            backstory=(
+                "Fast legal researcher specializing in influencer marketing, usage rights and brand deal compliance."
+            ),
+            verbose=CREW_VERBOSE,
+            tools=research_tools(),
+            allow_delegation=False,
+            max_iter=1
+        )
 
 
     @agent
@@ -130,7 +131,7 @@ class ContentCreatorLegalCrew():
                 "and potential legal risks — like exclusivity, perpetual usage rights, or content ownership — "
                 "in a way that’s informative but not legal advice."
             ),
-            verbose=True
+            verbose=CREW_VERBOSE
         )
 
     # @agent
@@ -160,17 +161,18 @@ class ContentCreatorLegalCrew():
     # === TASKS ===
     @task
     def parse_contract(self) -> Task:
-        """Extract clauses, deliverables, dates, and legal concerns from a brand-deal contract."""
+        """Extract one structured document (clauses, parties, payment terms, calendar-ready deliverables) from a brand-deal contract."""
         return Task(
             description=(
-                "Analyze the following brand-deal contract for the user {user_email}.\n\n"
+                # Static instructions first and per-contract values last, so the prompt prefix is cacheable
+                "Analyze the brand-deal contract given at the end of this task for the user. "
+                "This is the only step that reads the contract: risk analysis, the summary and the calendar "
+                "all work from your output.\n\n"
                 "Do NOT fabricate or infer information that is not explicitly stated in the contract text.\n"
                 "If a section or detail is missing, leave it empty or omit it. Avoid assumptions.\n\n"
-                "Contract text:\n{contract_text}\n\n"
                 "Required actions:\n"
                 "1) Identify and label key sections and clauses only if they are in the text, focusing on these categories:\n"
                 "   - Deliverables (what the creator must produce; include format, platform, and quantity)\n"
-                "   - Due dates and scheduling information for each deliverable. Convert to Pacific Standard Time if necessary.\n"
                 "   - Payment terms (amounts, schedule, invoicing, tax responsibilities)\n"
                 "   - Ownership & Licensing\n"
                 "   - Exclusivity / non-compete / whitelist requirements\n"
@@ -181,21 +183,31 @@ class ContentCreatorLegalCrew():
                 "   - Confidentiality / NDA\n"
                 "   - Indemnity and liability\n"
                 "   - Reporting, metrics, and acceptance criteria\n\n"
-                "2) Extract and normalize all dates (ISO 8601 preferred) and associate them with deliverables or obligations.\n"
-                "   Convert dates to PST (Pacific Standard Time)\n"
-                "3) Extract the primary company/brand name mentioned and save it to 'company_name' if available.\n"
-                "4) Produce a structured JSON output containing `deliverables`, `dates`, `legal_flags`, `clauses`, `company_name`, and `plain_english_summary`.\n\n"
-                "Output must be valid JSON and contain ONLY the required fields — no commentary, no explanation, no example text.\n"
-                "Dates need to have an associated deliverable.\n"
+                "2) Identify the parties and the primary company/brand name; save the latter to `company_name` if available.\n"
+                "3) For every deliverable with an explicit due date, give:\n"
+                "   - summary: brief title\n"
+                "   - description: what needs to be delivered (format, platform, quantity)\n"
+                "   - start_date: due date in YYYY-MM-DD format\n"
+                "   - start_time: time in 24-hour HH:MM format if specified (14:00 for 2:00 PM), otherwise null\n"
+                "   - timezone: the timezone exactly as the contract states it (e.g. PST, EST, UTC, Pacific Time), otherwise null\n"
+                "   Look for time indicators like 'by 5:00 PM PST', 'due at 14:00 EST', 'submission deadline 9am PT'. "
+                "Do not convert times; keep them in the contract's timezone. Deliverables without a due date get "
+                "start_date null.\n"
+                "4) Produce one JSON document with `company_name`, `parties`, `clauses`, `payment_terms`, `deliverables`, "
+                "`legal_flags` and `plain_english_summary`.\n\n"
+                "Output must be valid JSON and contain ONLY the required fields — no commentary, no explanation, no example text.\n\n"
+                "User: {user_email}\n\n"
+                "Contract text:\n{contract_text}"
             ),
             expected_output=(
                 "JSON object with the following keys (omit or leave empty if not applicable):\n"
                 """{
-                    "deliverables": [],
-                    "dates": [],
-                    "legal_flags": {},
-                    "clauses": [],
                     "company_name": "",
+                    "parties": [{"name": "", "role": ""}],
+                    "clauses": [{"title": "", "category": "", "summary": ""}],
+                    "payment_terms": [],
+                    "deliverables": [{"summary": "", "description": "", "start_date": "YYYY-MM-DD", "start_time": null, "timezone": null}],
+                    "legal_flags": {},
                     "plain_english_summary": ""
                 }"""
             ),
@@ -209,7 +221,7 @@ class ContentCreatorLegalCrew():
         """Evaluate influencer-brand contract clauses for potential legal or business risks."""
         return Task(
             description=(
-                "Examine the structured contract clauses produced by the previous step.\n\n"
+                "Examine the structured contract document produced by the previous step.\n\n"
                 "Do not make-up information that is not within the contract text. "
                 "For each clause, assess potential risks or concerns to the creator such as:\n"
                 "- **Ownership & Usage Rights**: Does the brand gain perpetual or exclusive rights to the content?\n"
@@ -250,48 +262,21 @@ class ContentCreatorLegalCrew():
     #         agent=self.legal_researcher()
     #     )
 
-    # @task
-    # def research_clarifications(self) -> Task:
-    #     """Research unclear or concerning influencer contract terms online."""
-    #     return Task(
-    #         description=(
-    #             "ONLY research if contract has unclear perpetual rights or unusual clauses.\n"
-    #             "Otherwise: 'No research needed'"
-    #         ),
-    #         expected_output=(
-    #             "Brief research or 'No research needed'"
-    #         ),
-    #         agent=self.legal_researcher()
-    #     )
-
-    @task
-    def extract_deliverables_for_calendar(self) -> Task:
-        """Extract deliverables and due dates for calendar integration."""
+    # Not decorated with @task: inserted by _with_research
+    def research_clarifications(self, legal_researcher: Agent) -> Task:
+        """Look up unclear or concerning influencer contract terms."""
         return Task(
             description=(
-                "Extract ALL deliverables with due dates from the contract analysis.\n\n"
-                "For each deliverable, provide:\n"
-                "- summary: Brief title\n"
-                "- description: What needs to be delivered\n" 
-                "- start_date: Due date in YYYY-MM-DD format\n"
-                "- start_time: Time in HH:MM format (24-hour) if specified, otherwise null\n"
-                "- timezone: Timezone if specified (e.g., PST, EST, UTC), otherwise null\n"
-                "- user_email: {user_email}\n\n"
-                "Look for time indicators like:\n"
-                "- 'by 5:00 PM PST'\n"
-                "- 'due at 14:00 EST'  \n"
-                "- 'submission deadline 9am PT'\n"
-                "- 'before 3:00 PM Pacific Time'\n\n"
-                "If no specific time is mentioned, set start_time to null for all-day events.\n"
-                "Convert all times to 24-hour format (14:00 for 2:00 PM).\n"
-                "Only include deliverables with explicit due dates."
+                "Look up definitions or real-world context for unclear or risky terms in the risk report, "
+                "such as perpetual usage rights, whitelisting, exclusivity or royalties, and cite the source of each finding. "
+                "ONLY research if contract has unclear perpetual rights or unusual clauses.\n"
+                "Otherwise: 'No research needed'"
             ),
             expected_output=(
-                "JSON array of deliverables with 'summary', 'description', 'start_date', 'start_time, 'time_zone', 'user_email'"
+                "Brief research or 'No research needed'"
             ),
-            agent=self.researcher(),  # Use researcher since they already parse the contract
-            context_variables=["user_email"],
-            output_file="calendar_deliverables.json"
+            agent=legal_researcher,
+            name="research_clarifications"
         )
 
     # @task
@@ -368,10 +353,45 @@ class ContentCreatorLegalCrew():
             output_file="contract_summary.md"
         )
 
-
+    # Not decorated with @task so it stays out of the full review crew
+    def summarize_amendment(self) -> Task:
+        """Update the previous creator summary using the analysis of the changed clauses only."""
+        return Task(
+            description=(
+                "This brand deal is a revised version of one the creator already had reviewed. "
+                "Only the clauses analyzed in the previous steps changed; every other clause is identical "
+                "to the previous version. Do not make-up information that is not within the contract text.\n\n"
+                "Update the previous summary so it reflects the changed clauses — especially any new or moved "
+                "deliverables, deadlines, payment terms, exclusivity or usage rights — and keep everything that "
+                "did not change. Keep it concise and keep the disclaimer that this is not legal advice.\n\n"
+                "What changed:\n{change_summary}\n\n"
+                "Previous risk report:\n{previous_risks}\n\n"
+                "Previous summary:\n{previous_summary}"
+            ),
+            expected_output=(
+                "A markdown-formatted report with the following structure:\n"
+                "## What Changed\n"
+                "## Brand Deal Summary\n"
+                "## Deliverables & Deadlines\n"
+                "## Payment Terms\n"
+                "## Legal & Risk Concerns\n"
+                "### Disclaimer: This summary is for informational purposes only and not legal advice."
+            ),
+            agent=self.user_advocate(),
+            output_file="contract_summary.md",
+            name="summarize_amendment"
+        )
 
 
     # === CREW ===
+    def _with_research(self, agents: list, tasks: list):
+        """Insert the research step after the risk analysis when LEGAL_RESEARCH is on."""
+        if LEGAL_RESEARCH == "off":
+            return agents, tasks
+        legal_researcher = self.legal_researcher()
+        position = next(i for i, task in enumerate(tasks) if task.name == "analyze_risks") + 1
+        return agents + [legal_researcher], tasks[:position] + [self.research_clarifications(legal_researcher)] + tasks[position:]
+
     @crew
     def crew(self) -> Crew:
         """Creates and configures the LegalAgent crew."""
@@ -384,12 +404,37 @@ class ContentCreatorLegalCrew():
                 agent_role = getattr(task.agent, 'role', 'Unknown')
                 print(f"🔍 Task '{task.description[:30]}...' assigned to agent: {agent_role}")
         """Creates and configures the LegalAgent crew."""
+        agents, tasks = self._with_research(list(self.agents), list(self.tasks))
         return Crew(
-            agents=self.agents,
-            tasks=self.tasks,
+            agents=agents,
+            tasks=tasks,
             process=Process.sequential,
-            verbose=True,
+            verbose=CREW_VERBOSE,
             memory=False,  # ← Optional: Disable memory to reduce complexity
             embedder=None,  # Disable embedder
             tracing=False
         )
+
+    def amendment_crew(self) -> Crew:
+        """Creates a crew that only re-reviews the clauses changed since the previous version.
+
+        Deliverables come from the extraction of the changed clauses only, so the calendar
+        sync just adds the new or moved deadlines.
+        """
+        agents, tasks = self._with_research(
+            [self.researcher(), self.risk_analyzer(), self.user_advocate()],
+            [
+                self.parse_contract(),
+                self.analyze_risks(),
+                self.summarize_amendment(),
+            ],
+        )
+        return Crew(
+            agents=agents,
+            tasks=tasks,
+            process=Process.sequential,
+            verbose=CREW_VERBOSE,
+            memory=False,
+            embedder=None,
+            tracing=False
+        )
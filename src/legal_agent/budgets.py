@@ -0,0 +1,128 @@
+"""
+Per-task budgets for crew agents, and partial reviews when one runs out.
+
+Each task in the crews is run by its own agent, so one table keyed by task
+name sets both budgets:
+
+    max_iter     reasoning/tool iterations of the agent; at the limit CrewAI
+                 makes the agent give its best final answer
+    seconds      wall-clock limit for the task (the agent's max_execution_time)
+    max_tokens   completion tokens per LLM call
+
+TASK_BUDGETS holds the defaults. CREW_BUDGETS overrides them with JSON, e.g.
+CREW_BUDGETS='{"analyze_risks": {"seconds": 300}, "*": {"max_iter": 4}}'.
+The "*" entry applies to every task, and a task's own entry wins. A
+stricter limit already set on an agent (the research agent's max_iter=1) is
+kept.
+
+When a task runs out of time, or the whole crew hits CREW_TIMEOUT, the job
+is not failed if at least one task finished. partial_summary() turns the
+finished tasks' outputs into the emailed summary. It marks the sections that
+are missing and says why. The job is stored with status "partial" and is not
+cached as a contract version. A re-upload of the same PDF resumes from the
+finished tasks.
+"""
+
+import json
+import os
+from dataclasses import dataclass, replace
+from typing import Dict, List
+
+from src.legal_agent.extraction import parse_json_output
+
+
+@dataclass(frozen=True)
+class Budget:
+    max_iter: int
+    seconds: int
+    max_tokens: int
+
+
+DEFAULT_BUDGET = Budget(
+    max_iter=int(os.getenv("AGENT_MAX_ITER", "6")),
+    seconds=int(os.getenv("TASK_MAX_SECONDS", "240")),
+    max_tokens=int(os.getenv("AGENT_MAX_TOKENS", "4096")),
+)
+# Sized so a full crew stays inside the 15-minute CREW_TIMEOUT
+TASK_BUDGETS = {
+    "parse_contract": Budget(max_iter=4, seconds=240, max_tokens=6000),
+    "analyze_risks": Budget(max_iter=6, seconds=240, max_tokens=4096),
+    "research_clarifications": Budget(max_iter=3, seconds=120, max_tokens=2048),
+    "summarize_for_user": Budget(max_iter=4, seconds=240, max_tokens=4096),
+    "summarize_amendment": Budget(max_iter=4, seconds=240, max_tokens=4096),
+}
+SECTION_TITLES = {
+    "parse_contract": "Contract Clauses",
+    "analyze_risks": "Risk Report",
+    "research_clarifications": "Research Notes",
+    "summarize_for_user": "Summary",
+    "summarize_amendment": "What Changed",
+}
+
+
+def _overrides() -> Dict[str, dict]:
+    raw = os.getenv("CREW_BUDGETS", "")
+    if not raw:
+        return {}
+    try:
+        overrides = json.loads(raw)
+    except ValueError as e:
+        print(f"Note: ignoring CREW_BUDGETS, not valid JSON: {e}")
+        return {}
+    return overrides if isinstance(overrides, dict) else {}
+
+
+def budget_for(task_name: str) -> Budget:
+    overrides = _overrides()
+    fields = {**overrides.get("*", {}), **overrides.get(task_name, {})}
+    fields = {name: int(value) for name, value in fields.items() if name in Budget.__dataclass_fields__}
+    return replace(TASK_BUDGETS.get(task_name, DEFAULT_BUDGET), **fields)
+
+
+def apply_budgets(crew):
+    """Set each task's agent limits from its budget."""
+    applied = []
+    for task in crew.tasks:
+        agent = task.agent
+        if agent is None:
+            continue
+        budget = budget_for(task.name)
+        agent.max_iter = min(agent.max_iter or budget.max_iter, budget.max_iter)
+        agent.max_execution_time = budget.seconds
+        llm = getattr(agent, "llm", None)
+        if llm is not None and hasattr(llm, "max_tokens"):
+            llm.max_tokens = min(llm.max_tokens or budget.max_tokens, budget.max_tokens)
+        applied.append(f"{task.name} {budget.seconds}s/{agent.max_iter} iterations")
+    print(f"🎯 Task budgets: {', '.join(applied)}")
+
+
+def _section(raw: str) -> str:
+    document = parse_json_output(raw) if raw.lstrip()[:1] in ("{", "[", "`") else None
+    if isinstance(document, dict) and document.get("plain_english_summary"):
+        # The creator extraction carries its own plain-English summary
+        return f"{document['plain_english_summary']}\n\n```json\n{json.dumps(document, indent=2, ensure_ascii=False)}\n```"
+    if document is not None:
+        return f"```json\n{json.dumps(document, indent=2, ensure_ascii=False)}\n```"
+    return raw.strip()
+
+
+def partial_summary(tasks: List, reason: str) -> str:
+    """Markdown summary assembled from the tasks that finished, with the missing ones marked."""
+    finished = [task for task in tasks if task.output is not None and (task.output.raw or "").strip()]
+    lines = [
+        "# Contract Review (Partial)",
+        "",
+        f"> ⚠️ This review ran out of its time budget before every step finished ({reason}). "
+        "The sections below come from the steps that did finish. Upload the same PDF again to complete the rest.",
+        "",
+    ]
+    done = {task.name for task in finished}
+    for task in tasks:
+        title = SECTION_TITLES.get(task.name) or (task.name or "step").replace("_", " ").title()
+        lines += [f"## {title}", ""]
+        if task.name in done:
+            lines += [_section(task.output.raw), ""]
+        else:
+            lines += ["_Missing: this step did not finish in time._", ""]
+    lines.append("---\n*This is an automated educational summary, not legal advice.*")
+    return "\n".join(lines)
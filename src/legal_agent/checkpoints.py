@@ -0,0 +1,110 @@
+"""
+Task-level checkpoints for crew runs.
+
+Every task's raw output is saved to the job's outputs, under the task name,
+as soon as the task finishes. A failed or timed-out review therefore keeps
+what it already paid for. Checkpoints are used in three ways:
+
+- Retry: when the same user uploads the same PDF in the same mode within
+  CHECKPOINT_RESUME_HOURS of a failed or partial attempt, the new job starts
+  from that attempt's checkpoints.
+- Reassignment: a job queued again after its worker was lost (see
+  coordination.py) starts from its own checkpoints.
+- Replay: `python main.py replay <job_id> [from_task]` re-runs a stored job
+  from `from_task`. By default it starts after the last checkpoint.
+
+Resuming fires each completed task's callbacks with its stored output, so
+context pruning, checkpointing and early delivery behave as if the task had
+just run. The completed tasks are then removed from the crew. Checkpoints
+are always a prefix of the crew's tasks: a task is only skipped if every
+task before it was skipped as well.
+"""
+
+import os
+import time
+from typing import Dict, List
+
+from crewai import Task
+from crewai.tasks.task_output import TaskOutput
+
+from src.legal_agent.store import ResultStore
+
+CHECKPOINT_RESUME_HOURS = float(os.getenv("CHECKPOINT_RESUME_HOURS", "24"))
+
+
+def checkpoint_tasks(crew, result_store: ResultStore, job_id: str):
+    """Save each task's raw output to the job as soon as the task finishes.
+
+    Checkpoints are stored under the task name, so every task must have one;
+    an unnamed task fails here, before the crew runs or delivers anything.
+    """
+    unnamed = [task.description[:60] for task in crew.tasks if not task.name]
+    if unnamed:
+        raise ValueError(f"Tasks without a name cannot be checkpointed: {unnamed}")
+    for task in crew.tasks:
+        _hook(task, result_store, job_id)
+
+
+def _hook(task: Task, result_store: ResultStore, job_id: str):
+    previous_callback = task.callback
+
+    def callback(output):
+        result_store.save_output(job_id, task.name, output.raw or "")
+        if previous_callback is not None:
+            return previous_callback(output)
+
+    task.callback = callback
+
+
+def find_retry_checkpoints(result_store: ResultStore, job: dict, task_names: List[str]) -> Dict[str, str]:
+    """The job's own checkpoints if it ran before, else those of a recent failed attempt at the same upload."""
+    own = result_store.get_outputs(job["id"], task_names)
+    if own:
+        print(f"⏯️ Resuming reassigned job {job['id']}: {', '.join(own)} already done")
+        return own
+    since = time.time() - CHECKPOINT_RESUME_HOURS * 3600
+    attempt = result_store.find_failed_attempt(job["id"], since)
+    if attempt is None:
+        return {}
+    checkpoints = result_store.get_outputs(attempt, task_names)
+    if checkpoints:
+        print(f"⏯️ Resuming from failed job {attempt}: {', '.join(checkpoints)} already done")
+    return checkpoints
+
+
+def checkpoints_before(checkpoints: Dict[str, str], task_names: List[str], from_task: str = None) -> Dict[str, str]:
+    """The checkpoints for the tasks that run before `from_task`."""
+    if from_task is None:
+        return dict(checkpoints)
+    if from_task not in task_names:
+        raise ValueError(f"Unknown task '{from_task}'. Tasks: {', '.join(task_names)}")
+    return {name: checkpoints[name] for name in task_names[:task_names.index(from_task)] if name in checkpoints}
+
+
+def resume_crew(crew, checkpoints: Dict[str, str]) -> List[Task]:
+    """Replay the checkpointed prefix of the crew's tasks and drop them from the crew.
+
+    Returns the skipped tasks with their outputs restored.
+    """
+    resumed = []
+    for task in crew.tasks:
+        if task.name not in checkpoints:
+            break
+        output = TaskOutput(description=task.description, name=task.name, expected_output=task.expected_output,
+                            raw=checkpoints[task.name], agent=task.agent.role if task.agent else "")
+        task.output = output
+        if task.callback is not None:
+            task.callback(output)
+        resumed.append(task)
+    if not resumed:
+        return []
+
+    remaining = crew.tasks[len(resumed):]
+    for position, task in enumerate(remaining):
+        # Without an explicit context a sequential task reads every earlier output of this kickoff,
+        # which no longer includes the skipped tasks
+        if not isinstance(task.context, list):
+            task.context = resumed + remaining[:position]
+    crew.tasks = remaining
+    print(f"⏭️ Skipping {len(resumed)} checkpointed task(s): {', '.join(task.name for task in resumed)}")
+    return resumed
@@ -0,0 +1,168 @@
+"""
+Context pruning between sequential crew tasks.
+
+By default a sequential task gets the raw output of every earlier task as
+context, so the final summary re-reads the full clause-by-clause dump. A
+context policy instead lists, per task, which upstream outputs it sees and
+through which view:
+
+    full               the raw output, unchanged
+    risk_table         only Medium/High risk entries of a risk report
+    deliverables_json  only the deliverables/dates JSON
+    summary            the output compressed to the token budget
+
+Every view except "full" is cut to CONTEXT_TOKEN_BUDGET tokens (estimated at
+four characters per token). Pruning is extractive, so it adds no LLM call
+between tasks. Override the defaults with CONTEXT_POLICIES, a JSON object of
+task name -> ["upstream_task:view", ...], e.g.
+
+    CONTEXT_POLICIES='{"summarize_for_user": ["analyze_risks:risk_table"]}'
+
+How it works: each downstream task's context is pointed at stand-in tasks
+that are not part of the crew, and the upstream task's callback fills them
+with the pruned output as soon as it finishes.
+"""
+
+import json
+import os
+import re
+from typing import Dict, List
+
+from crewai import Task
+
+from src.legal_agent.extraction import parse_json_output
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CHARS_PER_TOKEN = 4
+
+_SUMMARY_SOURCES = ["parse_contract:summary", "analyze_risks:risk_table", "research_clarifications:summary"]
+
+DEFAULT_POLICIES: Dict[str, List[str]] = {
+    "research_clarifications": ["analyze_risks:risk_table"],
+    "summarize_for_user": _SUMMARY_SOURCES + ["parse_contract:deliverables_json"],
+    "summarize_amendment": _SUMMARY_SOURCES + ["parse_contract:deliverables_json"],
+}
+
+
+def load_policies() -> Dict[str, List[str]]:
+    policies = dict(DEFAULT_POLICIES)
+    override = os.getenv("CONTEXT_POLICIES")
+    if override:
+        try:
+            policies.update(json.loads(override))
+        except ValueError as e:
+            print(f"Note: ignoring invalid CONTEXT_POLICIES: {e}")
+    return policies
+
+
+# -------------------------
+# Views
+# -------------------------
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def compress_to_budget(text: str, budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """Keep headings and the first sentence of each paragraph or bullet until the budget is used."""
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+
+    data = parse_json_output(text)
+    if isinstance(data, dict):
+        # Short fields first: the long clause-by-clause dumps are the first to go
+        kept, used = {}, 2
+        for key, value in sorted(data.items(), key=lambda item: len(json.dumps(item[1], ensure_ascii=False))):
+            size = len(json.dumps({key: value}, ensure_ascii=False))
+            if used + size > limit:
+                continue
+            kept[key] = value
+            used += size
+        text = json.dumps(kept, ensure_ascii=False)
+    else:
+        lines = []
+        for line in text.splitlines():
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if not stripped.startswith(("#", "|")):
+                stripped = re.split(r"(?<=[.!?])\s", stripped, maxsplit=1)[0]
+            lines.append(stripped)
+        text = "\n".join(lines)
+
+    if len(text) > limit:
+        text = text[:limit].rsplit(" ", 1)[0] + " …"
+    return text
+
+
+def risk_table(raw: str, budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """Only the Medium and High risk entries of a risk report (all entries if none are flagged)."""
+    data = parse_json_output(raw)
+    if isinstance(data, dict):
+        data = next((value for value in data.values() if isinstance(value, list)), None)
+    if isinstance(data, list) and data and all(isinstance(item, dict) for item in data):
+        flagged = [item for item in data if str(item.get("risk_level", "")).lower() in ("medium", "high")]
+        return compress_to_budget(json.dumps(flagged or data, ensure_ascii=False), budget)
+
+    lines = [line for line in raw.splitlines()
+             if line.lstrip().startswith("#") or re.search(r"\b(high|medium)\b", line, re.IGNORECASE)]
+    return compress_to_budget("\n".join(lines) if lines else raw, budget)
+
+
+def deliverables_json(raw: str, budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """Only the parties, payment terms, deliverables and their dates."""
+    data = parse_json_output(raw)
+    if isinstance(data, dict):
+        data = {key: data[key] for key in ("company_name", "parties", "payment_terms", "deliverables", "dates")
+                if key in data}
+    if data is None:
+        return compress_to_budget(raw, budget)
+    return compress_to_budget(json.dumps(data, ensure_ascii=False), budget)
+
+
+VIEWS = {
+    "full": lambda raw, budget: raw,
+    "risk_table": risk_table,
+    "deliverables_json": deliverables_json,
+    "summary": compress_to_budget,
+}
+
+
+# -------------------------
+# Wiring
+# -------------------------
+def _feed_view(source: Task, view_task: Task, view: str, budget: int):
+    previous_callback = source.callback
+
+    def callback(output):
+        pruned = VIEWS[view](output.raw or "", budget)
+        view_task.output = output.model_copy(update={"raw": pruned})
+        print(f"✂️ {source.name} -> {view}: {estimate_tokens(output.raw or '')} -> {estimate_tokens(pruned)} tokens")
+        if previous_callback is not None:
+            return previous_callback(output)
+
+    source.callback = callback
+
+
+def apply_context_policies(crew, policies: Dict[str, List[str]] = None, budget: int = CONTEXT_TOKEN_BUDGET):
+    """Point each task with a policy at pruned views of its upstream tasks."""
+    policies = load_policies() if policies is None else policies
+    by_name = {task.name: task for task in crew.tasks}
+    positions = {id(task): position for position, task in enumerate(crew.tasks)}
+    for position, task in enumerate(crew.tasks):
+        context = []
+        for entry in policies.get(task.name, []):
+            source_name, _, view = entry.partition(":")
+            source = by_name.get(source_name)
+            # Skip upstream tasks this crew does not run (e.g. research when it is off)
+            if source is None or positions[id(source)] >= position:
+                continue
+            if view not in VIEWS:
+                print(f"Note: unknown context view '{view}' for {task.name}, using full output")
+                view = "full"
+            view_task = Task(description=f"{view} view of {source_name}",
+                             expected_output=f"Pruned output of {source_name}", name=f"{source_name}:{view}")
+            _feed_view(source, view_task, view, budget)
+            context.append(view_task)
+        if context:
+            task.context = context
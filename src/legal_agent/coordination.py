@@ -0,0 +1,304 @@
+"""
+Coordination between dynos: job leases and duplicate-submission checks.
+
+Three things are coordinated:
+
+- Leases. A worker that claims a job also takes a lease on it for
+  JOB_LEASE_TTL seconds. The dispatcher renews its leases on every heartbeat.
+- Reassignment. If a dyno dies, its leases stop being renewed. Any other
+  dispatcher takes the expired leases and puts those jobs back in the queue.
+  The next worker resumes each job from its task checkpoints. A job is
+  failed instead once it has been claimed JOB_MAX_ATTEMPTS times.
+- Duplicate submissions. A key is made from the user, the mode and the
+  SHA-256 of the PDF. While a job with the same key is queued or running, a
+  second upload gets that job's id back instead of starting another review.
+  The key is released when the job finishes, or after SUBMISSION_TTL if its
+  worker never reports back.
+
+The store behind this is pluggable, chosen by COORDINATION_URL:
+
+    (unset)              SQLite at DATA_DIR/coordination.db, for dynos on one host
+    http://host:port     a coordination server shared by every dyno
+
+`python -m src.legal_agent.coordination serve [port]` runs that server. It
+keeps a SQLite store and serves it over HTTP with JSON, so it stands in
+locally for a managed service such as Redis or etcd. Every operation is a
+single transaction in the store, so two dispatchers never take the same
+expired lease.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import urllib.request
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from src.legal_agent import metrics
+from src.legal_agent.store import DATA_DIR, ResultStore, STREAM_CHUNK_SIZE
+
+COORDINATION_URL = os.getenv("COORDINATION_URL", "")
+COORDINATION_DB = os.path.join(DATA_DIR, "coordination.db")
+COORDINATION_PORT = int(os.getenv("COORDINATION_PORT", "8765"))
+JOB_LEASE_TTL = float(os.getenv("JOB_LEASE_TTL", "30"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Crew timeout plus delivery slack, like the worker's job deadline
+SUBMISSION_TTL = float(os.getenv("SUBMISSION_TTL", str(15 * 60 + 120)))
+# Retry-After sent with the 503 for an upload while the coordination server is unreachable
+COORDINATION_RETRY_AFTER = int(os.getenv("COORDINATION_RETRY_AFTER", "30"))
+
+
+def content_digest(stream) -> str:
+    """SHA-256 of a seekable binary stream, read in chunks and rewound."""
+    sha = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b""):
+        sha.update(chunk)
+    stream.seek(0)
+    return sha.hexdigest()
+
+
+def submission_key(user_email: str, mode: str, pdf_digest: str) -> str:
+    return hashlib.sha256(f"{user_email.strip().lower()}|{mode}|{pdf_digest}".encode("utf-8")).hexdigest()
+
+
+class CoordinationStore(ABC):
+    """Leases and submission keys; implemented over SQLite and over HTTP."""
+
+    @abstractmethod
+    def acquire(self, job_id: str, owner: str, ttl: float = JOB_LEASE_TTL) -> bool:
+        """Lease the job to owner unless another owner holds an unexpired lease."""
+
+    @abstractmethod
+    def renew(self, job_ids: List[str], owner: str, ttl: float = JOB_LEASE_TTL) -> List[str]:
+        """Extend this owner's leases; returns the job ids it still holds."""
+
+    @abstractmethod
+    def release(self, job_id: str, owner: str):
+        """Drop owner's lease on the job."""
+
+    @abstractmethod
+    def take_expired(self, limit: int = 20) -> List[Dict]:
+        """Remove and return expired leases ({job_id, owner}); each is returned to one caller only."""
+
+    @abstractmethod
+    def claim_submission(self, key: str, job_id: str, ttl: float = SUBMISSION_TTL) -> Optional[str]:
+        """Register job_id under key; returns the job already holding the key instead, if any."""
+
+    @abstractmethod
+    def release_submission(self, job_id: str):
+        """Free the submission key held by the job."""
+
+
+class SQLiteCoordinationStore(CoordinationStore):
+    def __init__(self, path: str = COORDINATION_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS job_leases (
+                    job_id TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_job_leases_expiry ON job_leases (expires_at);
+                CREATE TABLE IF NOT EXISTS submissions (
+                    key TEXT PRIMARY KEY,
+                    job_id TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_submissions_job ON submissions (job_id);
+                """
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def acquire(self, job_id: str, owner: str, ttl: float = JOB_LEASE_TTL) -> bool:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT owner, expires_at FROM job_leases WHERE job_id = ?", (job_id,)).fetchone()
+            if row is not None and row["owner"] != owner and row["expires_at"] >= now:
+                return False
+            conn.execute("INSERT OR REPLACE INTO job_leases (job_id, owner, expires_at) VALUES (?, ?, ?)",
+                         (job_id, owner, now + ttl))
+        return True
+
+    def renew(self, job_ids: List[str], owner: str, ttl: float = JOB_LEASE_TTL) -> List[str]:
+        if not job_ids:
+            return []
+        placeholders = ", ".join("?" * len(job_ids))
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"UPDATE job_leases SET expires_at = ? WHERE owner = ? AND job_id IN ({placeholders})",
+                         [time.time() + ttl, owner] + list(job_ids))
+            rows = conn.execute(f"SELECT job_id FROM job_leases WHERE owner = ? AND job_id IN ({placeholders})",
+                                [owner] + list(job_ids)).fetchall()
+        return [row["job_id"] for row in rows]
+
+    def release(self, job_id: str, owner: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM job_leases WHERE job_id = ? AND owner = ?", (job_id, owner))
+
+    def take_expired(self, limit: int = 20) -> List[Dict]:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT job_id, owner FROM job_leases WHERE expires_at < ? LIMIT ?",
+                                (time.time(), limit)).fetchall()
+            conn.executemany("DELETE FROM job_leases WHERE job_id = ?", [(row["job_id"],) for row in rows])
+        return [dict(row) for row in rows]
+
+    def claim_submission(self, key: str, job_id: str, ttl: float = SUBMISSION_TTL) -> Optional[str]:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT job_id, expires_at FROM submissions WHERE key = ?", (key,)).fetchone()
+            if row is not None and row["expires_at"] >= now and row["job_id"] != job_id:
+                return row["job_id"]
+            conn.execute("INSERT OR REPLACE INTO submissions (key, job_id, expires_at) VALUES (?, ?, ?)",
+                         (key, job_id, now + ttl))
+        return None
+
+    def release_submission(self, job_id: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM submissions WHERE job_id = ?", (job_id,))
+
+
+class RemoteCoordinationStore(CoordinationStore):
+    """Client for `python -m src.legal_agent.coordination serve`."""
+
+    def __init__(self, url: str = COORDINATION_URL, timeout: float = 10):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _call(self, method: str, **params):
+        request = urllib.request.Request(f"{self.url}/{method}", data=json.dumps(params).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))["result"]
+
+    def acquire(self, job_id, owner, ttl=JOB_LEASE_TTL):
+        return self._call("acquire", job_id=job_id, owner=owner, ttl=ttl)
+
+    def renew(self, job_ids, owner, ttl=JOB_LEASE_TTL):
+        return self._call("renew", job_ids=list(job_ids), owner=owner, ttl=ttl)
+
+    def release(self, job_id, owner):
+        return self._call("release", job_id=job_id, owner=owner)
+
+    def take_expired(self, limit=20):
+        return self._call("take_expired", limit=limit)
+
+    def claim_submission(self, key, job_id, ttl=SUBMISSION_TTL):
+        return self._call("claim_submission", key=key, job_id=job_id, ttl=ttl)
+
+    def release_submission(self, job_id):
+        return self._call("release_submission", job_id=job_id)
+
+
+def coordinator() -> CoordinationStore:
+    if COORDINATION_URL.startswith(("http://", "https://")):
+        return RemoteCoordinationStore(COORDINATION_URL)
+    return SQLiteCoordinationStore()
+
+
+# -------------------------
+# Duplicate submissions
+# -------------------------
+def reserve_submission(result_store: ResultStore, user_email: str, mode: str, stream,
+                       store: CoordinationStore = None) -> Tuple[str, Optional[str]]:
+    """Reserve a job id for an upload.
+
+    Returns (job_id, None), or (job_id, existing) when the job `existing` is
+    already reviewing the same PDF for this user and mode.
+    """
+    store = store or coordinator()
+    job_id = uuid.uuid4().hex
+    key = submission_key(user_email, mode, content_digest(stream))
+    existing = store.claim_submission(key, job_id)
+    if existing is not None:
+        job = result_store.get_job(existing)
+        if job is not None and job["status"] in ("queued", "processing"):
+            metrics.DUPLICATE_SUBMISSIONS.inc(mode=mode)
+            print(f"👯 Upload matches job {existing}, which is still in flight")
+            return job_id, existing
+        # The job finished without releasing its key
+        store.release_submission(existing)
+        existing = store.claim_submission(key, job_id)
+    return job_id, existing
+
+
+# -------------------------
+# Reassignment
+# -------------------------
+def reassign_expired(result_store: ResultStore, store: CoordinationStore) -> int:
+    """Put jobs whose lease expired back in the queue, or fail them after JOB_MAX_ATTEMPTS claims."""
+    reassigned = 0
+    for lease in store.take_expired():
+        job_id = lease["job_id"]
+        status = result_store.requeue_job(job_id, JOB_MAX_ATTEMPTS)
+        if status == "queued":
+            reassigned += 1
+            metrics.LEASES_REASSIGNED.inc()
+            print(f"♻️ Lease on job {job_id} held by {lease['owner']} expired, job queued again")
+        elif status == "failed":
+            store.release_submission(job_id)
+            print(f"💀 Job {job_id} lost its worker {JOB_MAX_ATTEMPTS} times, giving up")
+    return reassigned
+
+
+# -------------------------
+# Coordination server
+# -------------------------
+_REMOTE_METHODS = ("acquire", "renew", "release", "take_expired", "claim_submission", "release_submission")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    store: CoordinationStore = None
+
+    def do_POST(self):
+        method = self.path.strip("/")
+        if method not in _REMOTE_METHODS:
+            self.send_error(404)
+            return
+        try:
+            params = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            body = json.dumps({"result": getattr(self.store, method)(**params)}).encode("utf-8")
+        except (TypeError, ValueError) as e:
+            self.send_error(400, str(e))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int = COORDINATION_PORT, path: str = COORDINATION_DB):
+    _Handler.store = SQLiteCoordinationStore(path)
+    server = ThreadingHTTPServer(("0.0.0.0", port), _Handler)
+    print(f"🤝 Coordination server on port {port}, store {path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve(int(sys.argv[2]) if len(sys.argv) > 2 else COORDINATION_PORT)
+    else:
+        print("Usage: python -m src.legal_agent.coordination serve [port]")
+        sys.exit(1)
@@ -0,0 +1,425 @@
+"""
+Report delivery: the summary email and Google Calendar invites for deliverables.
+
+CALENDAR_DELIVERY picks how deliverables reach the user's calendar: "api"
+(Google Calendar invites, the default), "ics" (one .ics file attached to the
+summary email, see ics.py) or "both".
+
+Each delivery has a blocking form, used by the Flask app and the crew workers,
+and an async form for the ASGI app (asgi.py) that keeps SMTP and Calendar round
+trips off the event loop.
+"""
+
+import asyncio
+import json
+import os
+import re
+import smtplib
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import httpx
+import markdown2
+import pytz
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+from src.legal_agent.recurrence import describe, rrule
+from src.legal_agent.tracing import span
+
+try:
+    import aiosmtplib
+except ImportError:  # optional: the async email path falls back to smtplib in a thread
+    aiosmtplib = None
+
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 465
+CALENDAR_SCOPES = ['https://www.googleapis.com/auth/calendar']
+CALENDAR_API_URL = "https://www.googleapis.com/calendar/v3"
+CALENDAR_DELIVERY = os.getenv("CALENDAR_DELIVERY", "api")
+ICS_FILENAME = "contract_deliverables.ics"
+
+# -------------------------
+# Email Functions
+# -------------------------
+def calendar_api_enabled() -> bool:
+    return CALENDAR_DELIVERY in ("api", "both")
+
+def calendar_file_enabled() -> bool:
+    return CALENDAR_DELIVERY in ("ics", "both")
+
+def send_summary_email(recipient: str, subject: str, summary_file: str, calendar_ics: str = None):
+    with open(summary_file, "r", encoding="utf-8") as f:
+        summary_text = f.read()
+    return send_summary_text(recipient, subject, summary_text, calendar_ics)
+
+def build_summary_message(sender_email: str, recipient: str, subject: str, summary_text: str,
+                          calendar_ics: str = None) -> MIMEMultipart:
+    summary_text = summary_text.strip()
+    if summary_text.startswith("```"):
+        summary_text = summary_text[summary_text.find("\n")+1:]
+    if summary_text.endswith("```"):
+        summary_text = summary_text[:summary_text.rfind("\n")]
+
+    msg = MIMEMultipart("alternative")
+    msg["From"] = sender_email
+    msg["To"] = recipient
+    msg["Subject"] = subject
+
+    full_body = f"{summary_text}\n\n"
+    html_body = markdown2.markdown(full_body)
+    plain_part = MIMEText(full_body, "plain")
+    html_part = MIMEText(html_body, "html")
+    
+    msg.attach(plain_part)
+    msg.attach(html_part)
+    if not calendar_ics:
+        return msg
+
+    # The text/html alternatives go inside a mixed message next to the calendar file
+    body = msg
+    msg = MIMEMultipart("mixed")
+    for header in ("From", "To", "Subject"):
+        msg[header] = body[header]
+        del body[header]
+    msg.attach(body)
+    calendar_part = MIMEText(calendar_ics, "calendar", "utf-8")
+    calendar_part.set_param("method", "PUBLISH")
+    calendar_part.add_header("Content-Disposition", "attachment", filename=ICS_FILENAME)
+    msg.attach(calendar_part)
+    return msg
+
+def _email_credentials():
+    sender_email = os.getenv("SENDER_EMAIL")
+    sender_password = os.getenv("EMAIL_PASSWORD")
+    
+    if not sender_email or not sender_password:
+        raise RuntimeError("Missing email credentials")
+    return sender_email, sender_password
+
+def send_summary_text(recipient: str, subject: str, summary_text: str, calendar_ics: str = None):
+    sender_email, sender_password = _email_credentials()
+    msg = build_summary_message(sender_email, recipient, subject, summary_text, calendar_ics)
+    
+    with span("email send", bytes=len(summary_text)):
+        with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT) as server:
+            server.login(sender_email, sender_password)
+            server.send_message(msg)
+
+    return f"✅ Email successfully sent to {recipient}"
+
+async def send_summary_text_async(recipient: str, subject: str, summary_text: str, calendar_ics: str = None):
+    """send_summary_text without holding a thread for the SMTP round trips (needs aiosmtplib)."""
+    if aiosmtplib is None:
+        return await asyncio.to_thread(send_summary_text, recipient, subject, summary_text, calendar_ics)
+
+    sender_email, sender_password = _email_credentials()
+    msg = build_summary_message(sender_email, recipient, subject, summary_text, calendar_ics)
+
+    with span("email send", bytes=len(summary_text), transport="aiosmtplib"):
+        await aiosmtplib.send(msg, hostname=SMTP_HOST, port=SMTP_PORT, use_tls=True,
+                              username=sender_email, password=sender_password)
+
+    return f"✅ Email successfully sent to {recipient}"
+
+# -------------------------
+# Calendar Functions
+# -------------------------
+def load_deliverables(deliverables=None):
+    """Deliverables passed in (a list or its JSON), or the crew's calendar_deliverables.json (None if there is none)."""
+    if isinstance(deliverables, str):
+        return json.loads(deliverables)
+    if deliverables is None:
+        if not os.path.exists('calendar_deliverables.json'):
+            return None
+        
+        with open('calendar_deliverables.json', 'r') as f:
+            deliverables = json.load(f)
+    return deliverables
+
+def load_calendar_credentials():
+    """Google credentials from GOOGLE_CALENDAR_TOKEN_JSON, refreshed if expired (None if unset)."""
+    token_json_str = os.getenv('GOOGLE_CALENDAR_TOKEN_JSON')
+    if not token_json_str:
+        return None
+    
+    token_data = json.loads(token_json_str)
+    creds = Credentials.from_authorized_user_info(token_data, CALENDAR_SCOPES)
+    
+    # Refresh token if needed
+    if not creds.valid and creds.expired and creds.refresh_token:
+        with span("calendar token refresh"):
+            creds.refresh(Request())
+    return creds
+
+def summarize_calendar_results(results: list) -> str:
+    created_count = sum(1 for result in results if "created" in result.lower())
+    existing_count = sum(1 for result in results if "exists" in result.lower())
+    print(f"📅 Calendar results: {results}")
+    return f"Calendar invites: {created_count} created, {existing_count} existing"
+
+def send_calendar_invites(user_email: str, deliverables: list = None) -> str:
+    """Send calendar invites for deliverables with time handling."""
+    try:
+        deliverables = load_deliverables(deliverables)
+        if deliverables is None:
+            return "No calendar deliverables found."
+        if not deliverables:
+            return "No deliverables to process."
+        
+        # Get Google Calendar credentials
+        creds = load_calendar_credentials()
+        if creds is None:
+            return "Calendar not configured."
+        
+        with span("calendar build service"):
+            service = build('calendar', 'v3', credentials=creds)
+        
+        results = [create_calendar_event(service, deliverable, user_email) for deliverable in deliverables]
+        return summarize_calendar_results(results)
+        
+    except Exception as e:
+        return f"Calendar error: {str(e)}"
+
+async def send_calendar_invites_async(user_email: str, deliverables: list = None) -> str:
+    """send_calendar_invites over the Calendar REST API with an async HTTP client."""
+    try:
+        deliverables = load_deliverables(deliverables)
+        if deliverables is None:
+            return "No calendar deliverables found."
+        if not deliverables:
+            return "No deliverables to process."
+        
+        # The OAuth refresh is a single blocking call; keep it off the event loop
+        creds = await asyncio.to_thread(load_calendar_credentials)
+        if creds is None:
+            return "Calendar not configured."
+        
+        headers = {"Authorization": f"Bearer {creds.token}"}
+        async with httpx.AsyncClient(base_url=CALENDAR_API_URL, headers=headers, timeout=30) as client:
+            results = [await create_calendar_event_async(client, deliverable, user_email)
+                       for deliverable in deliverables]
+        return summarize_calendar_results(results)
+        
+    except Exception as e:
+        return f"Calendar error: {str(e)}"
+
+def prepare_calendar_event(deliverable: dict, user_email: str) -> dict:
+    """Event body plus the duplicate-check window for a deliverable, or None if it lacks data."""
+    summary = deliverable.get('summary', '')
+    description = deliverable.get('description', '')
+    start_date = deliverable.get('start_date', '')
+    start_time = deliverable.get('start_time')
+    timezone_str = deliverable.get('timezone')
+    
+    if not all([summary, start_date]):
+        return None
+    
+    # Parse the base date
+    start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+    pst = pytz.timezone('America/Los_Angeles')
+    
+    # Determine if this is an all-day event or timed event
+    if start_time and start_time != 'null':
+        # Timed event - parse time and handle timezone conversion
+        event_config = create_timed_event(start_dt, start_time, timezone_str, pst)
+        # An unrecognized timezone comes back as an all-day event
+        event_type = "timed" if "dateTime" in event_config['event_times']['start'] else "all-day"
+    else:
+        # All-day event
+        event_config = create_all_day_event(start_dt)
+        event_type = "all-day"
+    
+    # Window to check for existing events
+    if event_type == "timed":
+        time_min = (event_config['start_dt'] - timedelta(hours=2)).isoformat()
+        time_max = (event_config['start_dt'] + timedelta(hours=4)).isoformat()
+    else:
+        time_min = start_dt.isoformat() + 'Z'
+        time_max = (start_dt + timedelta(days=1)).isoformat() + 'Z'
+    
+    event = {
+        "summary": f"📋 {summary}",
+        "description": f"Contract Deliverable\n\n{description}",
+        "reminders": {"useDefault": True},
+        "attendees": [{"email": user_email}],
+    }
+    
+    # Add start/end based on event type
+    event.update(event_config['event_times'])
+    
+    # A run of evenly spaced deliverables is one recurring event
+    recurrence = deliverable.get('recurrence')
+    repeats = ""
+    if recurrence:
+        event["recurrence"] = [f"RRULE:{rrule(recurrence)}"]
+        repeats = f", {describe(recurrence)}"
+    
+    return {
+        "event": event,
+        "event_type": event_type,
+        "list_params": {
+            "timeMin": time_min,
+            "timeMax": time_max,
+            "q": summary[:20],
+            "singleEvents": True,
+            "orderBy": "startTime",
+        },
+        "created_message": f"Created {event_type}: {summary} on {start_date} {start_time or ''}".strip() + repeats,
+        "exists_message": f"Exists: {summary} on {start_date}",
+    }
+
+def event_exists(events: list, event: dict) -> bool:
+    title = event["summary"].lower()
+    return any(title in existing.get('summary', '').lower() for existing in events)
+
+def create_calendar_event(service, deliverable: dict, user_email: str) -> str:
+    """Create a calendar event with time handling and timezone conversion."""
+    summary = deliverable.get('summary', '')
+    try:
+        prepared = prepare_calendar_event(deliverable, user_email)
+        if prepared is None:
+            return f"Skipped: Missing data for {summary}"
+        
+        # Check for existing events
+        with span("calendar events.list"):
+            events_result = service.events().list(calendarId='primary', **prepared["list_params"]).execute()
+        
+        if event_exists(events_result.get('items', []), prepared["event"]):
+            return prepared["exists_message"]
+        
+        # Create the event
+        with span("calendar events.insert"):
+            service.events().insert(
+                calendarId="primary",
+                body=prepared["event"],
+                sendUpdates="all"
+            ).execute()
+        
+        return prepared["created_message"]
+        
+    except Exception as e:
+        return f"Error with {summary}: {str(e)}"
+
+async def create_calendar_event_async(client, deliverable: dict, user_email: str) -> str:
+    """create_calendar_event against the REST API with an httpx.AsyncClient."""
+    summary = deliverable.get('summary', '')
+    try:
+        prepared = prepare_calendar_event(deliverable, user_email)
+        if prepared is None:
+            return f"Skipped: Missing data for {summary}"
+        
+        params = {k: str(v).lower() if isinstance(v, bool) else v for k, v in prepared["list_params"].items()}
+        with span("calendar events.list"):
+            response = await client.get("/calendars/primary/events", params=params)
+            response.raise_for_status()
+        
+        if event_exists(response.json().get('items', []), prepared["event"]):
+            return prepared["exists_message"]
+        
+        with span("calendar events.insert"):
+            response = await client.post("/calendars/primary/events", params={"sendUpdates": "all"},
+                                         json=prepared["event"])
+            response.raise_for_status()
+        
+        return prepared["created_message"]
+        
+    except Exception as e:
+        return f"Error with {summary}: {str(e)}"
+
+def create_timed_event(start_dt, start_time, original_timezone, target_timezone):
+    """Create configuration for a timed event with timezone conversion."""
+    # Parse the time
+    time_obj = datetime.strptime(start_time, '%H:%M').time()
+    combined_dt = datetime.combine(start_dt, time_obj)
+    
+    # Apply original timezone if specified, otherwise assume it's already in target timezone
+    if original_timezone and original_timezone != 'null':
+        original_tz = convert_timezone_string(original_timezone)
+        if original_tz:
+            combined_dt = original_tz.localize(combined_dt)
+            # Convert to target timezone
+            combined_dt = combined_dt.astimezone(target_timezone)
+        else:
+            # Guessing a zone would put the deadline hours off; keep the day and drop the time instead
+            print(f"⚠️ Unrecognized timezone '{original_timezone}', scheduling an all-day event on {start_dt:%Y-%m-%d}")
+            return create_all_day_event(start_dt)
+    else:
+        # No original timezone specified, assume target timezone
+        combined_dt = target_timezone.localize(combined_dt)
+    
+    end_dt = combined_dt + timedelta(hours=1)
+    
+    return {
+        'start_dt': combined_dt,
+        'event_times': {
+            "start": {"dateTime": combined_dt.isoformat(), "timeZone": "America/Los_Angeles"},
+            "end": {"dateTime": end_dt.isoformat(), "timeZone": "America/Los_Angeles"},
+        }
+    }
+
+def create_all_day_event(start_dt):
+    """Create configuration for an all-day event."""
+    return {
+        'start_dt': start_dt,
+        'event_times': {
+            "start": {"date": start_dt.strftime('%Y-%m-%d')},
+            "end": {"date": (start_dt + timedelta(days=1)).strftime('%Y-%m-%d')},
+        }
+    }
+
+# Spelled-out US zone names, matched after lowercasing and dropping "standard"/"daylight"/"time"
+TZ_NAMES = {
+    'pacific': 'America/Los_Angeles',
+    'eastern': 'America/New_York',
+    'central': 'America/Chicago',
+    'mountain': 'America/Denver',
+    'coordinated universal': 'UTC',
+    'greenwich mean': 'GMT',
+}
+
+
+def convert_timezone_string(tz_string):
+    """Convert an IANA name, a common abbreviation or a spelled-out US zone name to a pytz timezone."""
+    if not tz_string:
+        return None
+    # Abbreviations first: pytz's own "EST" and "MST" are fixed offsets without daylight saving
+    tz_mapping = {
+        'PST': 'America/Los_Angeles',
+        'PDT': 'America/Los_Angeles',
+        'PT': 'America/Los_Angeles',
+        'EST': 'America/New_York', 
+        'EDT': 'America/New_York',
+        'ET': 'America/New_York',
+        'CST': 'America/Chicago',
+        'CDT': 'America/Chicago',
+        'CT': 'America/Chicago',
+        'MST': 'America/Denver',
+        'MDT': 'America/Denver',
+        'MT': 'America/Denver',
+        'UTC': 'UTC',
+        'GMT': 'GMT'
+    }
+    
+    tz_string_upper = tz_string.upper().strip()
+    if tz_string_upper in tz_mapping:
+        return pytz.timezone(tz_mapping[tz_string_upper])
+    try:
+        return pytz.timezone(tz_string.strip())
+    except pytz.UnknownTimeZoneError:
+        pass
+    name = re.sub(r"\(.*?\)|\b(?:standard|daylight|time|zone)\b", " ", tz_string.lower())
+    name = " ".join(name.split())
+    if name in TZ_NAMES:
+        return pytz.timezone(TZ_NAMES[name])
+    return None
+
+def calendar_delivery_status(calendar_result: str) -> str:
+    """Map the human-readable calendar result onto a delivery status."""
+    if calendar_result.startswith("Calendar error"):
+        return "failed"
+    if calendar_result.startswith(("Calendar invites", "Calendar file")):
+        return "sent"
+    return "skipped"
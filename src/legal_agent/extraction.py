@@ -0,0 +1,72 @@
+"""
+The structured contract document produced by the extraction task.
+
+In creator mode, `parse_contract` reads the contract once and writes a
+single JSON document:
+
+    company_name, parties, clauses, payment_terms, legal_flags,
+    plain_english_summary, and deliverables with summary, description,
+    start_date (YYYY-MM-DD), start_time (HH:MM, 24-hour, or null) and
+    timezone (as written in the contract, or null)
+
+The risk, research and summary tasks read it through the context policies.
+The calendar sync reads its deliverables through calendar_deliverables()
+below. No second LLM pass over the contract is needed for the calendar.
+"""
+
+import json
+from typing import List, Optional
+
+EXTRACTION_TASK = "parse_contract"
+
+DELIVERABLE_FIELDS = ("summary", "description", "start_date", "start_time", "timezone")
+
+
+def parse_json_output(raw: str):
+    """JSON from an LLM answer, tolerating code fences and text around the object."""
+    text = raw.strip()
+    if text.startswith("```"):
+        text = text[text.find("\n") + 1:]
+        text = text[:text.rfind("```")] if text.rstrip().endswith("```") else text
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+    start = min(starts)
+    end = max(text.rfind("}"), text.rfind("]"))
+    try:
+        return json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+
+
+def _null(value):
+    return None if value in (None, "", "null", "None") else value
+
+
+def calendar_deliverables(extraction: str) -> Optional[List[dict]]:
+    """Deliverables with a due date, in the shape the calendar sync takes; None if the document is unreadable."""
+    document = parse_json_output(extraction or "")
+    if isinstance(document, dict):
+        items = document.get("deliverables") or []
+    elif isinstance(document, list):
+        items = document
+    else:
+        return None
+
+    deliverables = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        deliverable = {name: _null(item.get(name)) for name in DELIVERABLE_FIELDS}
+        deliverable["timezone"] = deliverable["timezone"] or _null(item.get("time_zone"))
+        deliverable["summary"] = deliverable["summary"] or _null(item.get("title"))
+        deliverable["description"] = deliverable["description"] or ""
+        if isinstance(deliverable["start_date"], str):
+            deliverable["start_date"] = deliverable["start_date"][:10]  # drop any time part of an ISO timestamp
+        if deliverable["summary"] and deliverable["start_date"]:
+            deliverables.append(deliverable)
+    return deliverables
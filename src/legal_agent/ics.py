@@ -0,0 +1,128 @@
+"""
+RFC 5545 calendar file for contract deliverables.
+
+With CALENDAR_DELIVERY=ics, every deliverable goes into a single .ics file
+attached to the summary email. No Google OAuth token or Calendar API calls
+are needed, and any calendar app can import it. ("both" sends the file and
+the API invites; the default "api" sends only the invites.)
+
+UIDs are derived from the recipient, the company and the deliverable's title
+(plus its position among deliverables with the same title). They are not
+derived from the date, so re-importing a revised contract's file updates a
+moved deadline instead of adding a second event.
+"""
+
+import hashlib
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+import pytz
+
+from src.legal_agent.delivery import create_timed_event
+from src.legal_agent.recurrence import rrule
+
+PRODID = "-//Legal Agent//Contract Deliverables//EN"
+UID_DOMAIN = "legal-agent"
+# Timed events are written in the same zone the Calendar API path uses, so weekly
+# repeats keep their local time across daylight saving changes
+TZID = "America/Los_Angeles"
+VTIMEZONE = [
+    "BEGIN:VTIMEZONE", f"TZID:{TZID}",
+    "BEGIN:DAYLIGHT", "TZOFFSETFROM:-0800", "TZOFFSETTO:-0700", "TZNAME:PDT",
+    "DTSTART:19700308T020000", "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU", "END:DAYLIGHT",
+    "BEGIN:STANDARD", "TZOFFSETFROM:-0700", "TZOFFSETTO:-0800", "TZNAME:PST",
+    "DTSTART:19701101T020000", "RRULE:FREQ=YEARLY;BYMONTH=11;BYDAY=1SU", "END:STANDARD",
+    "END:VTIMEZONE",
+]
+
+
+def _escape(text: str) -> str:
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _fold(line: str) -> str:
+    """Split a content line into 75-octet pieces, continuation lines starting with a space."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    pieces, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Never cut a UTF-8 sequence in half
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        pieces.append(encoded[start:end].decode("utf-8"))
+        start, limit = end, 74
+    return "\r\n ".join(pieces)
+
+
+def _uid(user_email: str, company_name: str, summary: str, occurrence: int) -> str:
+    key = "|".join([user_email.strip().lower(), company_name.strip().lower(), " ".join(summary.lower().split()),
+                    str(occurrence)])
+    return f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]}@{UID_DOMAIN}"
+
+
+def _local(dt: datetime) -> str:
+    return dt.strftime("%Y%m%dT%H%M%S")
+
+
+def event_lines(deliverable: dict, uid: str, stamp: str, sequence: int) -> List[str]:
+    """The VEVENT for one deliverable, or [] if it has no title or date."""
+    summary = deliverable.get("summary") or ""
+    start_date = deliverable.get("start_date") or ""
+    if not summary or not start_date:
+        return []
+    start_dt = datetime.strptime(start_date, "%Y-%m-%d")
+    start_time = deliverable.get("start_time")
+
+    lines = ["BEGIN:VEVENT", f"UID:{uid}", f"DTSTAMP:{stamp}", f"SEQUENCE:{sequence}"]
+    # Same timezone handling as the Calendar API path, which falls back to all-day for an unknown zone
+    timed = None
+    if start_time and start_time != "null":
+        timed = create_timed_event(start_dt, start_time, deliverable.get("timezone"), pytz.timezone(TZID))
+    if timed and "dateTime" in timed["event_times"]["start"]:
+        lines += [f"DTSTART;TZID={TZID}:{_local(timed['start_dt'])}",
+                  f"DTEND;TZID={TZID}:{_local(timed['start_dt'] + timedelta(hours=1))}"]
+    else:
+        lines += [f"DTSTART;VALUE=DATE:{start_dt.strftime('%Y%m%d')}",
+                  f"DTEND;VALUE=DATE:{(start_dt + timedelta(days=1)).strftime('%Y%m%d')}"]
+    if deliverable.get("recurrence"):
+        lines.append(f"RRULE:{rrule(deliverable['recurrence'])}")
+    description = "Contract Deliverable\n\n" + (deliverable.get("description") or "")
+    lines += [
+        f"SUMMARY:{_escape('📋 ' + summary)}",
+        f"DESCRIPTION:{_escape(description)}",
+        "TRANSP:TRANSPARENT",
+        "END:VEVENT",
+    ]
+    return lines
+
+
+def render_ics(deliverables: list, user_email: str, company_name: str = "") -> str:
+    """One VCALENDAR with an event per dated deliverable."""
+    now = time.time()
+    stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(now))
+    # Later files must carry a higher SEQUENCE for importers to treat them as updates
+    sequence = int(now // 60)
+    calendar_name = f"{company_name} deliverables" if company_name else "Contract deliverables"
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN", "METHOD:PUBLISH",
+             f"X-WR-CALNAME:{_escape(calendar_name)}"]
+    events, seen = [], {}
+    for deliverable in deliverables or []:
+        summary = deliverable.get("summary") or ""
+        occurrence = seen[summary.lower()] = seen.get(summary.lower(), -1) + 1
+        try:
+            events += event_lines(deliverable, _uid(user_email, company_name, summary, occurrence), stamp, sequence)
+        except ValueError as e:
+            print(f"Note: skipping deliverable '{summary}' in calendar file: {e}")
+    if any(line.startswith("DTSTART;TZID=") for line in events):
+        lines += VTIMEZONE
+    lines += events
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(_fold(line) for line in lines) + "\r\n"
+
+
+def count_events(ics: str) -> int:
+    return ics.count("BEGIN:VEVENT")
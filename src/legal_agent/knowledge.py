@@ -0,0 +1,364 @@
+"""
+Offline BM25 index over the legal reference material in knowledge/legal/.
+
+Drop .md, .txt or .pdf files into KNOWLEDGE_DIR and the index picks them up on
+the next refresh. Only files whose size or mtime changed are read and
+tokenized again; everything else comes from the per-file token cache. The
+postings, document lengths and chunk texts are flat binary files that are
+memory-mapped read-only, so a query touches only the postings of its own
+terms and every process shares the same page cache.
+
+Layout of INDEX_DIR:
+
+    CURRENT                   name of the live generation
+    files/<sha256>.json       tokenized chunks of one source file
+    <generation>/manifest.json  vocabulary (term -> postings offset, df) and chunk sources
+    <generation>/postings.bin   uint32 (chunk id, term frequency) pairs grouped by term
+    <generation>/lengths.bin    uint32 token count per chunk
+    <generation>/offsets.bin    uint64 byte offset of each chunk in chunks.bin (+ end)
+    <generation>/chunks.bin     UTF-8 chunk texts back to back
+
+A refresh writes a new generation and then swaps CURRENT, so readers never see
+a half-written index. Builds and swaps take an flock on INDEX_DIR/.lock, so
+processes refreshing at the same time take turns. The generation id is a hash
+of the content, so identical builds share one. Only generations older than
+the previous one are removed, which leaves a reader that has just read
+CURRENT time to open its generation. Each search holds a reference to the generation it
+started on. A superseded generation's maps are closed once its last search
+returns. Rebuild by hand with `python -m src.legal_agent.knowledge`.
+"""
+
+import fcntl
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from src.legal_agent.store import DATA_DIR
+
+KNOWLEDGE_DIR = os.path.abspath(os.getenv("KNOWLEDGE_DIR", os.path.join("knowledge", "legal")))
+INDEX_DIR = os.path.abspath(os.getenv("KNOWLEDGE_INDEX_DIR", os.path.join(DATA_DIR, "knowledge_index")))
+REFRESH_INTERVAL = float(os.getenv("KNOWLEDGE_REFRESH_INTERVAL", "30"))
+CHUNK_CHARS = 1200
+SUPPORTED_EXTENSIONS = (".md", ".txt", ".pdf")
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "shall may any all such not no".split()
+)
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        # Fold plurals so "rights" matches "right" and "royalties" matches "royalty"
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def split_chunks(text: str) -> List[str]:
+    """Paragraph-aligned chunks of about CHUNK_CHARS; a markdown heading always starts a new chunk."""
+    chunks, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and (paragraph.startswith("#") or len(current) + len(paragraph) > CHUNK_CHARS):
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _read_source(path: str) -> str:
+    if path.endswith(".pdf"):
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            return "\n".join(page.extract_text() or "" for page in pdf.pages)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def _write_atomic(path: str, data: bytes):
+    # A unique temporary name, so concurrent writers of the same file never share one
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@dataclass
+class KnowledgeHit:
+    source: str
+    text: str
+    score: float
+
+
+class _Generation:
+    """The memory-mapped files of one index generation, with a count of the searches using it."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.maps = {}
+        for name in ("postings", "lengths", "offsets", "chunks"):
+            with open(os.path.join(path, f"{name}.bin"), "rb") as f:
+                self.maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.postings = memoryview(self.maps["postings"]).cast("I")
+        self.lengths = memoryview(self.maps["lengths"]).cast("I")
+        self.offsets = memoryview(self.maps["offsets"]).cast("Q")
+        self.readers = 0
+        self.retired = False
+
+    def chunk_text(self, chunk_id: int) -> str:
+        start, end = self.offsets[chunk_id], self.offsets[chunk_id + 1]
+        return self.maps["chunks"][start:end].decode("utf-8")
+
+    def close(self):
+        # The views must go before the maps they point into can be closed
+        for view in (self.postings, self.lengths, self.offsets):
+            view.release()
+        for mapped in self.maps.values():
+            mapped.close()
+
+
+class KnowledgeIndex:
+    def __init__(self, source_dir: str = KNOWLEDGE_DIR, index_dir: str = INDEX_DIR):
+        self.source_dir = source_dir
+        self.index_dir = index_dir
+        self._lock = threading.RLock()
+        self._generation = None
+        self._live: Optional[_Generation] = None
+        self._last_refresh = 0.0
+
+    # -------------------------
+    # Building
+    # -------------------------
+    def _source_files(self) -> Dict[str, os.stat_result]:
+        files = {}
+        for root, _, names in os.walk(self.source_dir):
+            for name in sorted(names):
+                if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    files[os.path.relpath(path, self.source_dir)] = os.stat(path)
+        return files
+
+    def _current_generation(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.index_dir, "CURRENT"), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _load_manifest(self, generation: Optional[str]) -> dict:
+        if not generation:
+            return {}
+        try:
+            with open(os.path.join(self.index_dir, generation, "manifest.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _tokenized_file(self, rel_path: str, previous: Optional[dict], stat: os.stat_result) -> dict:
+        """Source file entry with its chunks, re-tokenized only if the file changed."""
+        if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime:
+            return previous
+
+        text = _read_source(os.path.join(self.source_dir, rel_path))
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": digest}
+        cache_path = os.path.join(self.index_dir, "files", f"{digest}.json")
+        if not os.path.exists(cache_path):
+            chunks = [{"text": chunk, "tf": dict(Counter(tokenize(chunk)))} for chunk in split_chunks(text)]
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            _write_atomic(cache_path, json.dumps(chunks, ensure_ascii=False).encode("utf-8"))
+        return entry
+
+    @contextmanager
+    def _build_lock(self):
+        """Serialize builds across processes."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(os.path.join(self.index_dir, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def refresh(self, force: bool = False) -> dict:
+        """Bring the index up to date with KNOWLEDGE_DIR; returns what changed."""
+        with self._lock, self._build_lock():
+            self._last_refresh = time.monotonic()
+            generation = self._current_generation()
+            manifest = self._load_manifest(generation)
+            previous_files = {} if force else manifest.get("files", {})
+            source_files = self._source_files()
+
+            files = {rel: self._tokenized_file(rel, previous_files.get(rel), stat)
+                     for rel, stat in source_files.items()}
+            changed = sorted(rel for rel in files if files[rel] is not previous_files.get(rel))
+            removed = sorted(set(previous_files) - set(files))
+            stats = {"files": len(files), "changed": changed, "removed": removed, "generation": generation}
+            if generation and not changed and not removed:
+                return stats
+
+            stats["generation"] = self._write_generation(files, generation)
+            return stats
+
+    def _write_generation(self, files: Dict[str, dict], previous: Optional[str]) -> str:
+        sources, lengths, offsets, texts = [], array("I"), array("Q", [0]), []
+        term_postings: Dict[str, array] = {}
+        position = 0
+        for rel, entry in sorted(files.items()):
+            with open(os.path.join(self.index_dir, "files", f"{entry['sha256']}.json"), "r", encoding="utf-8") as f:
+                chunks = json.load(f)
+            for chunk in chunks:
+                chunk_id = len(sources)
+                sources.append(rel)
+                lengths.append(sum(chunk["tf"].values()))
+                encoded = chunk["text"].encode("utf-8")
+                texts.append(encoded)
+                position += len(encoded)
+                offsets.append(position)
+                for term, tf in chunk["tf"].items():
+                    term_postings.setdefault(term, array("I")).extend((chunk_id, tf))
+
+        postings, vocabulary = array("I"), {}
+        for term in sorted(term_postings):
+            pairs = term_postings[term]
+            vocabulary[term] = [len(postings) // 2, len(pairs) // 2]  # pair offset, document frequency
+            postings.extend(pairs)
+
+        manifest = {
+            "files": files,
+            "sources": sources,
+            "avg_length": (sum(lengths) / len(lengths)) if lengths else 0.0,
+            "vocabulary": vocabulary,
+        }
+        body = json.dumps(manifest, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        generation = hashlib.sha256(body).hexdigest()[:16]
+        if generation == previous:
+            return generation
+        path = os.path.join(self.index_dir, generation)
+        os.makedirs(path, exist_ok=True)
+        # Empty files cannot be memory-mapped, so every binary file gets at least one padding word
+        _write_atomic(os.path.join(path, "postings.bin"), (postings or array("I", [0])).tobytes())
+        _write_atomic(os.path.join(path, "lengths.bin"), (lengths or array("I", [0])).tobytes())
+        _write_atomic(os.path.join(path, "offsets.bin"), offsets.tobytes())
+        _write_atomic(os.path.join(path, "chunks.bin"), b"".join(texts) or b"\0")
+        _write_atomic(os.path.join(path, "manifest.json"), body)
+        _write_atomic(os.path.join(self.index_dir, "CURRENT"), generation.encode("utf-8"))
+
+        # The previous generation stays for readers that read CURRENT just before the swap. Readers that
+        # still map an older one keep their (unlinked) files until they reopen
+        for name in os.listdir(self.index_dir):
+            old = os.path.join(self.index_dir, name)
+            if name not in (generation, previous, "files") and os.path.isdir(old):
+                shutil.rmtree(old, ignore_errors=True)
+        return generation
+
+    # -------------------------
+    # Querying
+    # -------------------------
+    def _open(self):
+        generation = self._current_generation()
+        if generation is None:
+            self.refresh()
+            generation = self._current_generation()
+        if generation == self._generation:
+            return
+        previous, self._live = self._live, _Generation(os.path.join(self.index_dir, generation))
+        self._generation = generation
+        if previous is not None:
+            previous.retired = True
+            if previous.readers == 0:
+                previous.close()
+
+    def _acquire(self) -> _Generation:
+        with self._lock:
+            self._open()
+            self._live.readers += 1
+            return self._live
+
+    def _release(self, live: _Generation):
+        with self._lock:
+            live.readers -= 1
+            if live.retired and live.readers == 0:
+                live.close()
+
+    def maybe_refresh(self):
+        if REFRESH_INTERVAL >= 0 and time.monotonic() - self._last_refresh >= REFRESH_INTERVAL:
+            self.refresh()
+
+    def search(self, query: str, k: int = 3) -> List[KnowledgeHit]:
+        live = self._acquire()
+        try:
+            return self._search(live, query, k)
+        finally:
+            self._release(live)
+
+    def _search(self, live: _Generation, query: str, k: int) -> List[KnowledgeHit]:
+        sources = live.manifest["sources"]
+        if not sources:
+            return []
+        n_chunks, avg_length = len(sources), live.manifest["avg_length"] or 1.0
+        vocabulary = live.manifest["vocabulary"]
+
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            if term not in vocabulary:
+                continue
+            offset, df = vocabulary[term]
+            idf = math.log(1 + (n_chunks - df + 0.5) / (df + 0.5))
+            for i in range(offset * 2, (offset + df) * 2, 2):
+                chunk_id, tf = live.postings[i], live.postings[i + 1]
+                norm = K1 * (1 - B + B * live.lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [KnowledgeHit(sources[chunk_id], live.chunk_text(chunk_id), score) for chunk_id, score in best]
+
+
+_index: Optional[KnowledgeIndex] = None
+
+
+def get_index() -> KnowledgeIndex:
+    """Process-wide index, refreshed at most every KNOWLEDGE_REFRESH_INTERVAL seconds."""
+    global _index
+    if _index is None:
+        _index = KnowledgeIndex()
+    _index.maybe_refresh()
+    return _index
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    result = KnowledgeIndex().refresh()
+    print(f"📚 Indexed {result['files']} files from {KNOWLEDGE_DIR} in {time.perf_counter() - started:.2f}s "
+          f"(changed: {len(result['changed'])}, removed: {len(result['removed'])}, generation {result['generation']})")
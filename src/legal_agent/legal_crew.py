@@ -11,7 +11,8 @@ from crewai.project import CrewBase, agent, crew, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
 from typing import List
 from dotenv import load_dotenv
-from src.legal_agent.tools.web_search import WebSearchTool
+from src.legal_agent.logs import CREW_VERBOSE
+from src.legal_agent.tools.knowledge_search import LEGAL_RESEARCH, research_tools
 
 load_dotenv()
 
@@ -34,7 +35,7 @@ class LegalAgent():
                 "You can quickly identify sections like payment terms, confidentiality, termination, "
                 "and liability, and rewrite them in structured, easy-to-parse text for further analysis."
             ),
-            verbose=True
+            verbose=CREW_VERBOSE
         )
 
 
@@ -51,27 +52,27 @@ class LegalAgent():
                 "You are a cautious and thorough legal analyst trained to spot red flags in agreements. "
                 "You flag any terms that might be unfair, vague, one-sided, or harmful to the user’s rights."
             ),
-            verbose=True
+            verbose=CREW_VERBOSE
         )
 
-    # @agent
-    # def legal_researcher(self) -> Agent:
-    #     """Finds and summarizes relevant legal info online."""
-    #     return Agent(
-    #         role="Legal Research Assistant",
-    #         goal=(
-    #             "Quickly identify and evaluate potential legal and business risks."
-    #             "Do not make-up information that is not within the text. "
-    #         ),
-    #         backstory=(
-    #             "You are a skilled legal researcher capable of finding definitions, precedents, and explanations "
-    #             "online using trusted sources and summarizing findings concisely."
-    #         ),
-    #         verbose=True,
-    #         tools=[WebSearchTool()], 
-    #         allow_delegation=False,
-    #         max_iter=1
-    #     )
+    # Not decorated with @agent: only added to the crews when LEGAL_RESEARCH is enabled
+    def legal_researcher(self) -> Agent:
+        """Looks up unclear terms in the legal knowledge index (or online)."""
+        return Agent(
+            role="Legal Research Assistant",
+            goal=(
+                "Quickly identify and evaluate potential legal and business risks."
+                "Do not make-up information that is not within the text. "
+            ),
+            backstory=(
+                "You are a skilled legal researcher capable of finding definitions, precedents, and explanations "
+                "in trusted reference material and summarizing findings concisely."
+            ),
+            verbose=CREW_VERBOSE,
+            tools=research_tools(),
+            allow_delegation=False,
+            max_iter=1
+        )
 
 
     @agent
@@ -84,7 +85,7 @@ class LegalAgent():
                 "You are an empathetic communicator who translates legal findings into simple, actionable advice "
                 "for non-lawyers. You never provide legal advice — only educational summaries."
             ),
-            verbose=True
+            verbose=CREW_VERBOSE
         )
 
 
@@ -94,12 +95,14 @@ class LegalAgent():
         """Extract clauses and structure the contract for analysis."""
         return Task(
             description=(
-                "Analyze the following contract for the user {user_email}.\n\n"
-                "Contract text:\n{contract_text}"
+                # Static instructions first and per-contract values last, so the prompt prefix is cacheable
+                "Analyze the contract given at the end of this task for the user.\n\n"
                 "1. Identify and label key clauses like confidentiality, termination, payment, and liability.\n"
                 "2. If a company name or organization name is present (e.g. 'This agreement is between X and Y'), "
                 "extract the **main company name** and store it as `company_name` for later use. If no company name present, save company_name as '' (Empty string)\n"
-                "3. Return a structured JSON containing `clauses`, `summaries`, and `company_name`."
+                "3. Return a structured JSON containing `clauses`, `summaries`, and `company_name`.\n\n"
+                "User: {user_email}\n\n"
+                "Contract text:\n{contract_text}"
             ),
             expected_output=(
                 "A structured list of contract clauses with labels and short summaries for each section."
@@ -122,21 +125,22 @@ class LegalAgent():
             agent=self.risk_analyzer()
         )
 
-    # @task
-    # def research_clarifications(self) -> Task:
-    #     """Research unclear or complex clauses online."""
-    #     return Task(
-    #         description=(
-    #             "Search the internet for definitions, precedents, or explanations about unclear terms. "
-    #             "Summarize findings and cite at least one credible source."
-    #             "ONLY research if contract has unclear perpetual rights or unusual clauses.\n"
-    #             "Otherwise: 'No research needed'"
-    #         ),
-    #         expected_output=(
-    #             "Brief research or 'No research needed'"
-    #         ),
-    #         agent=self.legal_researcher()
-    #     )
+    # Not decorated with @task: inserted by _with_research
+    def research_clarifications(self, legal_researcher: Agent) -> Task:
+        """Look up unclear or complex clauses."""
+        return Task(
+            description=(
+                "Look up definitions, precedents, or explanations for unclear terms in the risk report. "
+                "Summarize findings and cite the source of each one. "
+                "ONLY research if contract has unclear perpetual rights or unusual clauses.\n"
+                "Otherwise: 'No research needed'"
+            ),
+            expected_output=(
+                "Brief research or 'No research needed'"
+            ),
+            agent=legal_researcher,
+            name="research_clarifications"
+        )
 
 
     @task
@@ -159,17 +163,66 @@ class LegalAgent():
             output_file="contract_summary.md"
         )
 
+    # Not decorated with @task so it stays out of the full review crew
+    def summarize_amendment(self) -> Task:
+        """Update the previous summary using the analysis of the changed clauses only."""
+        return Task(
+            description=(
+                "This contract is a revised version of one the user already had reviewed. "
+                "Only the clauses analyzed in the previous steps changed; every other clause is identical "
+                "to the previous version.\n\n"
+                "Update the previous summary in plain English so it reflects the changed clauses and their risks. "
+                "Keep everything that did not change, and keep the disclaimer that this is not legal advice.\n\n"
+                "What changed:\n{change_summary}\n\n"
+                "Previous risk report:\n{previous_risks}\n\n"
+                "Previous summary:\n{previous_summary}"
+            ),
+            expected_output=(
+                "A markdown-formatted report starting with a '## What Changed' section that explains each "
+                "modified, added or removed clause and whether it makes the contract better or worse for the user, "
+                "followed by the full updated summary and a disclaimer at the end."
+            ),
+            agent=self.user_advocate(),
+            output_file="contract_summary.md",
+            name="summarize_amendment"
+        )
+
 
     # === CREW ===
+    def _with_research(self, agents: list, tasks: list):
+        """Insert the research step after the risk analysis when LEGAL_RESEARCH is on."""
+        if LEGAL_RESEARCH == "off":
+            return agents, tasks
+        legal_researcher = self.legal_researcher()
+        position = next(i for i, task in enumerate(tasks) if task.name == "analyze_risks") + 1
+        return agents + [legal_researcher], tasks[:position] + [self.research_clarifications(legal_researcher)] + tasks[position:]
+
     @crew
     def crew(self) -> Crew:
         """Creates and configures the LegalAgent crew."""
+        agents, tasks = self._with_research(list(self.agents), list(self.tasks))
         return Crew(
-            agents=self.agents,
-            tasks=self.tasks,
+            agents=agents,
+            tasks=tasks,
             process=Process.sequential,
-            verbose=True,
+            verbose=CREW_VERBOSE,
             memory=False,  # ← Optional: Disable memory to reduce complexity
             embedder=None,  # ← Optional: Disable memory to reduce complexity
             tracing=False
         )
+
+    def amendment_crew(self) -> Crew:
+        """Creates a crew that only re-reviews the clauses changed since the previous version."""
+        agents, tasks = self._with_research(
+            [self.researcher(), self.risk_analyzer(), self.user_advocate()],
+            [self.parse_contract(), self.analyze_risks(), self.summarize_amendment()],
+        )
+        return Crew(
+            agents=agents,
+            tasks=tasks,
+            process=Process.sequential,
+            verbose=CREW_VERBOSE,
+            memory=False,
+            embedder=None,
+            tracing=False
+        )
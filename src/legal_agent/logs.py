@@ -0,0 +1,209 @@
+"""
+Structured, non-blocking logging.
+
+setup_logging() routes the process's log output through one queue:
+
+- Every log record, and by default every line written to stdout (the
+  pipeline's emoji progress lines, CrewAI's console output), becomes a
+  logging record. The caller only puts it on a bounded in-memory queue. A
+  QueueListener thread formats it and writes it to the real stdout. When the
+  queue is full, records are dropped and counted in
+  legal_agent_log_records_dropped_total. A slow log shipper therefore never
+  stalls a request or a crew.
+- With LOG_FORMAT=json (the default) each record is one JSON object. It has
+  ts, level, logger, msg, pid, and the job_id and trace_id of the review it
+  belongs to. LOG_FORMAT=text keeps plain lines for local development.
+- Every string field is capped at LOG_MAX_FIELD_CHARS, so a contract or a
+  crew result can never land in the logs whole.
+
+The crews are built with verbose output off. A sample of jobs,
+CREW_VERBOSE_SAMPLE_RATE of them, picked by job id, runs verbosely so agent
+reasoning is still there to debug from. CREW_VERBOSE=1 turns it on for
+every job.
+"""
+
+import atexit
+import contextvars
+import hashlib
+import io
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from src.legal_agent import metrics
+from src.legal_agent.tracing import current_span
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").strip().lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "2000"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_CAPTURE_STDOUT = os.getenv("LOG_CAPTURE_STDOUT", "1") != "0"
+CREW_VERBOSE = os.getenv("CREW_VERBOSE", "0") == "1"
+CREW_VERBOSE_SAMPLE_RATE = float(os.getenv("CREW_VERBOSE_SAMPLE_RATE", "0.05"))
+
+logger = logging.getLogger("legal_agent")
+stdout_logger = logging.getLogger("legal_agent.stdout")
+
+_job_id = contextvars.ContextVar("legal_agent_job_id", default="")
+_setup_lock = threading.Lock()
+_configured_pid = None
+
+
+def truncate(value: str, limit: int = LOG_MAX_FIELD_CHARS) -> str:
+    if len(value) <= limit:
+        return value
+    return f"{value[:limit]}… [+{len(value) - limit} chars]"
+
+
+@contextmanager
+def job_context(job_id: str):
+    """Tag every record logged inside the block with job_id."""
+    token = _job_id.set(job_id)
+    try:
+        yield
+    finally:
+        _job_id.reset(token)
+
+
+def log_event(message: str, level: int = logging.INFO, **fields):
+    """Log a message with structured fields; long string values are capped."""
+    logger.log(level, message, extra={"fields": fields})
+
+
+# -------------------------
+# Handlers
+# -------------------------
+class _ContextFilter(logging.Filter):
+    """Copies the job and trace ids onto the record in the thread that logged it."""
+
+    def filter(self, record):
+        record.job_id = _job_id.get()
+        record.trace_id = getattr(current_span(), "trace_id", "")
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        event = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": truncate(record.getMessage()),
+            "pid": record.process,
+        }
+        for key in ("job_id", "trace_id"):
+            if getattr(record, key, ""):
+                event[key] = getattr(record, key)
+        for key, value in (getattr(record, "fields", None) or {}).items():
+            event[key] = truncate(value) if isinstance(value, str) else value
+        if record.exc_info:
+            event["exc"] = truncate(self.formatException(record.exc_info))
+        return json.dumps(event, ensure_ascii=False, default=lambda value: truncate(str(value)))
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        message = truncate(record.getMessage())
+        fields = getattr(record, "fields", None)
+        if fields:
+            message += " " + " ".join(f"{key}={truncate(str(value), 200)}" for key, value in fields.items())
+        return message
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Only cap the message here; formatting happens on the listener thread
+        record = super().prepare(record)
+        record.msg = truncate(record.msg) if isinstance(record.msg, str) else record.msg
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.LOG_RECORDS_DROPPED.inc()
+
+
+class _StdoutToLog(io.TextIOBase):
+    """A stdout replacement that logs each complete line."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return False
+
+    def fileno(self):
+        return self._stream.fileno()
+
+    @property
+    def encoding(self):
+        return getattr(self._stream, "encoding", "utf-8")
+
+    def write(self, text):
+        buffer = getattr(self._local, "buffer", "") + text
+        *lines, self._local.buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                stdout_logger.info(line.rstrip())
+        return len(text)
+
+    def flush(self):
+        buffer = getattr(self._local, "buffer", "")
+        if buffer.strip():
+            stdout_logger.info(buffer.rstrip())
+        self._local.buffer = ""
+
+
+def setup_logging():
+    """Install the queue handler on the root logger, once per process."""
+    global _configured_pid
+    with _setup_lock:
+        if _configured_pid == os.getpid():
+            return
+        _configured_pid = os.getpid()
+
+        output = logging.StreamHandler(sys.__stdout__)
+        output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+        records = queue.Queue(LOG_QUEUE_SIZE)
+        handler = _DroppingQueueHandler(records)
+        handler.addFilter(_ContextFilter())
+        listener = logging.handlers.QueueListener(records, output)
+        listener.start()
+        atexit.register(listener.stop)
+
+        root = logging.getLogger()
+        root.handlers = [handler]
+        root.setLevel(LOG_LEVEL)
+        if LOG_CAPTURE_STDOUT and not isinstance(sys.stdout, _StdoutToLog):
+            sys.stdout = _StdoutToLog(sys.__stdout__)
+
+
+# -------------------------
+# Crew verbosity
+# -------------------------
+def verbose_sampled(job_id: str) -> bool:
+    """Whether this job's crew runs verbosely; stable for a job id."""
+    if CREW_VERBOSE:
+        return True
+    bucket = int(hashlib.sha256(job_id.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return bucket < CREW_VERBOSE_SAMPLE_RATE
+
+
+def apply_verbosity(crew, job_id: str):
+    verbose = verbose_sampled(job_id)
+    crew.verbose = verbose
+    for agent in crew.agents:
+        agent.verbose = verbose
+    if verbose:
+        log_event("Verbose crew trace sampled for this job", sample_rate=CREW_VERBOSE_SAMPLE_RATE)
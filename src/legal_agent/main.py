@@ -70,6 +70,102 @@ def run_with_trigger():
         raise Exception(f"An error occurred while running the crew with trigger: {e}")
 
 
+def _command_args(command: str) -> list:
+    """Arguments after the command, whether run as `python main.py <command> ...` or as the `<command>` script."""
+    if len(sys.argv) > 1 and sys.argv[1] == command:
+        return sys.argv[2:]
+    return sys.argv[1:]
+
+
+def worker():
+    """
+    Run the crew worker pool that processes jobs queued by the web app.
+    Usage: python main.py worker [processes] [max_jobs_per_child]
+    """
+    # Same import root as the pool's own modules, so metrics and stores are loaded once
+    from src.legal_agent.worker import WorkerPool, WORKER_PROCESSES, MAX_JOBS_PER_CHILD
+
+    args = _command_args("worker")
+    processes = int(args[0]) if len(args) > 0 else WORKER_PROCESSES
+    max_jobs_per_child = int(args[1]) if len(args) > 1 else MAX_JOBS_PER_CHILD
+    WorkerPool(processes=processes, max_jobs_per_child=max_jobs_per_child).serve()
+
+
+def replay():
+    """
+    Re-run a stored review job from one of its tasks, reusing the checkpoints of the tasks before it.
+    Without from_task the job resumes after its last checkpoint.
+    Usage: python main.py replay <job_id> [from_task]
+    """
+    from src.legal_agent.brand_legal_crew import ContentCreatorLegalCrew
+    from src.legal_agent.checkpoints import checkpoints_before
+    from src.legal_agent.legal_crew import LegalAgent
+    from src.legal_agent.pipeline import process_job
+    from src.legal_agent.store import ResultStore
+
+    args = _command_args("replay")
+    if not args:
+        raise Exception("No job id provided. Usage: python main.py replay <job_id> [from_task]")
+    job_id = args[0]
+    from_task = args[1] if len(args) > 1 else None
+
+    result_store = ResultStore()
+    job = result_store.get_job(job_id)
+    if job is None:
+        raise Exception(f"Job {job_id} not found")
+
+    crew_class = ContentCreatorLegalCrew if job["mode"] == "creator" else LegalAgent
+    task_names = [task.name for task in crew_class().crew().tasks]
+    if "summarize_amendment" in job["outputs"]:
+        # Amendment runs only analyzed the changed clauses, so their checkpoints don't fit the full crew
+        print("Note: job was an amendment review; replaying the full crew from the start")
+        checkpoints = {}
+    else:
+        checkpoints = checkpoints_before(result_store.get_outputs(job_id, task_names), task_names, from_task)
+
+    try:
+        payload = process_job(job_id, result_store, checkpoints)
+        print(json.dumps(payload, indent=2))
+        return payload
+    except Exception as e:
+        raise Exception(f"An error occurred while replaying job {job_id}: {e}")
+
+
+def calibrate():
+    """
+    Compare estimated and actual durations of finished queued jobs and suggest new cost coefficients.
+    Usage: python main.py calibrate [jobs]
+    """
+    from src.legal_agent.scheduling import CALIBRATION_JOBS, calibration
+    from src.legal_agent.store import ResultStore
+
+    args = _command_args("calibrate")
+    jobs = int(args[0]) if args else CALIBRATION_JOBS
+    report = calibration(ResultStore().duration_samples(jobs))
+    if not report:
+        print("No finished queued jobs with an estimate yet")
+    for mode, stats in report.items():
+        fitted = stats["fitted"] or {}
+        print(f"{mode}: {stats['jobs']} jobs, estimated {stats['mean_estimated_seconds']}s, "
+              f"actual {stats['mean_actual_seconds']}s on average "
+              f"(median actual/estimate {stats['median_actual_over_estimate']})")
+        if fitted.get("seconds_per_kchar") is not None:
+            print(f"  suggested: SJF_{mode.upper()}_BASE_SECONDS={fitted['base_seconds']} "
+                  f"SJF_{mode.upper()}_SECONDS_PER_KCHAR={fitted['seconds_per_kchar']}")
+    return report
+
+
+def coordination_server():
+    """
+    Run the coordination server the dynos share when COORDINATION_URL points at it.
+    Usage: python main.py coordination_server [port]
+    """
+    from src.legal_agent.coordination import COORDINATION_PORT, serve
+
+    args = _command_args("coordination_server")
+    serve(int(args[0]) if args else COORDINATION_PORT)
+
+
 # ====================================================
 # Command Line Entrypoint
 # ====================================================
@@ -78,9 +174,12 @@ if __name__ == "__main__":
         print("Usage:")
         print("  python main.py run")
         print("  python main.py train <iterations> <filename>")
-        print("  python main.py replay <task_id>")
+        print("  python main.py replay <job_id> [from_task]")
         print("  python main.py test <iterations> <eval_llm>")
         print("  python main.py run_with_trigger '<json_payload>'")
+        print("  python main.py worker [processes] [max_jobs_per_child]")
+        print("  python main.py calibrate [jobs]")
+        print("  python main.py coordination_server [port]")
         sys.exit(1)
 
     command = sys.argv[1]
@@ -88,6 +187,14 @@ if __name__ == "__main__":
         run()
     elif command == "run_with_trigger":
         run_with_trigger()
+    elif command == "worker":
+        worker()
+    elif command == "replay":
+        replay()
+    elif command == "calibrate":
+        calibrate()
+    elif command == "coordination_server":
+        coordination_server()
     else:
         print(f"Unknown command: {command}")
         sys.exit(1)
@@ -0,0 +1,339 @@
+"""
+In-process metrics with a Prometheus text exposition.
+
+Counters, gauges and histograms are plain dicts updated under a lock, so
+recording a sample costs a dictionary update. To work across gunicorn workers
+and crew worker processes, every process periodically writes its own snapshot
+to METRICS_DIR/metrics_<pid>_<token>.json (at most once per
+METRICS_FLUSH_INTERVAL and at exit). The random token keeps a process that
+reuses a pid from overwriting the dead process's counters. /metrics merges
+all snapshots: counters and histograms are summed over every process that
+ever wrote one, gauges only over processes still alive.
+
+Worker children are recycled, so dead processes' snapshots would pile up.
+Each scrape therefore folds the counters and histograms of dead processes
+into METRICS_DIR/aggregate.json and deletes their snapshots. It does this
+under a file lock. The aggregate lists the snapshots it absorbed, so a crash
+between writing it and deleting them cannot count them twice.
+"""
+
+import atexit
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Tuple
+
+METRICS_DIR = os.path.abspath(os.getenv(
+    "METRICS_DIR", os.path.join(os.getenv("LEGAL_AGENT_DATA_DIR", "data"), "metrics")
+))
+FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1.0"))
+
+# Crew runs take minutes, so the default buckets stretch to the 15-minute timeout and beyond
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 900, 1800)
+FAST_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_lock = threading.Lock()
+_registry: Dict[str, "_Metric"] = {}
+_last_flush = 0.0
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: Iterable[Tuple[str, str]], extra: Dict[str, str] = None) -> str:
+    pairs = list(key) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+        _registry[name] = self
+
+    def snapshot(self) -> dict:
+        return {"kind": self.kind, "help": self.documentation,
+                "values": [[list(map(list, key)), value] for key, value in self.values.items()]}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        _maybe_flush()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        _maybe_flush()
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with _lock:
+            self.values[_label_key(labels)] = value
+        _maybe_flush()
+
+    def track_inprogress(self, **labels):
+        gauge = self
+
+        class _InProgress:
+            def __enter__(self):
+                gauge.inc(**labels)
+
+            def __exit__(self, *exc):
+                gauge.dec(**labels)
+
+        return _InProgress()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with _lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["buckets"][i] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+        _maybe_flush()
+
+    def time(self, **labels):
+        histogram = self
+
+        class _Timer:
+            def __enter__(self):
+                self.start = time.perf_counter()
+
+            def __exit__(self, *exc):
+                histogram.observe(time.perf_counter() - self.start, **labels)
+
+        return _Timer()
+
+    def snapshot(self) -> dict:
+        data = super().snapshot()
+        data["buckets"] = list(self.buckets)
+        return data
+
+
+# -------------------------
+# Multiprocess snapshots
+# -------------------------
+AGGREGATE_PATH = os.path.join(METRICS_DIR, "aggregate.json")
+_LOCK_PATH = os.path.join(METRICS_DIR, ".merge.lock")
+_instance = (None, "")
+
+
+def _snapshot_path(pid: int) -> str:
+    global _instance
+    if _instance[0] != pid:
+        # A new token after fork as well, since children inherit the module state
+        _instance = (pid, uuid.uuid4().hex[:12])
+    return os.path.join(METRICS_DIR, f"metrics_{pid}_{_instance[1]}.json")
+
+
+def _write_json(path: str, document: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(document, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def flush():
+    """Write this process's metrics to its snapshot file."""
+    global _last_flush
+    with _lock:
+        document = {"pid": os.getpid(), "metrics": {name: m.snapshot() for name, m in _registry.items()}}
+        _last_flush = time.monotonic()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _write_json(_snapshot_path(os.getpid()), document)
+
+
+def _maybe_flush():
+    if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        try:
+            flush()
+        except OSError as e:
+            print(f"Note: could not write metrics snapshot: {e}")
+
+
+atexit.register(flush)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _fold(merged: Dict[str, dict], metrics: Dict[str, dict], gauges: bool):
+    """Add one snapshot's metrics into `merged`; gauges only if the process is alive."""
+    for name, data in metrics.items():
+        if data["kind"] == "gauge" and not gauges:
+            continue
+        target = merged.setdefault(name, {"kind": data["kind"], "help": data["help"],
+                                          "buckets": data.get("buckets"), "values": {}})
+        for raw_key, value in data["values"]:
+            key = tuple(tuple(pair) for pair in raw_key)
+            if data["kind"] == "histogram":
+                entry = target["values"].setdefault(
+                    key, {"buckets": [0] * len(value["buckets"]), "sum": 0.0, "count": 0})
+                entry["buckets"] = [a + b for a, b in zip(entry["buckets"], value["buckets"])]
+                entry["sum"] += value["sum"]
+                entry["count"] += value["count"]
+            else:
+                target["values"][key] = target["values"].get(key, 0) + value
+
+
+def _as_snapshot(merged: Dict[str, dict]) -> Dict[str, dict]:
+    return {name: {"kind": data["kind"], "help": data["help"], "buckets": data["buckets"],
+                   "values": [[list(map(list, key)), value] for key, value in data["values"].items()]}
+            for name, data in merged.items()}
+
+
+def _merge_snapshots() -> Dict[str, dict]:
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with open(_LOCK_PATH, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        aggregate = _read_json(AGGREGATE_PATH) or {"metrics": {}, "folded": []}
+        absorbed = set(aggregate["folded"])
+        dead: Dict[str, dict] = {}
+        _fold(dead, aggregate["metrics"], gauges=False)
+        live, newly_dead = [], []
+        for path in glob.glob(os.path.join(METRICS_DIR, "metrics_*.json")):
+            if os.path.basename(path) in absorbed:
+                # Folded by a scrape that stopped before deleting it
+                _remove(path)
+                continue
+            document = _read_json(path)
+            if document is None:
+                continue
+            if _pid_alive(document["pid"]):
+                live.append(document)
+            else:
+                _fold(dead, document["metrics"], gauges=False)
+                newly_dead.append(path)
+        if newly_dead:
+            _write_json(AGGREGATE_PATH, {"metrics": _as_snapshot(dead),
+                                         "folded": [os.path.basename(path) for path in newly_dead]})
+            for path in newly_dead:
+                _remove(path)
+
+    merged = dead
+    for document in live:
+        _fold(merged, document["metrics"], gauges=True)
+    return merged
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_latest(extra_gauges: Dict[str, Tuple[str, float]] = None) -> str:
+    """Prometheus text exposition format (version 0.0.4) merged across processes."""
+    flush()
+    lines = []
+    for name, data in sorted(_merge_snapshots().items()):
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['kind']}")
+        for key, value in sorted(data["values"].items()):
+            if data["kind"] == "histogram":
+                # Bucket counts are already cumulative (each sample counts in every bucket >= it)
+                for bound, count in zip(data["buckets"], value["buckets"]):
+                    lines.append(f"{name}_bucket{_format_labels(key, {'le': _format_value(bound)})} {count}")
+                lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(key)} {value['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+    for name, (documentation, value) in (extra_gauges or {}).items():
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------
+# Application metrics
+# -------------------------
+UPLOADS = Counter("legal_agent_uploads_total", "Contracts uploaded, by review mode and execution path.")
+ADMISSION_REJECTIONS = Counter("legal_agent_admission_rejections_total", "Uploads refused with 429, by reason.")
+PREFLIGHT_REJECTIONS = Counter("legal_agent_preflight_rejections_total",
+                               "Uploads rejected as non-contracts before the crew ran, by what they looked like.")
+JOBS = Counter("legal_agent_jobs_total", "Finished review jobs, by mode and final status.")
+JOBS_IN_FLIGHT = Gauge("legal_agent_jobs_in_flight", "Review jobs currently being processed.")
+CREW_DURATION = Histogram("legal_agent_crew_duration_seconds", "Wall-clock duration of a crew run.")
+TASK_DURATION = Histogram("legal_agent_crew_task_duration_seconds", "Wall-clock duration of each crew task.")
+JOB_DURATION_RATIO = Histogram("legal_agent_job_duration_ratio",
+                               "Actual over estimated duration of queued review jobs, by mode.",
+                               buckets=(0.25, 0.5, 0.75, 0.9, 1.1, 1.25, 1.5, 2, 3, 5))
+CREW_TIMEOUTS = Counter("legal_agent_crew_timeouts_total",
+                        "Crew runs aborted by the crew timeout or a task's time budget.")
+PARTIAL_REVIEWS = Counter("legal_agent_partial_reviews_total",
+                          "Reviews sent from the tasks that finished before a time budget ran out.")
+DUPLICATE_SUBMISSIONS = Counter("legal_agent_duplicate_submissions_total",
+                                "Uploads answered with an in-flight job reviewing the same PDF, by mode.")
+LEASES_REASSIGNED = Counter("legal_agent_leases_reassigned_total",
+                            "Jobs queued again after their worker's lease expired.")
+PDF_EXTRACTION_DURATION = Histogram("legal_agent_pdf_extraction_seconds", "PDF text extraction time.",
+                                    buckets=FAST_BUCKETS)
+DELIVERIES = Counter("legal_agent_deliveries_total", "Email and calendar deliveries, by channel and status.")
+DELIVERY_FAILURES = Counter("legal_agent_delivery_failures_total", "Failed email and calendar deliveries.")
+LOG_RECORDS_DROPPED = Counter("legal_agent_log_records_dropped_total",
+                              "Log records dropped because the logging queue was full.")
+CACHE_HITS = Counter("legal_agent_cache_hits_total", "Work avoided by a cache, by cache name.")
+CACHE_MISSES = Counter("legal_agent_cache_misses_total", "Cache lookups that fell through, by cache name.")
+PROMPT_TOKENS = Counter("legal_agent_llm_prompt_tokens_total", "Prompt tokens sent to the LLM, by mode and task.")
+CACHED_PROMPT_TOKENS = Counter("legal_agent_llm_cached_prompt_tokens_total",
+                               "Prompt tokens served from the provider's prompt cache, by mode and task.")
@@ -0,0 +1,148 @@
+"""
+OCR fallback for scanned contracts.
+
+pdfplumber only reads the text layer, so a scanned page comes back empty.
+extract_contract_text() sends only the pages that have images but (almost)
+no text through this module. Text-layer pages never reach it.
+
+Each page is rendered with pypdfium2 and read with Tesseract (pytesseract
+plus the `tesseract` binary). Pages run in a process pool of OCR_WORKERS
+processes. Inside the crew worker pool, whose children may not start
+processes of their own, a thread pool is used instead. Tesseract runs as a
+subprocess either way, so the threads still overlap.
+
+Results are cached under DATA_DIR/ocr_cache, keyed by the SHA-256 of the
+PDF, the page index, the render scale and the language. A re-upload of the
+same file (or a retry of its job) neither renders nor OCRs its scanned pages
+again; only a miss pays for the render.
+
+Set OCR_ENABLED=0 to turn the fallback off. If Tesseract is not installed,
+scanned pages stay empty and a note is logged.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from src.legal_agent import metrics
+from src.legal_agent.coordination import content_digest
+from src.legal_agent.store import DATA_DIR
+
+try:
+    import pytesseract
+except ImportError:  # optional: scanned pages stay empty without it
+    pytesseract = None
+
+OCR_ENABLED = os.getenv("OCR_ENABLED", "1") != "0"
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+OCR_RESOLUTION = int(os.getenv("OCR_RESOLUTION", "300"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Pages with fewer characters than this in their text layer count as scanned
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "25"))
+OCR_CACHE_DIR = os.path.join(DATA_DIR, "ocr_cache")
+
+# pdfium is not thread-safe; only matters when pages are rendered from threads
+_render_lock = threading.Lock()
+
+
+def ocr_available() -> bool:
+    return OCR_ENABLED and pytesseract is not None and shutil.which("tesseract") is not None
+
+
+def needs_ocr(page, text: str) -> bool:
+    """A page whose text layer is (nearly) empty but which has images on it."""
+    return len(text.strip()) < OCR_MIN_CHARS and bool(page.images)
+
+
+# -------------------------
+# Per-page cache
+# -------------------------
+def _cache_path(key: str) -> str:
+    return os.path.join(OCR_CACHE_DIR, key[:2], f"{key}.txt")
+
+
+def _cache_get(key: str):
+    try:
+        with open(_cache_path(key), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _cache_put(key: str, text: str):
+    path = _cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# -------------------------
+# Worker
+# -------------------------
+def _render(pdf_path: str, index: int):
+    import pypdfium2 as pdfium
+
+    with _render_lock:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            page = pdf[index]
+            image = page.render(scale=OCR_RESOLUTION / 72, grayscale=True).to_pil()
+            page.close()
+        finally:
+            pdf.close()
+    return image
+
+
+def page_key(pdf_digest: str, index: int) -> str:
+    """Cache key of one page; known before the page is rendered."""
+    return hashlib.sha256(f"{pdf_digest}:{index}:{OCR_RESOLUTION / 72}:{OCR_LANG}".encode("utf-8")).hexdigest()
+
+
+def ocr_page(pdf_path: str, index: int, pdf_digest: str) -> Tuple[str, bool]:
+    """OCR one page, rendering it only on a cache miss; returns (text, served_from_cache). Runs in a pool worker."""
+    key = page_key(pdf_digest, index)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached, True
+    text = pytesseract.image_to_string(_render(pdf_path, index), lang=OCR_LANG)
+    _cache_put(key, text)
+    return text, False
+
+
+def _executor(workers: int):
+    # Pool workers are daemonic and may not have children of their own
+    if multiprocessing.current_process().daemon:
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def ocr_pages(pdf_path: str, pages: List[int]) -> Dict[int, str]:
+    """OCR the given zero-based pages of a PDF in parallel; returns page index -> text."""
+    if not pages:
+        return {}
+    if not ocr_available():
+        print(f"Note: {len(pages)} page(s) look scanned but OCR is unavailable (needs pytesseract and tesseract)")
+        return {}
+
+    print(f"🔎 OCR on {len(pages)} scanned page(s)")
+    with open(pdf_path, "rb") as f:
+        pdf_digest = content_digest(f)
+    results = {}
+    with _executor(min(OCR_WORKERS, len(pages))) as pool:
+        futures = {index: pool.submit(ocr_page, pdf_path, index, pdf_digest) for index in pages}
+        for index, future in futures.items():
+            try:
+                text, cached = future.result()
+            except Exception as e:
+                print(f"Note: OCR failed on page {index + 1}: {e}")
+                continue
+            (metrics.CACHE_HITS if cached else metrics.CACHE_MISSES).inc(cache="ocr_page")
+            results[index] = text
+    return results
@@ -0,0 +1,512 @@
+"""
+Contract review pipeline.
+
+Everything that happens to an uploaded contract after the web request has been
+accepted — PDF extraction, company detection, the crew run and delivery — lives
+here so it can run either inline in the Flask process or in the crew worker pool
+(see worker.py).
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Optional
+
+import pdfplumber
+
+from src.legal_agent.brand_legal_crew import ContentCreatorLegalCrew
+from src.legal_agent.budgets import apply_budgets, partial_summary
+from src.legal_agent.checkpoints import checkpoint_tasks, find_retry_checkpoints, resume_crew
+from src.legal_agent.context_policy import apply_context_policies
+from src.legal_agent.delivery import (
+    send_summary_text, send_calendar_invites, calendar_delivery_status, calendar_api_enabled, calendar_file_enabled
+)
+from src.legal_agent.extraction import EXTRACTION_TASK, calendar_deliverables
+from src.legal_agent.ics import render_ics, count_events
+from src.legal_agent.legal_crew import LegalAgent
+from src.legal_agent.logs import apply_verbosity, job_context, log_event
+from src.legal_agent import metrics
+from src.legal_agent.ocr import needs_ocr, ocr_pages
+from src.legal_agent.parties import detect_company_name
+from src.legal_agent.preflight import NotAContract, Preflight, check_contract
+from src.legal_agent.recurrence import compress_recurring
+from src.legal_agent.prompt_cache import enable_prompt_caching, watch_prompt_cache
+from src.legal_agent.store import ResultStore, CONTRACT_PDF, CONTRACT_TEXT, SUMMARY, DELIVERABLES
+from src.legal_agent.tracing import span, traced, bind_crew, current_span
+from src.legal_agent.uploads import check_pdf, memory_accounting
+from src.legal_agent.versioning import (
+    ClauseDiff, ContractVersion, ContractVersionStore, split_clauses, diff_clauses, merge_analysis,
+    task_outputs_by_name
+)
+
+# --- Configuration ---
+CREW_TIMEOUT = 15 * 60
+SUMMARY_FILE = "contract_summary.md"
+# How long the response waits for the calendar sync once the email is sent
+CALENDAR_RESPONSE_WAIT = float(os.getenv("CALENDAR_RESPONSE_WAIT", "5"))
+# Below this much extracted text the crew is not started
+MIN_CONTRACT_CHARS = int(os.getenv("MIN_CONTRACT_CHARS", "200"))
+DELIVERY_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("DELIVERY_THREADS", "4")),
+                                   thread_name_prefix="delivery")
+
+
+def run_crew_with_timeout(crew, inputs, timeout=CREW_TIMEOUT):
+    result_container = [None]
+    def target():
+        try:
+            result_container[0] = crew.kickoff(inputs=inputs)
+        except Exception as e:
+            result_container[0] = e
+
+    with span("crew kickoff", tasks=len(crew.tasks)) as crew_span:
+        bind_crew(crew, crew_span)
+        # Run the crew in this context so its log lines keep the job id
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(target,))
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            raise TimeoutError("⏰ Crew run exceeded 15 minutes. Aborting.")
+        if isinstance(result_container[0], Exception):
+            crew_span.record_error(result_container[0])
+            raise result_container[0]
+    return result_container[0]
+
+
+def _page_texts(pdf):
+    """Yield (text, looks_scanned) per page."""
+    for page in pdf.pages:
+        text = page.extract_text() or ""
+        yield text, needs_ocr(page, text)
+        # Drop the page's parsed layout objects before moving on
+        page.close()
+
+
+def extract_contract_text(pdf_file) -> str:
+    """Text of a PDF path or file, after enforcing the page limit.
+
+    Pages without a text layer are OCR'd when pdf_file is a path. Raises
+    ValueError if the document still has no readable text, so no crew runs
+    against an empty contract.
+    """
+    with span("pdf extraction") as extraction_span, metrics.PDF_EXTRACTION_DURATION.time(), \
+            memory_accounting("pdf extraction"):
+        pages = check_pdf(pdf_file)
+        with pdfplumber.open(pdf_file) as pdf:
+            texts, scanned = [], []
+            for index, (text, looks_scanned) in enumerate(_page_texts(pdf)):
+                texts.append(text)
+                if looks_scanned:
+                    scanned.append(index)
+        if scanned and isinstance(pdf_file, str):
+            with span("ocr", pages=len(scanned)):
+                for index, text in ocr_pages(pdf_file, scanned).items():
+                    texts[index] = text
+        contract_text = "\n".join(texts)
+        extraction_span.set_attribute("pdf.pages", pages)
+        extraction_span.set_attribute("pdf.scanned_pages", len(scanned))
+        extraction_span.set_attribute("pdf.chars", len(contract_text))
+        if len(contract_text.strip()) < MIN_CONTRACT_CHARS:
+            raise ValueError("No readable text found in the PDF. If it is a scan, OCR may be unavailable on this server.")
+        return contract_text
+
+
+@traced("company name detection")
+def extract_company_name(contract_text: str) -> str:
+    return detect_company_name(contract_text)
+
+
+def process_job(job_id: str, result_store: ResultStore = None, checkpoints: Dict[str, str] = None) -> dict:
+    """Run a stored job end to end and return the JSON payload for the client.
+
+    The contract_summary.md artifact is written to the
+    current working directory, which the worker pool points at a per-job folder.
+    `checkpoints` (task name -> raw output) replays a job instead of resuming a
+    failed attempt at the same upload; see checkpoints.py.
+    """
+    result_store = result_store or ResultStore()
+    job = result_store.get_job(job_id)
+    with job_context(job_id), span("review job", job_id=job_id) as job_span, \
+            metrics.JOBS_IN_FLIGHT.track_inprogress(mode=job["mode"]):
+        payload = _process_job(job, result_store, checkpoints)
+        job_span.set_attribute("job.success", payload["success"])
+        return payload
+
+
+def _set_status(result_store: ResultStore, job: dict, status: str, error: str = None):
+    result_store.set_status(job["id"], status, error)
+    if status != "processing":
+        metrics.JOBS.inc(mode=job["mode"], status=status)
+
+
+def record_delivery(result_store: ResultStore, job_id: str, channel: str, status: str, detail: str = ""):
+    result_store.record_delivery(job_id, channel, status, detail)
+    metrics.DELIVERIES.inc(channel=channel, status=status)
+    if status == "failed":
+        metrics.DELIVERY_FAILURES.inc(channel=channel)
+
+
+def _observe_crew(crew, mode: str, started: float):
+    metrics.CREW_DURATION.observe(time.perf_counter() - started, mode=mode)
+    for task in crew.tasks:
+        if task.execution_duration is not None:
+            metrics.TASK_DURATION.observe(task.execution_duration, mode=mode, task=task.name or "")
+
+
+@dataclass
+class ReviewPlan:
+    """Everything decided before the crew runs: extracted text, detected company and which crew to use."""
+    job: dict
+    contract_text: str
+    company_name: str
+    subject_line: str
+    clauses: list
+    version_store: ContractVersionStore
+    previous: Optional[ContractVersion] = None
+    diff: Optional[ClauseDiff] = None
+    crew: object = None
+    inputs: dict = field(default_factory=dict)
+    # Task name -> raw output to resume from, and the tasks skipped because of them
+    checkpoints: Dict[str, str] = field(default_factory=dict)
+    resumed: list = field(default_factory=list)
+    preflight: Optional[Preflight] = None
+    # Why the crew stopped early, for a review sent from the tasks that finished
+    partial: Optional[str] = None
+
+    @property
+    def runs_crew(self) -> bool:
+        return self.crew is not None and bool(self.crew.tasks)
+
+    @property
+    def unchanged(self) -> bool:
+        return self.diff is not None and not self.diff.changed
+
+    @property
+    def sends_calendar(self) -> bool:
+        # Only creator mode has deliverables, and nothing new when the contract is unchanged
+        return self.job["mode"] == "creator" and not self.unchanged
+
+
+def plan_review(job: dict, result_store: ResultStore, checkpoints: Optional[Dict[str, str]] = None) -> ReviewPlan:
+    """Decide how to review a job. Explicit checkpoints (a replay) always run the full crew."""
+    job_id, mode, user_email = job["id"], job["mode"], job["user_email"]
+    contract_text = extract_contract_text(result_store.get_output_path(job_id, CONTRACT_PDF))
+    result_store.save_output(job_id, CONTRACT_TEXT, contract_text)
+    # Invoices, pitch decks and the like stop here, before any crew is built
+    with span("preflight") as preflight_span:
+        preflight = check_contract(contract_text, mode)
+        preflight_span.set_attribute("preflight.kind", preflight.kind)
+
+    company_name = extract_company_name(contract_text)
+    print(f"🧾 Detected company name: {company_name}")
+
+    today = date.today()
+    subject_line = f"Contract Summary Report - {today} - {company_name}" if company_name else f"Contract Summary Report - {today}"
+    result_store.update_job(job_id, company_name, subject_line)
+
+    # Amended uploads only send the changed clauses through the crew
+    clauses = split_clauses(contract_text)
+    version_store = ContractVersionStore()
+    previous = version_store.find_revision(user_email, mode, company_name, clauses)
+    # A replay still joins the contract's version family, but runs the full crew its checkpoints came from
+    diff = diff_clauses(previous.clauses, clauses) if previous and checkpoints is None else None
+    plan = ReviewPlan(job, contract_text, company_name, subject_line, clauses, version_store, previous, diff,
+                      preflight=preflight)
+
+    crew_class = ContentCreatorLegalCrew if mode == "creator" else LegalAgent
+    if plan.unchanged:
+        metrics.CACHE_HITS.inc(cache="contract_version")
+        print(f"♻️ Identical to version {previous.version}, reusing cached analysis")
+    elif diff is not None:
+        metrics.CACHE_HITS.inc(cache="contract_version_partial")
+        print(f"🔁 Revision of version {previous.version}: {diff.describe()}")
+        plan.crew = crew_class().amendment_crew()
+        plan.inputs = {
+            "user_email": user_email,
+            "contract_text": diff.changed_text(),
+            "change_summary": diff.summary(),
+            "previous_risks": previous.analysis.get("analyze_risks", ""),
+            "previous_summary": previous.analysis.get("summary", ""),
+        }
+    else:
+        metrics.CACHE_MISSES.inc(cache="contract_version")
+        print("🎬 Using Content Creator Legal Agent crew" if mode == "creator" else "⚖️ Using Base Legal Agent crew")
+        plan.crew = crew_class().crew()
+        plan.inputs = {"user_email": user_email, "contract_text": contract_text}
+
+    if plan.crew is not None:
+        apply_verbosity(plan.crew, job_id)
+        apply_budgets(plan.crew)
+        apply_context_policies(plan.crew)
+        enable_prompt_caching(plan.crew)
+        watch_prompt_cache(plan.crew, mode)
+        checkpoint_tasks(plan.crew, result_store, job_id)
+        task_names = [task.name for task in plan.crew.tasks]
+        plan.checkpoints = (find_retry_checkpoints(result_store, job, task_names) if checkpoints is None
+                            else {name: checkpoints[name] for name in task_names if name in checkpoints})
+    return plan
+
+
+def deliverables_json(extraction: Optional[str]) -> Optional[str]:
+    """The calendar deliverables of the extraction task's output, as JSON, with repeats folded into RRULEs."""
+    deliverables = compress_recurring(calendar_deliverables(extraction))
+    return None if deliverables is None else json.dumps(deliverables, ensure_ascii=False)
+
+
+def task_output_for_file(tasks, filename: str) -> Optional[str]:
+    """Raw output of the task that writes `filename`, falling back to the file itself.
+
+    Reading the task output keeps concurrent reviews in one working directory
+    (the async app) from picking up each other's files.
+    """
+    for task in tasks:
+        if task.output_file and os.path.basename(task.output_file) == filename and task.output is not None:
+            return task.output.raw
+    if os.path.exists(filename):
+        with open(filename, "r", encoding="utf-8") as f:
+            return f.read()
+    return None
+
+
+def record_review(plan: ReviewPlan, result_store: ResultStore, result=None):
+    """Store the crew's outputs (or the cached analysis) and the new contract version."""
+    job_id, mode = plan.job["id"], plan.job["mode"]
+    if plan.crew is None:
+        outputs = {}
+        summary = plan.previous.analysis.get("summary", "")
+    elif plan.partial is not None:
+        tasks = plan.resumed + list(plan.crew.tasks)
+        outputs = {task.name: task.output.raw for task in tasks if task.output is not None}
+        summary = partial_summary(tasks, plan.partial)
+    else:
+        log_event("✅ Crew completed", result=str(result))
+        outputs = {task.name: task.output.raw for task in plan.resumed}
+        outputs.update(task_outputs_by_name(result))
+        summary = task_output_for_file(plan.resumed + list(plan.crew.tasks), SUMMARY_FILE) or ""
+
+    # Delivery (and resend) read the summary back from the store
+    with open(SUMMARY_FILE, "w", encoding="utf-8") as f:
+        f.write(summary)
+    result_store.save_outputs(job_id, outputs)
+    result_store.save_output(job_id, SUMMARY, summary)
+    if mode == "creator" and outputs:
+        deliverables = deliverables_json(outputs.get(EXTRACTION_TASK))
+        if deliverables is not None:
+            result_store.save_output(job_id, DELIVERABLES, deliverables)
+
+    # A partial analysis must not be reused as the cached review of this contract
+    if outputs and plan.partial is None:
+        plan.version_store.save_version(
+            plan.job["user_email"], mode, plan.company_name, plan.clauses,
+            merge_analysis(plan.previous, outputs, summary, plan.diff), previous=plan.previous
+        )
+
+
+class EarlyDelivery:
+    """Fires each delivery as soon as the task output it depends on exists.
+
+    The email goes out from the summary task's callback and the calendar sync
+    from the extraction task's callback, so in creator mode the invites are
+    being created while the risks and summary are still being written, and neither waits
+    for the rest of the crew. `submit(fn, *args)` runs a delivery in the
+    background and returns a concurrent.futures.Future; the calendar sync
+    records its own delivery row whenever it finishes. With an .ics calendar
+    file (CALENDAR_DELIVERY=ics or both) the deliverables ride along with the
+    email, whose callback then records the calendar delivery.
+    """
+
+    def __init__(self, plan: ReviewPlan, result_store: ResultStore, send_email=None, send_calendar=None,
+                 submit=None):
+        self.plan = plan
+        self.result_store = result_store
+        self.send_email = send_email or send_summary_text
+        self.send_calendar = send_calendar or calendar_sync
+        self.submit = submit or submit_delivery
+        self.email = None
+        self.calendar = None
+        self.deliverables = None
+        self.calendar_file = ""
+        self._lock = threading.Lock()
+
+    def attach(self):
+        """Hook the deliveries onto the callbacks of the tasks that produce their inputs."""
+        if self.plan.crew is None:
+            return
+        for task in self.plan.crew.tasks:
+            if os.path.basename(task.output_file or "") == SUMMARY_FILE:
+                self._hook(task, self.start_email)
+            elif task.name == EXTRACTION_TASK and self.plan.sends_calendar:
+                self._hook(task, lambda extraction: self.deliverables_ready(deliverables_json(extraction)))
+
+    @staticmethod
+    def _hook(task, start):
+        previous_callback = task.callback
+
+        def callback(output):
+            start(output.raw or "")
+            if previous_callback is not None:
+                return previous_callback(output)
+
+        task.callback = callback
+
+    def deliverables_ready(self, deliverables):
+        self.deliverables = deliverables
+        if calendar_api_enabled():
+            self.start_calendar(deliverables)
+
+    def start_email(self, summary: str):
+        with self._lock:
+            if self.email is None:
+                print("📨 Summary ready, sending email")
+                calendar_ics = self._calendar_file()
+                self.email = self.submit(self.send_email, self.plan.job["user_email"], self.plan.subject_line, summary,
+                                         calendar_ics)
+                if calendar_ics:
+                    self.email.add_done_callback(self._record_calendar_file)
+
+    def _calendar_file(self):
+        if not (calendar_file_enabled() and self.plan.sends_calendar and self.deliverables):
+            return None
+        try:
+            deliverables = json.loads(self.deliverables)
+        except ValueError as e:
+            print(f"Note: no calendar file, deliverables are not valid JSON: {e}")
+            return None
+        if not deliverables:
+            return None
+        calendar_ics = render_ics(deliverables, self.plan.job["user_email"], self.plan.company_name)
+        self.calendar_file = f"Calendar file attached: {count_events(calendar_ics)} deliverables"
+        return calendar_ics
+
+    def _record_calendar_file(self, future):
+        error = future.exception()
+        detail = f"Calendar error: {error}" if error else self.calendar_file
+        record_delivery(self.result_store, self.plan.job["id"], "calendar", calendar_delivery_status(detail), detail)
+
+    def start_calendar(self, deliverables):
+        with self._lock:
+            if self.calendar is None:
+                print("📅 Deliverables ready, syncing calendar")
+                self.calendar = self.submit(self.send_calendar, self.plan.job["user_email"], deliverables or [])
+                self.calendar.add_done_callback(self._record_calendar)
+
+    def _record_calendar(self, future):
+        try:
+            calendar_result = future.result()
+        except Exception as e:
+            calendar_result = f"Calendar error: {str(e)}"
+        print(f"📅 Calendar result: {calendar_result}")
+        record_delivery(self.result_store, self.plan.job["id"], "calendar",
+                        calendar_delivery_status(calendar_result), calendar_result)
+
+    def start_remaining(self):
+        """Start whatever the crew callbacks did not, e.g. for a reused cached analysis."""
+        job_id = self.plan.job["id"]
+        # Deliverables first: an .ics calendar file goes out with the email
+        if self.plan.sends_calendar and self.deliverables is None:
+            self.deliverables_ready(self.result_store.get_output(job_id, DELIVERABLES))
+        if self.email is None:
+            self.start_email(self.result_store.get_output(job_id, SUMMARY) or "")
+
+    def calendar_status(self) -> str:
+        """The calendar result if it lands within CALENDAR_RESPONSE_WAIT; it is recorded either way."""
+        if self.calendar is None:
+            return self.calendar_file
+        try:
+            return self.calendar.result(timeout=CALENDAR_RESPONSE_WAIT)
+        except FutureTimeoutError:
+            return "Calendar sync still running."
+        except Exception as e:
+            return f"Calendar error: {str(e)}"
+
+
+def calendar_sync(user_email: str, deliverables) -> str:
+    with span("calendar sync"):
+        return send_calendar_invites(user_email, deliverables)
+
+
+def submit_delivery(fn, *args):
+    # Copy the context so delivery spans stay under the job's span
+    return DELIVERY_POOL.submit(contextvars.copy_context().run, fn, *args)
+
+
+def stop_early(plan: ReviewPlan, error: TimeoutError):
+    """Keep a review whose crew ran out of time if any task finished; re-raise the error otherwise."""
+    if not any(task.output is not None for task in plan.resumed + list(plan.crew.tasks)):
+        raise error
+    plan.partial = str(error)
+    metrics.PARTIAL_REVIEWS.inc(mode=plan.job["mode"])
+    print(f"🧩 Out of budget ({error}), sending a partial review")
+
+
+def delivered_payload(plan: ReviewPlan, result_store: ResultStore, calendar_result: str) -> dict:
+    job = plan.job
+    if plan.partial is not None:
+        _set_status(result_store, job, "partial", plan.partial)
+        message = (f"Contract partly processed: the review ran out of time, so the email to {job['user_email']} "
+                   f"covers the steps that finished. Upload it again to complete the rest.")
+    else:
+        _set_status(result_store, job, "completed")
+        message = f"Contract processed! Check your email ({job['user_email']})."
+    if calendar_result:
+        message += f" {calendar_result}"
+    payload = {"success": True, "message": message, "job_id": job["id"]}
+    if plan.partial is not None:
+        payload["partial"] = True
+    if plan.preflight is not None and plan.preflight.suggested_mode != job["mode"]:
+        payload["suggested_mode"] = plan.preflight.suggested_mode
+    return payload
+
+
+def crew_failed_payload(job: dict, result_store: ResultStore, error: Exception) -> dict:
+    if isinstance(error, NotAContract):
+        _set_status(result_store, job, "rejected", str(error))
+        return {"success": False, "message": str(error), "job_id": job["id"], "rejected": error.kind}
+    _set_status(result_store, job, "failed", str(error))
+    return {"success": False, "message": f"Crew Error: {str(error)}", "job_id": job["id"]}
+
+
+def delivery_failed_payload(job: dict, result_store: ResultStore, error: Exception) -> dict:
+    record_delivery(result_store, job["id"], "email", "failed", str(error))
+    _set_status(result_store, job, "delivery_failed", str(error))
+    return {"success": False, "message": f"Error: {str(error)}", "job_id": job["id"]}
+
+
+def _process_job(job: dict, result_store: ResultStore, checkpoints: Dict[str, str] = None) -> dict:
+    job_id, mode, user_email = job["id"], job["mode"], job["user_email"]
+    current_span().set_attribute("job.mode", mode)
+    _set_status(result_store, job, "processing")
+
+    try:
+        plan = plan_review(job, result_store, checkpoints)
+        delivery = EarlyDelivery(plan, result_store)
+        delivery.attach()
+        if plan.crew is not None:
+            plan.resumed = resume_crew(plan.crew, plan.checkpoints)
+        result = None
+        if plan.runs_crew:
+            started = time.perf_counter()
+            try:
+                result = run_crew_with_timeout(plan.crew, inputs=plan.inputs, timeout=CREW_TIMEOUT)
+            except TimeoutError as e:
+                metrics.CREW_TIMEOUTS.inc(mode=mode)
+                stop_early(plan, e)
+            _observe_crew(plan.crew, mode, started)
+        record_review(plan, result_store, result)
+        delivery.start_remaining()
+
+    except Exception as e:
+        return crew_failed_payload(job, result_store, e)
+
+    try:
+        # The email is usually already on its way; the response only waits for it
+        delivery.email.result()
+        record_delivery(result_store, job_id, "email", "sent", user_email)
+        return delivered_payload(plan, result_store, delivery.calendar_status())
+
+    except Exception as e:
+        return delivery_failed_payload(job, result_store, e)
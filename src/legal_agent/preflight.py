@@ -0,0 +1,130 @@
+"""
+Pre-flight check that an upload is a contract.
+
+It runs after PDF extraction and before the crew starts. It counts which
+signal terms appear in the text:
+
+    contract    agreement, whereas, shall, governing law, indemnify, ...
+    invoice     invoice number, bill to, amount due, subtotal, ...
+    pitch deck  market size, traction, go-to-market, our team, ...
+    creator     influencer, sponsored post, deliverables, usage rights, ...
+
+Each term counts once however often it occurs, so the result doesn't depend
+on the document's length. A document with fewer than
+PREFLIGHT_MIN_SIGNALS distinct contract terms is rejected. So is one below
+PREFLIGHT_SURE_SIGNALS whose invoice or pitch-deck terms outnumber its
+contract terms. Either way no crew is started. Anything else goes through.
+Only the first PREFLIGHT_SCAN_CHARS characters are read, about 30 pages,
+so the check takes around ten milliseconds at most. The creator terms only
+produce a suggestion when the chosen review mode looks wrong; the mode is
+never switched.
+
+Set PREFLIGHT_ENABLED=0 to send everything to the crew.
+"""
+
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict
+
+from src.legal_agent import metrics
+
+PREFLIGHT_ENABLED = os.getenv("PREFLIGHT_ENABLED", "1") != "0"
+PREFLIGHT_MIN_SIGNALS = int(os.getenv("PREFLIGHT_MIN_SIGNALS", "3"))
+PREFLIGHT_SURE_SIGNALS = int(os.getenv("PREFLIGHT_SURE_SIGNALS", "6"))
+CREATOR_MIN_SIGNALS = int(os.getenv("PREFLIGHT_CREATOR_SIGNALS", "3"))
+PREFLIGHT_SCAN_CHARS = int(os.getenv("PREFLIGHT_SCAN_CHARS", "100000"))
+
+# Regex fragments; a trailing \w* lets one stem cover its inflections
+SIGNALS = {
+    "contract": (
+        r"agreement", r"hereby", r"herein\w*", r"hereinafter", r"whereas", r"in witness whereof", r"shall",
+        r"part(?:y|ies)", r"governing law", r"jurisdiction", r"indemnif\w*", r"terminat\w*", r"breach",
+        r"warrant\w*", r"liabilit\w*", r"confidential\w*", r"effective date", r"counterparts", r"force majeure",
+        r"assign\w*", r"obligations?", r"notices?", r"entire agreement", r"severab\w*", r"signature",
+    ),
+    "invoice": (
+        r"invoice (?:no|number|#|date)", r"bill(?:ed)? to", r"amount due", r"balance due", r"subtotal",
+        r"sales tax", r"vat", r"qty", r"quantity", r"unit price", r"remit\w*", r"payment due", r"due date",
+        r"purchase order", r"total due",
+    ),
+    "pitch_deck": (
+        r"market size", r"total addressable market", r"tam", r"traction", r"go-to-market", r"our team",
+        r"the problem", r"our solution", r"business model", r"competitive landscape", r"roadmap",
+        r"series [a-c]", r"seed round", r"the ask", r"use of funds", r"revenue model", r"investors?",
+    ),
+    "creator": (
+        r"influencer", r"creator", r"sponsored", r"sponsorship", r"brand ambassador", r"deliverables?",
+        r"usage rights", r"whitelist\w*", r"instagram", r"tiktok", r"youtube", r"#ad", r"ftc", r"posts?",
+        r"stories", r"reels?", r"campaign", r"content approval", r"exclusivity",
+    ),
+}
+_PATTERNS = {
+    kind: re.compile(r"(?<![\w#])(?:" + "|".join(f"(?:{term})" for term in terms) + r")(?!\w)")
+    for kind, terms in SIGNALS.items()
+}
+KIND_LABELS = {"invoice": "an invoice", "pitch_deck": "a pitch deck", "other": "something other than a contract"}
+
+
+class NotAContract(ValueError):
+    """An upload the pre-flight check rejected; carries what it looks like instead."""
+
+    status_code = 422
+
+    def __init__(self, message: str, kind: str):
+        super().__init__(message)
+        self.kind = kind
+
+
+@dataclass
+class Preflight:
+    is_contract: bool
+    kind: str
+    suggested_mode: str
+    signals: Dict[str, int] = field(default_factory=dict)
+    seconds: float = 0.0
+
+
+def _distinct_terms(pattern, text: str) -> int:
+    return len({" ".join(match.split()) for match in pattern.findall(text)})
+
+
+def classify(text: str) -> Preflight:
+    """Whether the text reads like a contract, what it looks like otherwise, and the mode that fits it."""
+    started = time.perf_counter()
+    lowered = text[:PREFLIGHT_SCAN_CHARS].lower()
+    signals = {kind: _distinct_terms(pattern, lowered) for kind, pattern in _PATTERNS.items()}
+
+    contract = signals["contract"]
+    other_kind = max(("invoice", "pitch_deck"), key=lambda kind: signals[kind])
+    other = signals[other_kind]
+    if contract < PREFLIGHT_MIN_SIGNALS:
+        is_contract = False
+    elif contract < PREFLIGHT_SURE_SIGNALS:
+        is_contract = other <= contract
+    else:
+        is_contract = True
+
+    if is_contract:
+        kind = "contract"
+    else:
+        kind = other_kind if other >= PREFLIGHT_MIN_SIGNALS else "other"
+    suggested_mode = "creator" if signals["creator"] >= CREATOR_MIN_SIGNALS else "legal"
+    return Preflight(is_contract, kind, suggested_mode, signals, time.perf_counter() - started)
+
+
+def check_contract(text: str, mode: str) -> Preflight:
+    """Classify the text and raise NotAContract for a clear non-contract."""
+    result = classify(text)
+    print(f"🛫 Pre-flight: {result.kind} in {result.seconds * 1000:.1f} ms, signals {result.signals}")
+    if not PREFLIGHT_ENABLED or result.is_contract:
+        if result.suggested_mode != mode:
+            print(f"💡 This contract looks like a fit for {result.suggested_mode} mode (reviewing in {mode} mode)")
+        return result
+    metrics.PREFLIGHT_REJECTIONS.inc(kind=result.kind)
+    raise NotAContract(
+        f"This document looks like {KIND_LABELS[result.kind]}, not a contract, so it was not reviewed. "
+        f"Upload the contract itself.",
+        result.kind,
+    )
@@ -0,0 +1,75 @@
+"""
+Provider-side prompt caching.
+
+Every task description keeps its static instructions first and the per-contract
+values ({contract_text}, {user_email}, the previous analysis) last. Together
+with each agent's role, goal and backstory, that gives a byte-identical prompt
+prefix across runs. OpenAI caches such prefixes automatically once they are
+1024 tokens or longer. Anthropic models need explicit cache_control breakpoints,
+which enable_prompt_caching() asks LiteLLM to inject. watch_prompt_cache()
+reports how much of each task's prompt was served from the cache.
+"""
+
+from src.legal_agent import metrics
+
+# Providers that only cache when the request carries cache_control markers
+CACHE_CONTROL_PROVIDERS = ("anthropic", "claude", "bedrock", "vertex_ai")
+CACHE_CONTROL_INJECTION_POINTS = [{"location": "message", "role": "system"}]
+
+
+def supports_cache_control(model: str) -> bool:
+    model = (model or "").lower()
+    return any(provider in model for provider in CACHE_CONTROL_PROVIDERS)
+
+
+def enable_prompt_caching(crew):
+    """Mark the static system prompt as cacheable for providers that need explicit hints."""
+    for agent in crew.agents:
+        llm = getattr(agent, "llm", None)
+        params = getattr(llm, "additional_params", None)
+        if params is None or not supports_cache_control(getattr(llm, "model", "")):
+            continue
+        params.setdefault("cache_control_injection_points", CACHE_CONTROL_INJECTION_POINTS)
+
+
+def _prompt_usage(llm) -> tuple:
+    try:
+        usage = llm.get_token_usage_summary()
+    except Exception:
+        return 0, 0
+    return usage.prompt_tokens or 0, getattr(usage, "cached_prompt_tokens", 0) or 0
+
+
+def watch_prompt_cache(crew, mode: str):
+    """Report prompt and cached prompt tokens per task from each agent's LLM usage counters.
+
+    Tasks run one at a time, so the growth of an agent's counters between the
+    end of its previous task and the end of this one belongs to this task.
+    """
+    seen = {}
+    for agent in crew.agents:
+        llm = getattr(agent, "llm", None)
+        if llm is not None:
+            seen[id(llm)] = _prompt_usage(llm)
+
+    def wrap(task):
+        previous_callback = task.callback
+
+        def callback(output):
+            llm = getattr(task.agent, "llm", None)
+            if llm is not None:
+                prompt, cached = _prompt_usage(llm)
+                before_prompt, before_cached = seen.get(id(llm), (0, 0))
+                seen[id(llm)] = (prompt, cached)
+                prompt, cached = prompt - before_prompt, cached - before_cached
+                if prompt > 0:
+                    metrics.PROMPT_TOKENS.inc(prompt, mode=mode, task=task.name or "")
+                    metrics.CACHED_PROMPT_TOKENS.inc(cached, mode=mode, task=task.name or "")
+                    print(f"🧮 {task.name}: {cached}/{prompt} prompt tokens cached ({cached / prompt:.0%})")
+            if previous_callback is not None:
+                return previous_callback(output)
+
+        task.callback = callback
+
+    for task in crew.tasks:
+        wrap(task)
@@ -0,0 +1,158 @@
+"""
+Recurring deliverables.
+
+A deal that asks for "one TikTok per week for 12 weeks" comes out of the
+extraction as twelve dated deliverables. compress_recurring() groups them by
+title (ignoring counters such as "#3", "Week 3:" or "(3 of 12)", and bare
+numbers that count up from one deliverable to the next), time and timezone.
+A run of at least MIN_OCCURRENCES dates with a regular cadence (every n
+days, every n weeks, or the same day every n months) becomes a single
+deliverable with a `recurrence` field. The calendar sync then creates
+one recurring event (an RRULE) instead of one event per date.
+"""
+
+import re
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+MIN_OCCURRENCES = 3
+
+_LEADING_COUNTER = re.compile(r"^\s*(?:week|wk|day|month|part|post|video|episode)\s*#?\d+\s*[:\-–]\s*",
+                              re.IGNORECASE)
+# A trailing number is only a counter after "#", a period or numbering label, or as "3 of 12" / "3/12"
+_TRAILING_COUNTER = re.compile(
+    r"[\s\-–:,]*[(\[]?\s*(?:(?:week|wk|day|month|part|no\.?)\s*#?\s*\d+|#\s*\d+|\d+(?=\s*(?:of|/)\s*\d))"
+    r"(?:\s*(?:of|/)\s*\d+)?\s*[)\]]?\s*$",
+    re.IGNORECASE,
+)
+# After a deliverable noun only the number goes; "post" in "TikTok post 3" names the deliverable
+_NOUN_COUNTER = re.compile(r"\b(post|video|episode)\s*#?\s*\d+(?:\s*(?:of|/)\s*\d+)?\s*$", re.IGNORECASE)
+# A bare trailing number ("TikTok 3") is a counter only if it counts up across the group
+_BARE_NUMBER = re.compile(r"^(.*?\S)[\s\-–:,]+(\d+)$")
+_FREQ_WORDS = {"DAILY": "day", "WEEKLY": "week", "MONTHLY": "month"}
+
+
+def base_title(summary: str) -> str:
+    """The deliverable's title without a labelled occurrence counter.
+
+    "Week 3: Unboxing", "Unboxing (3 of 12)" and "TikTok post #3" lose their
+    counter; "Top 10" and "Campaign 2026" keep their number.
+    """
+    title = _LEADING_COUNTER.sub("", summary)
+    title = _NOUN_COUNTER.sub(r"\1", title)
+    title = _TRAILING_COUNTER.sub("", title).strip()
+    return title or summary.strip()
+
+
+def _counted_titles(entries: list) -> dict:
+    """Index -> title without its bare trailing number, for deliverables whose number counts up by one.
+
+    `entries` are (start, index, title, key) tuples, where key is the rest of
+    the grouping key (time and timezone).
+    """
+    stems = {}
+    for start, index, title, key in entries:
+        match = _BARE_NUMBER.match(title)
+        if match:
+            stems.setdefault((match.group(1).lower(), key), []).append((start, int(match.group(2)), index,
+                                                                        match.group(1)))
+    titles = {}
+    for items in stems.values():
+        items.sort()
+        numbers = [number for _, number, _, _ in items]
+        if len(items) > 1 and numbers == list(range(numbers[0], numbers[0] + len(numbers))):
+            titles.update({index: stem for _, _, index, stem in items})
+    return titles
+
+
+def _parse_date(value) -> Optional[date]:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def cadence(dates: List[date]) -> Optional[Tuple[str, int]]:
+    """(FREQ, INTERVAL) if the sorted dates are evenly spaced, else None."""
+    if len(dates) < 2:
+        return None
+    gaps = {(b - a).days for a, b in zip(dates, dates[1:])}
+    if len(gaps) == 1:
+        gap = gaps.pop()
+        if gap <= 0:
+            return None
+        return ("WEEKLY", gap // 7) if gap % 7 == 0 else ("DAILY", gap)
+    if len({d.day for d in dates}) == 1:
+        steps = {(b.year - a.year) * 12 + b.month - a.month for a, b in zip(dates, dates[1:])}
+        if len(steps) == 1 and min(steps) > 0:
+            return "MONTHLY", steps.pop()
+    return None
+
+
+def rrule(recurrence: dict) -> str:
+    """RFC 5545 RRULE value, e.g. FREQ=WEEKLY;INTERVAL=1;COUNT=12."""
+    return f"FREQ={recurrence['freq']};INTERVAL={recurrence['interval']};COUNT={recurrence['count']}"
+
+
+def describe(recurrence: dict) -> str:
+    unit = _FREQ_WORDS[recurrence["freq"]]
+    every = f"every {unit}" if recurrence["interval"] == 1 else f"every {recurrence['interval']} {unit}s"
+    return f"repeats {every}, {recurrence['count']} times"
+
+
+def _runs(items: list):
+    """Split date-sorted items into maximal evenly spaced runs (single items where there is none)."""
+    i = 0
+    while i < len(items):
+        j = i + 1
+        while j < len(items) and cadence([item[0] for item in items[i:j + 1]]):
+            j += 1
+        if j - i >= MIN_OCCURRENCES:
+            yield items[i:j]
+            i = j
+        else:
+            yield items[i:i + 1]
+            i += 1
+
+
+def compress_recurring(deliverables: Optional[list]) -> Optional[list]:
+    """Replace evenly spaced runs of the same deliverable with one recurring deliverable."""
+    if not deliverables:
+        return deliverables
+
+    entries, passthrough = [], []
+    for index, deliverable in enumerate(deliverables):
+        start = _parse_date(deliverable.get("start_date"))
+        if start is None or deliverable.get("recurrence"):
+            passthrough.append((index, deliverable))
+            continue
+        key = (deliverable.get("start_time"), (deliverable.get("timezone") or "").upper())
+        entries.append((start, index, base_title(deliverable.get("summary") or ""), key))
+
+    counted = _counted_titles(entries)
+    groups = {}
+    for start, index, title, key in entries:
+        title = counted.get(index, title)
+        groups.setdefault((title.lower(),) + key, []).append((start, index, title, deliverables[index]))
+
+    result = list(passthrough)
+    for items in groups.values():
+        items.sort(key=lambda item: item[0])
+        for run in _runs(items):
+            _, index, title, first = run[0]
+            if len(run) == 1:
+                result.append((index, first))
+                continue
+            freq, interval = cadence([item[0] for item in run])
+            recurrence = {"freq": freq, "interval": interval, "count": len(run)}
+            description = first.get("description") or ""
+            result.append((index, {
+                **first,
+                "summary": title,
+                "description": f"{description} ({describe(recurrence)})".strip(),
+                "recurrence": recurrence,
+            }))
+            print(f"🔁 {len(run)} deliverables -> one recurring event: {title}, {describe(recurrence)}")
+
+    # Keep the extraction's order, placing each recurring event where its first date was
+    return [deliverable for _, deliverable in sorted(result, key=lambda item: item[0])]
@@ -0,0 +1,129 @@
+"""
+Size-aware scheduling for the crew worker pool.
+
+When a job is queued, the web tier estimates its cost from the PDF. The
+inputs are the page count, the characters in the text layer, the pages that
+will need OCR, and the review mode (creator mode runs more tasks than legal
+mode). Reading the text layer with pdfium takes milliseconds per page, far
+less than the text extraction the worker does later.
+
+Workers then claim the queued job with the lowest
+
+    estimated_seconds - SCHEDULER_AGING * seconds waited
+
+This is shortest-job-first with aging. A 2-page letter overtakes a queue of
+80-page MSAs, but an MSA waits at most (its estimate - the smallest estimate)
+/ SCHEDULER_AGING seconds before short jobs stop overtaking it. The score
+only depends on the job, since seconds waited = now - created_at, so the
+ordering is a plain ORDER BY. Set SCHEDULER_POLICY=fifo to claim strictly
+in arrival order.
+
+Each finished job records its actual duration next to its estimate.
+calibration() compares the two and fits new per-mode coefficients; see
+`python main.py calibrate`, /workers/health and the
+legal_agent_job_duration_ratio histogram.
+"""
+
+import os
+import statistics
+import threading
+from typing import Dict, List
+
+from src.legal_agent.ocr import OCR_MIN_CHARS
+
+SCHEDULER_POLICY = os.getenv("SCHEDULER_POLICY", "sjf")
+SCHEDULER_AGING = float(os.getenv("SCHEDULER_AGING", "1.0"))
+CALIBRATION_JOBS = int(os.getenv("SCHEDULER_CALIBRATION_JOBS", "200"))
+
+# Seconds per review: a fixed crew overhead plus a cost per 1,000 characters the agents read
+BASE_SECONDS = {
+    "legal": float(os.getenv("SJF_LEGAL_BASE_SECONDS", "90")),
+    "creator": float(os.getenv("SJF_CREATOR_BASE_SECONDS", "120")),
+}
+SECONDS_PER_KCHAR = {
+    "legal": float(os.getenv("SJF_LEGAL_SECONDS_PER_KCHAR", "1.5")),
+    "creator": float(os.getenv("SJF_CREATOR_SECONDS_PER_KCHAR", "2.0")),
+}
+SECONDS_PER_PAGE = float(os.getenv("SJF_SECONDS_PER_PAGE", "0.3"))
+SECONDS_PER_OCR_PAGE = float(os.getenv("SJF_SECONDS_PER_OCR_PAGE", "4"))
+# A scanned page's text length is unknown until it is OCR'd; assume a typical page
+OCR_PAGE_CHARS = int(os.getenv("SJF_OCR_PAGE_CHARS", "3000"))
+
+# pdfium is not thread-safe
+_pdfium_lock = threading.Lock()
+
+
+def estimate_seconds(mode: str, pages: int, chars: int, ocr_pages: int = 0) -> float:
+    mode = mode if mode in BASE_SECONDS else "legal"
+    chars += ocr_pages * OCR_PAGE_CHARS
+    return (BASE_SECONDS[mode] + SECONDS_PER_KCHAR[mode] * chars / 1000
+            + SECONDS_PER_PAGE * pages + SECONDS_PER_OCR_PAGE * ocr_pages)
+
+
+def estimate_job(source, mode: str) -> Dict:
+    """Pages, text-layer characters, OCR pages and estimated seconds for a PDF path or seekable file."""
+    import pypdfium2 as pdfium
+
+    if hasattr(source, "seek"):
+        source.seek(0)
+    pages = chars = ocr_pages = 0
+    try:
+        with _pdfium_lock:
+            # pdfium reads streams through readinto(), which SpooledTemporaryFile lacks before Python 3.11
+            pdf = pdfium.PdfDocument(source.read() if hasattr(source, "read") and not hasattr(source, "readinto")
+                                     else source)
+            try:
+                pages = len(pdf)
+                for index in range(pages):
+                    page = pdf[index]
+                    textpage = page.get_textpage()
+                    count = len(textpage.get_text_range().strip())
+                    textpage.close()
+                    page.close()
+                    chars += count
+                    if count < OCR_MIN_CHARS:
+                        ocr_pages += 1
+            finally:
+                pdf.close()
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+    estimate = estimate_seconds(mode, pages, chars, ocr_pages)
+    print(f"⏱️ Estimated {estimate:.0f}s for a {pages}-page {mode} review ({chars} chars, {ocr_pages} to OCR)")
+    return {"pages": pages, "chars": chars, "ocr_pages": ocr_pages, "estimated_seconds": estimate}
+
+
+def claim_aging():
+    """The aging factor for ResultStore.claim_next_job, or None for arrival order."""
+    return SCHEDULER_AGING if SCHEDULER_POLICY == "sjf" else None
+
+
+def _fit(samples: List[Dict]) -> Dict:
+    # Least squares for actual = base + per_kchar * kchars, after removing the page and OCR terms
+    xs = [(s["chars"] + s["ocr_pages"] * OCR_PAGE_CHARS) / 1000 for s in samples]
+    ys = [s["actual_seconds"] - SECONDS_PER_PAGE * s["pages"] - SECONDS_PER_OCR_PAGE * s["ocr_pages"]
+          for s in samples]
+    mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    if spread == 0:
+        return {"base_seconds": round(mean_y, 1), "seconds_per_kchar": None}
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+    return {"base_seconds": round(mean_y - slope * mean_x, 1), "seconds_per_kchar": round(slope, 3)}
+
+
+def calibration(samples: List[Dict]) -> Dict[str, Dict]:
+    """Estimated vs actual durations of finished jobs, per mode, with refitted coefficients."""
+    report = {}
+    for mode in sorted({s["mode"] for s in samples}):
+        rows = [s for s in samples if s["mode"] == mode]
+        ratios = [s["actual_seconds"] / s["estimated_seconds"] for s in rows if s["estimated_seconds"]]
+        report[mode] = {
+            "jobs": len(rows),
+            "mean_estimated_seconds": round(statistics.fmean(s["estimated_seconds"] for s in rows), 1),
+            "mean_actual_seconds": round(statistics.fmean(s["actual_seconds"] for s in rows), 1),
+            "median_actual_over_estimate": round(statistics.median(ratios), 3) if ratios else None,
+            "current": {"base_seconds": BASE_SECONDS.get(mode), "seconds_per_kchar": SECONDS_PER_KCHAR.get(mode)},
+            "fitted": _fit(rows) if len(rows) >= 2 else None,
+        }
+    return report
@@ -0,0 +1,359 @@
+"""
+Soak test and leak detector for the review path.
+
+    python -m src.legal_agent.soak --cycles 300 --interval 25
+
+The test runs CYCLES uploads, one after another, through the Flask /upload
+route in a single process. It alternates legal and creator mode, and every
+contract is different, so each cycle builds and runs a full crew. Only the
+outside world is replaced:
+
+    LLM        a BaseLLM that answers every task immediately with a canned
+               final answer (JSON with weekly deliverables for the extraction)
+    SMTP       smtplib.SMTP_SSL is replaced by a sink that serializes the message
+    Calendar   googleapiclient's build() is real, but its HTTP transport
+               answers every list and insert locally
+
+So crews, pdfplumber, googleapiclient services, MIME messages, delivery
+futures and crew timeout threads are created and dropped exactly as in
+production.
+
+Every INTERVAL cycles, after a gc.collect(), it records RSS, the
+tracemalloc total, live threads by name, open file descriptors, and live
+objects by type. The first sample after WARMUP cycles is the baseline. The
+report lists the growth since the baseline: the allocation sites that grew
+most (tracemalloc), the object types whose counts grew, and the threads
+and FDs that were not released. The --max-* options turn it into a
+regression guard that exits with status 1 when a limit is exceeded. The
+run also fails when any upload does not return 200, or when fewer emails
+went out than uploads were made. A run that did no work cannot pass.
+--report writes the whole report as JSON.
+"""
+
+import argparse
+import collections
+import gc
+import io
+import json
+import os
+import re
+import secrets
+import smtplib
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+# Isolated data directory and limits that let hundreds of uploads through, before the app reads its config
+os.environ.setdefault("LEGAL_AGENT_DATA_DIR", tempfile.mkdtemp(prefix="legal-agent-soak-"))
+os.environ.setdefault("ADMIT_BURST", "1000000")
+os.environ.setdefault("ADMIT_MAX_GLOBAL", "1000")
+os.environ.setdefault("CREW_EXECUTION", "inline")
+os.environ.setdefault("CALENDAR_DELIVERY", "both")
+os.environ.setdefault("SENDER_EMAIL", "soak@example.com")
+os.environ.setdefault("EMAIL_PASSWORD", "soak")
+os.environ.setdefault("LOG_FORMAT", "text")
+# The crews build their real LLM before the stub replaces it, and that needs a key to exist
+os.environ.setdefault("OPENAI_API_KEY", "sk-soak-unused")
+if not os.getenv("APP_PASSWORD_HASH"):
+    from werkzeug.security import generate_password_hash
+    os.environ["APP_PASSWORD_HASH"] = generate_password_hash(secrets.token_hex(16))
+
+import httplib2
+from crewai.llms.base_llm import BaseLLM
+
+from src.legal_agent import delivery, pipeline
+from src.legal_agent.uploads import rss_bytes
+
+CLAUSES = [
+    "Payment. The Company shall pay the Creator {fee} USD within thirty (30) days of each invoice.",
+    "Term and Termination. This Agreement begins on the Effective Date and either party may terminate it "
+    "on thirty days written notice or immediately upon a material breach.",
+    "Confidentiality. Each party shall keep the other party's confidential information secret.",
+    "Indemnification. The Creator shall indemnify the Company against claims arising from the Content.",
+    "Usage Rights. The Company may use the Content on its own channels for twelve (12) months.",
+    "Exclusivity. The Creator shall not promote competing products during the Term.",
+    "Governing Law. This Agreement is governed by the laws of the State of California.",
+    "Entire Agreement. This Agreement is the entire agreement of the parties and may be signed in counterparts.",
+]
+
+
+# -------------------------
+# Stubs for the outside world
+# -------------------------
+class StubLLM(BaseLLM):
+    """Answers every task at once with a canned final answer."""
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__(model="stub/soak")
+        self.delay = delay
+
+    def call(self, messages, *args, **kwargs):
+        if self.delay:
+            time.sleep(self.delay)
+        prompt = messages if isinstance(messages, str) else " ".join(str(m.get("content", "")) for m in messages)
+        if "plain_english_summary" in prompt:
+            deliverables = [{"summary": f"Instagram post #{week + 1}", "description": "Sponsored post",
+                             "start_date": f"2030-01-{1 + 7 * week:02d}", "start_time": "10:00", "timezone": "PST"}
+                            for week in range(4)]
+            answer = json.dumps({"company_name": "Soak Co", "parties": ["Soak Co", "Creator"], "clauses": [],
+                                 "payment_terms": "Net 30", "deliverables": deliverables, "legal_flags": [],
+                                 "plain_english_summary": "A four-week sponsorship."})
+        else:
+            answer = "## Summary\n\n- Payment within 30 days\n- Twelve months of usage rights\n\n*Not legal advice.*"
+        return f"Thought: I now know the final answer\nFinal Answer: {answer}"
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    def supports_stop_words(self) -> bool:
+        return False
+
+    def get_context_window_size(self) -> int:
+        return 128000
+
+
+class _SinkSMTP:
+    """smtplib.SMTP_SSL stand-in that serializes the message and drops it."""
+
+    sent = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def login(self, user, password):
+        pass
+
+    def send_message(self, msg, *args, **kwargs):
+        msg.as_bytes()
+        _SinkSMTP.sent += 1
+
+
+class _CalendarHttp:
+    """HTTP transport for googleapiclient: empty event lists, inserts echoed back."""
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=1, connection_type=None):
+        content = body if method == "POST" and body else '{"items": []}'
+        return httplib2.Response({"status": "200", "content-type": "application/json"}), \
+            content.encode("utf-8") if isinstance(content, str) else content
+
+
+def install_stubs(llm_delay: float = 0.0):
+    real_build = delivery.build
+    real_plan_review = pipeline.plan_review
+
+    def plan_review(*args, **kwargs):
+        plan = real_plan_review(*args, **kwargs)
+        if plan.crew is not None:
+            for agent in plan.crew.agents:
+                agent.llm = StubLLM(llm_delay)
+        return plan
+
+    pipeline.plan_review = plan_review
+    smtplib.SMTP_SSL = _SinkSMTP
+    delivery.load_calendar_credentials = lambda: object()
+    # A new service and transport per call, as in production
+    delivery.build = lambda name, version, credentials=None, **kwargs: real_build(
+        name, version, http=_CalendarHttp(), **kwargs)
+
+
+# -------------------------
+# Contracts
+# -------------------------
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def contract_pdf(cycle: int, pages: int = 3) -> bytes:
+    """A text PDF of a sponsorship agreement that is unique to this cycle."""
+    lines = [f"SPONSORSHIP AGREEMENT No. {cycle}", "",
+             f"This Agreement is made by and between Soak Brand {cycle} Inc. (the Company) and Jane Creator.", ""]
+    while len(lines) < pages * 50:
+        for clause in CLAUSES:
+            words, line = clause.format(fee=1000 + cycle).split(), ""
+            for word in words:
+                if len(line) + len(word) > 90:
+                    lines.append(line)
+                    line = ""
+                line = f"{line} {word}".strip()
+            lines += [line, ""]
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        chunk = lines[page * 50:(page + 1) * 50]
+        stream = "BT /F1 10 Tf 14 TL 50 750 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in chunk) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+
+    out, offsets = io.BytesIO(), []
+    out.write(b"%PDF-1.4\n")
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+    return out.getvalue()
+
+
+# -------------------------
+# Sampling
+# -------------------------
+def _open_fds() -> int:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return -1
+
+
+def take_sample(cycle: int) -> dict:
+    gc.collect()
+    threads = collections.Counter(re.sub(r"\d+", "N", thread.name) for thread in threading.enumerate())
+    return {
+        "cycle": cycle,
+        "rss_mb": round(rss_bytes() / (1024 * 1024), 1),
+        "traced_mb": round(tracemalloc.get_traced_memory()[0] / (1024 * 1024), 1),
+        "threads": dict(threads),
+        "fds": _open_fds(),
+        "objects": collections.Counter(type(obj).__name__ for obj in gc.get_objects()),
+        "snapshot": tracemalloc.take_snapshot(),
+    }
+
+
+def _growth(before: dict, after: dict, top: int) -> list:
+    keys = set(before) | set(after)
+    grown = [(key, after.get(key, 0) - before.get(key, 0)) for key in keys]
+    return sorted([item for item in grown if item[1] > 0], key=lambda item: -item[1])[:top]
+
+
+def report(samples: list, top: int = 15) -> dict:
+    baseline, final = samples[0], samples[-1]
+    cycles = max(1, final["cycle"] - baseline["cycle"])
+    stats = final["snapshot"].compare_to(baseline["snapshot"], "lineno")
+    return {
+        "cycles": cycles,
+        "rss_growth_mb": round(final["rss_mb"] - baseline["rss_mb"], 1),
+        "rss_growth_kb_per_cycle": round((final["rss_mb"] - baseline["rss_mb"]) * 1024 / cycles, 1),
+        "traced_growth_mb": round(final["traced_mb"] - baseline["traced_mb"], 1),
+        "thread_growth": sum(final["threads"].values()) - sum(baseline["threads"].values()),
+        "threads_grown": _growth(baseline["threads"], final["threads"], top),
+        "fd_growth": final["fds"] - baseline["fds"],
+        "objects_grown": _growth(baseline["objects"], final["objects"], top),
+        "allocations_grown": [
+            {"site": str(stat.traceback), "size_kb": round(stat.size_diff / 1024, 1), "count": stat.count_diff}
+            for stat in stats[:top] if stat.size_diff > 0
+        ],
+        "samples": [{key: value for key, value in sample.items() if key not in ("snapshot", "objects")}
+                    for sample in samples],
+    }
+
+
+def _print_report(result: dict):
+    print(f"🧪 Soak: {result['cycles']} cycles after warmup")
+    print(f"   RSS {result['rss_growth_mb']:+.1f} MB ({result['rss_growth_kb_per_cycle']:+.1f} KB/cycle), "
+          f"Python heap {result['traced_growth_mb']:+.1f} MB, threads {result['thread_growth']:+d}, "
+          f"FDs {result['fd_growth']:+d}")
+    for sample in result["samples"]:
+        print(f"   cycle {sample['cycle']:>5}: rss {sample['rss_mb']} MB, heap {sample['traced_mb']} MB, "
+              f"threads {sum(sample['threads'].values())}, fds {sample['fds']}")
+    if result["threads_grown"]:
+        print("   Threads not released: " + ", ".join(f"{name} +{count}" for name, count in result["threads_grown"]))
+    if result["objects_grown"]:
+        print("   Object types that grew: " + ", ".join(f"{name} +{count}" for name, count in result["objects_grown"]))
+    for allocation in result["allocations_grown"]:
+        print(f"   +{allocation['size_kb']} KB in {allocation['count']:+d} blocks at {allocation['site']}")
+
+
+# -------------------------
+# Runner
+# -------------------------
+def run_soak(cycles: int, interval: int, warmup: int, pages: int = 3, llm_delay: float = 0.0,
+             frames: int = 1) -> dict:
+    from app import app
+
+    install_stubs(llm_delay)
+    tracemalloc.start(frames)
+    client = app.test_client()
+    outcomes = collections.Counter()
+    samples = []
+    started = time.perf_counter()
+
+    for cycle in range(1, warmup + cycles + 1):
+        mode = "creator" if cycle % 2 else "legal"
+        with client.session_transaction() as session:
+            session["logged_in"] = True
+            session["mode"] = mode
+        response = client.post("/upload", data={
+            "user_email": "soak@example.com",
+            "contract": (io.BytesIO(contract_pdf(cycle, pages)), f"contract-{cycle}.pdf"),
+        }, content_type="multipart/form-data")
+        outcomes[f"{mode} {response.status_code}"] += 1
+        if cycle == warmup or (cycle > warmup and (cycle - warmup) % interval == 0):
+            samples.append(take_sample(cycle))
+
+    if len(samples) < 2:
+        samples.append(take_sample(warmup + cycles))
+    result = report(samples)
+    result["uploads"] = warmup + cycles
+    result["outcomes"] = dict(outcomes)
+    result["emails_sent"] = _SinkSMTP.sent
+    result["seconds"] = round(time.perf_counter() - started, 1)
+    tracemalloc.stop()
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Soak-test repeated uploads and report leaks.")
+    parser.add_argument("--cycles", type=int, default=200, help="uploads to measure, after the warmup")
+    parser.add_argument("--interval", type=int, default=25, help="cycles between samples")
+    parser.add_argument("--warmup", type=int, default=10, help="uploads before the baseline sample")
+    parser.add_argument("--pages", type=int, default=3, help="pages per generated contract")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="seconds each stub LLM call takes")
+    parser.add_argument("--frames", type=int, default=1, help="tracemalloc traceback depth")
+    parser.add_argument("--report", help="write the report as JSON to this file")
+    parser.add_argument("--max-rss-growth-mb", type=float, help="fail if RSS grows more than this")
+    parser.add_argument("--max-thread-growth", type=int, help="fail if more threads than this are left behind")
+    parser.add_argument("--max-fd-growth", type=int, help="fail if more file descriptors than this are left open")
+    args = parser.parse_args(argv)
+
+    result = run_soak(args.cycles, args.interval, args.warmup, args.pages, args.llm_delay, args.frames)
+    _print_report(result)
+    print(f"   Outcomes: {result['outcomes']}, {result['emails_sent']} emails in {result['seconds']}s")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, default=str)
+
+    failures = [
+        f"{label} grew by {value} (limit {limit})"
+        for label, value, limit in (
+            ("RSS (MB)", result["rss_growth_mb"], args.max_rss_growth_mb),
+            ("Threads", result["thread_growth"], args.max_thread_growth),
+            ("Open FDs", result["fd_growth"], args.max_fd_growth),
+        )
+        if limit is not None and value > limit
+    ]
+    errors = {outcome: count for outcome, count in result["outcomes"].items() if not outcome.endswith(" 200")}
+    if errors:
+        failures.append(f"Uploads did not succeed: {errors}")
+    if result["emails_sent"] < result["uploads"]:
+        failures.append(f"Only {result['emails_sent']} emails were sent for {result['uploads']} uploads")
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
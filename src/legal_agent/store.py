@@ -0,0 +1,400 @@
+"""
+Persistent result store for processed contracts.
+
+Job metadata, task outputs and delivery status live in SQLite; large payloads
+(uploaded PDFs, extracted text, task outputs, summaries, deliverables) are written
+once to a content-addressed blob directory and referenced by SHA-256 digest,
+so identical payloads across jobs are stored a single time.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from typing import Dict, List, Optional
+
+DATA_DIR = os.path.abspath(os.getenv("LEGAL_AGENT_DATA_DIR", "data"))
+RESULTS_DB = os.path.join(DATA_DIR, "results.db")
+BLOB_DIR = os.path.join(DATA_DIR, "blobs")
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Output names written alongside the per-task outputs
+CONTRACT_PDF = "contract_pdf"
+CONTRACT_TEXT = "contract_text"
+SUMMARY = "summary"
+DELIVERABLES = "calendar_deliverables"
+
+# Columns added to jobs after the first release, migrated in place
+JOB_COLUMNS = (
+    ("worker_id", "TEXT"),
+    ("pages", "INTEGER"),
+    ("chars", "INTEGER"),
+    ("ocr_pages", "INTEGER"),
+    ("estimated_seconds", "REAL"),
+    ("started_at", "REAL"),
+    ("finished_at", "REAL"),
+    ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+
+class BlobStore:
+    """Content-addressed blobs stored as <root>/<first two hex chars>/<digest>."""
+
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, content) -> str:
+        """Store a str, bytes or binary file object; file objects are streamed in chunks."""
+        if hasattr(content, "read"):
+            return self._put_stream(content)
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def _put_stream(self, stream) -> str:
+        # The digest is only known at the end, so write to a temp file next to the blobs first
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f"upload.{uuid.uuid4().hex}.tmp")
+        sha = hashlib.sha256()
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b""):
+                    sha.update(chunk)
+                    f.write(chunk)
+            digest = sha.hexdigest()
+            path = self.path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return digest
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get(self, digest: str) -> str:
+        return self.get_bytes(digest).decode("utf-8")
+
+    def get_bytes(self, digest: str) -> bytes:
+        with open(self.path(digest), "rb") as f:
+            return f.read()
+
+
+class ResultStore:
+    """Jobs, their outputs and delivery attempts.
+
+    The jobs table doubles as the local work queue for the crew worker pool:
+    queued jobs are claimed atomically by a worker, and each worker reports a
+    heartbeat row that the web tier reads for health checks.
+    """
+
+    def __init__(self, path: str = RESULTS_DB, blobs: Optional[BlobStore] = None):
+        self.path = path
+        self.blobs = blobs or BlobStore()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    user_email TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    company_name TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    worker_id TEXT,
+                    pages INTEGER,
+                    chars INTEGER,
+                    ocr_pages INTEGER,
+                    estimated_seconds REAL,
+                    started_at REAL,
+                    finished_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at);
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+                CREATE TABLE IF NOT EXISTS job_outputs (
+                    job_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    blob TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, name)
+                );
+                CREATE INDEX IF NOT EXISTS idx_job_outputs_blob ON job_outputs (blob);
+                CREATE TABLE IF NOT EXISTS deliveries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    channel TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    detail TEXT,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_deliveries_job ON deliveries (job_id);
+                CREATE TABLE IF NOT EXISTS workers (
+                    id TEXT PRIMARY KEY,
+                    pid INTEGER NOT NULL,
+                    processes INTEGER NOT NULL,
+                    in_flight INTEGER NOT NULL,
+                    completed INTEGER NOT NULL,
+                    failed INTEGER NOT NULL,
+                    started_at REAL NOT NULL,
+                    heartbeat_at REAL NOT NULL
+                );
+                """
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in JOB_COLUMNS:
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # --- Writes ---
+    def create_job(self, user_email: str, mode: str, contract_pdf, status: str = "processing",
+                   estimate: Optional[Dict] = None, job_id: Optional[str] = None) -> str:
+        """Register a job for an uploaded PDF (bytes or a file object); status "queued" hands it to the worker pool.
+
+        `estimate` is the cost estimate from scheduling.estimate_job() the worker pool orders the queue by.
+        `job_id` is an id the caller already reserved (see coordination.reserve_submission).
+        """
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        estimate = estimate or {}
+        self.save_output(job_id, CONTRACT_PDF, contract_pdf)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO jobs (id, user_email, mode, company_name, subject, status, pages, chars, ocr_pages, "
+                "estimated_seconds, created_at, updated_at) VALUES (?, ?, ?, '', '', ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, user_email, mode, status, estimate.get("pages"), estimate.get("chars"),
+                 estimate.get("ocr_pages"), estimate.get("estimated_seconds"), now, now),
+            )
+        return job_id
+
+    def update_job(self, job_id: str, company_name: str, subject: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE jobs SET company_name = ?, subject = ?, updated_at = ? WHERE id = ?",
+                (company_name, subject, time.time(), job_id),
+            )
+
+    def save_output(self, job_id: str, name: str, content: str):
+        digest = self.blobs.put(content)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_outputs (job_id, name, blob, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, name, digest, time.time()),
+            )
+
+    def save_outputs(self, job_id: str, outputs: Dict[str, str]):
+        for name, content in outputs.items():
+            self.save_output(job_id, name, content)
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def record_delivery(self, job_id: str, channel: str, status: str, detail: str = ""):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO deliveries (job_id, channel, status, detail, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, channel, status, detail, time.time()),
+            )
+
+    # --- Queue ---
+    def claim_next_job(self, worker_id: str, aging: Optional[float] = None, default_cost: float = 0.0) -> Optional[str]:
+        """Atomically move the next queued job to "processing" for this worker.
+
+        Without `aging` that is the oldest job. With it, the job with the lowest
+        estimated_seconds - aging * seconds waited (shortest job first with aging);
+        jobs queued without an estimate count as `default_cost`.
+        """
+        if aging is None:
+            order, params = "created_at", ()
+        else:
+            # - aging * (now - created_at) ranks jobs the same as + aging * created_at
+            order, params = "COALESCE(estimated_seconds, ?) + ? * created_at, created_at", (default_cost, aging)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT id FROM jobs WHERE status = 'queued' ORDER BY {order} LIMIT 1", params
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'processing', worker_id = ?, started_at = ?, updated_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (worker_id, now, now, row["id"]),
+            )
+        return row["id"]
+
+    def requeue_job(self, job_id: str, max_attempts: int) -> Optional[str]:
+        """Put a job whose worker was lost back in the queue; fails it once it was claimed max_attempts times.
+
+        Returns the new status, or None if the job was no longer processing.
+        """
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT status, attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row["status"] != "processing":
+                return None
+            if row["attempts"] >= max_attempts:
+                status, error = "failed", f"Worker lost {row['attempts']} times"
+            else:
+                status, error = "queued", None
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, worker_id = NULL, started_at = NULL, updated_at = ? "
+                "WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+        return status
+
+    def finish_job(self, job_id: str) -> Optional[Dict]:
+        """Record when a claimed job left its worker; returns its mode, estimate and actual duration."""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE jobs SET finished_at = ? WHERE id = ?", (now, job_id))
+            row = conn.execute(
+                "SELECT mode, estimated_seconds, started_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None or row["started_at"] is None:
+            return None
+        return {"mode": row["mode"], "estimated_seconds": row["estimated_seconds"],
+                "actual_seconds": now - row["started_at"]}
+
+    def duration_samples(self, limit: int = 200) -> List[Dict]:
+        """Estimated and actual durations of the latest completed queued jobs, for calibration."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT mode, pages, chars, ocr_pages, estimated_seconds, finished_at - started_at AS actual_seconds "
+                "FROM jobs WHERE status = 'completed' AND estimated_seconds IS NOT NULL "
+                "AND started_at IS NOT NULL AND finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def queue_depth(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def heartbeat(self, worker_id: str, processes: int, in_flight: int, completed: int, failed: int,
+                  started_at: float):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO workers (id, pid, processes, in_flight, completed, failed, started_at, heartbeat_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (worker_id, os.getpid(), processes, in_flight, completed, failed, started_at, time.time()),
+            )
+
+    def remove_worker(self, worker_id: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def list_workers(self) -> List[Dict]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT * FROM workers ORDER BY started_at").fetchall()
+        return [dict(row) for row in rows]
+
+    # --- Reads ---
+    def _output_digest(self, job_id: str, name: str) -> Optional[str]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT blob FROM job_outputs WHERE job_id = ? AND name = ?", (job_id, name)
+            ).fetchone()
+        return row["blob"] if row else None
+
+    def get_output(self, job_id: str, name: str) -> Optional[str]:
+        digest = self._output_digest(job_id, name)
+        return self.blobs.get(digest) if digest else None
+
+    def get_output_bytes(self, job_id: str, name: str) -> Optional[bytes]:
+        digest = self._output_digest(job_id, name)
+        return self.blobs.get_bytes(digest) if digest else None
+
+    def get_output_path(self, job_id: str, name: str) -> Optional[str]:
+        """Blob file of an output, for readers that should not load it into memory."""
+        digest = self._output_digest(job_id, name)
+        return self.blobs.path(digest) if digest else None
+
+    def get_outputs(self, job_id: str, names: List[str]) -> Dict[str, str]:
+        """The named outputs a job has, e.g. its task checkpoints."""
+        if not names:
+            return {}
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT name, blob FROM job_outputs WHERE job_id = ? AND name IN ({', '.join('?' * len(names))})",
+                [job_id] + list(names),
+            ).fetchall()
+        return {row["name"]: self.blobs.get(row["blob"]) for row in rows}
+
+    def find_failed_attempt(self, job_id: str, since: float) -> Optional[str]:
+        """Latest failed or partial job since `since` for the same user, mode and PDF as `job_id`."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT previous.id FROM jobs job "
+                "JOIN job_outputs pdf ON pdf.job_id = job.id AND pdf.name = ? "
+                "JOIN job_outputs previous_pdf ON previous_pdf.blob = pdf.blob AND previous_pdf.name = ? "
+                "JOIN jobs previous ON previous.id = previous_pdf.job_id "
+                "WHERE job.id = ? AND previous.id != job.id AND previous.status IN ('failed', 'partial') "
+                "AND previous.user_email = job.user_email AND previous.mode = job.mode AND previous.created_at >= ? "
+                "ORDER BY previous.created_at DESC LIMIT 1",
+                (CONTRACT_PDF, CONTRACT_PDF, job_id, since),
+            ).fetchone()
+        return row["id"] if row else None
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with closing(self._connect()) as conn:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            outputs = conn.execute(
+                "SELECT name, blob FROM job_outputs WHERE job_id = ? ORDER BY created_at", (job_id,)
+            ).fetchall()
+            deliveries = conn.execute(
+                "SELECT channel, status, detail, created_at FROM deliveries WHERE job_id = ? ORDER BY id",
+                (job_id,),
+            ).fetchall()
+        result = dict(job)
+        result["outputs"] = {row["name"]: row["blob"] for row in outputs}
+        result["deliveries"] = [dict(row) for row in deliveries]
+        return result
+
+    def list_jobs(self, page: int = 1, per_page: int = 20, user_email: Optional[str] = None) -> Dict:
+        page = max(page, 1)
+        per_page = max(1, min(per_page, 100))
+        where, params = ("WHERE user_email = ?", [user_email]) if user_email else ("", [])
+        with closing(self._connect()) as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM jobs {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT id, user_email, mode, company_name, subject, status, error, worker_id, created_at, updated_at "
+                f"FROM jobs {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                params + [per_page, (page - 1) * per_page],
+            ).fetchall()
+        items: List[Dict] = [dict(row) for row in rows]
+        return {
+            "items": items,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+        }
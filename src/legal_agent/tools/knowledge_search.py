@@ -0,0 +1,55 @@
+from crewai.tools import BaseTool
+from typing import Type
+from pydantic import BaseModel, Field
+import os
+
+from src.legal_agent.knowledge import get_index
+
+# "off" (default) leaves the legal researcher out of the crews, "local" gives it this
+# tool, "web" gives it the Tavily WebSearchTool
+LEGAL_RESEARCH = os.getenv("LEGAL_RESEARCH", "off").strip().lower()
+
+
+class KnowledgeSearchToolInput(BaseModel):
+    """Input schema for KnowledgeSearchTool."""
+    query: str = Field(..., description="The legal term or question to look up.")
+
+
+class KnowledgeSearchTool(BaseTool):
+    name: str = "legal_knowledge_search"
+    description: str = (
+        "Searches the local legal reference library (definitions, common contract terms, "
+        "disclosure rules) and returns the most relevant passages with their source file. "
+        "Works offline and answers in milliseconds. "
+        "Input must be a plain text query string — do not wrap it in JSON."
+    )
+    args_schema: Type[BaseModel] = KnowledgeSearchToolInput
+
+    def _parse_args(self, raw_args):
+        if isinstance(raw_args, dict) and "query" not in raw_args and raw_args:
+            raw_args = {"query": str(list(raw_args.values())[0])}
+        return super()._parse_args(raw_args)
+
+    def _run(self, query: str) -> str:
+        """Return the top passages from the knowledge index."""
+        try:
+            hits = get_index().search(str(query), k=3)
+            if not hits:
+                return "No matching reference material found. Rely on the contract text only."
+
+            text_parts = []
+            for hit in hits:
+                snippet = (hit.text[:700] + "...") if len(hit.text) > 700 else hit.text
+                text_parts.append(f"[{hit.source}]\n{snippet}")
+            return "\n\n".join(text_parts)
+
+        except Exception as e:
+            return f"Knowledge search failed: {str(e)}"
+
+
+def research_tools() -> list:
+    """Tools for the legal researcher: the local index ("local") or live Tavily search ("web")."""
+    if LEGAL_RESEARCH == "web":
+        from src.legal_agent.tools.web_search import WebSearchTool
+        return [WebSearchTool()]
+    return [KnowledgeSearchTool()]
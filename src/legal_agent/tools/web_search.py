@@ -1,11 +1,90 @@
 from crewai.tools import BaseTool
 from typing import Type
 from pydantic import BaseModel, Field
+from collections import OrderedDict
+from concurrent.futures import Future
+import asyncio
+import re
+import threading
+import time
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
+from src.legal_agent import metrics
+
+# Point at a local stub with TAVILY_API_URL=http://localhost:8000/search
+TAVILY_API_URL = os.getenv("TAVILY_API_URL", "https://api.tavily.com/search")
+SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", str(24 * 60 * 60)))
+SEARCH_CACHE_SIZE = int(os.getenv("WEB_SEARCH_CACHE_SIZE", "256"))
+
+# One keep-alive session for every tool instance and thread
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=16))
+_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=16))
+
+# normalized query -> (expires_at, result text), least recently used first
+_cache: "OrderedDict[str, tuple]" = OrderedDict()
+# normalized query -> Future of the request currently fetching it
+_in_flight = {}
+_lock = threading.Lock()
+
+
+class _AsyncState:
+    """The keep-alive client and in-flight queries of one event loop (in practice the ASGI app's only loop)."""
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(timeout=10, limits=httpx.Limits(max_keepalive_connections=16))
+        # normalized query -> asyncio.Future of the request currently fetching it
+        self.in_flight = {}
+
+
+# event loop -> its _AsyncState; an AsyncClient's connections belong to the loop that opened them
+_async_states = {}
+
+
+def _async_state() -> _AsyncState:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        for other in [other for other in _async_states if other.is_closed()]:
+            del _async_states[other]
+        state = _async_states.get(loop)
+        if state is None:
+            state = _async_states[loop] = _AsyncState()
+        return state
+
+
+def cache_key(query: str) -> str:
+    """Queries that differ only in case, spacing or trailing punctuation share a cache entry."""
+    return re.sub(r"\s+", " ", query).strip().rstrip("?.!").lower()
+
+
+def _cache_get(key: str):
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    expires_at, text = entry
+    if expires_at < time.monotonic():
+        del _cache[key]
+        return None
+    _cache.move_to_end(key)
+    return text
+
+
+def _cache_put(key: str, text: str):
+    _cache[key] = (time.monotonic() + SEARCH_CACHE_TTL, text)
+    _cache.move_to_end(key)
+    while len(_cache) > SEARCH_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
 class WebSearchToolInput(BaseModel):
     """Input schema for WebSearchTool."""
     query: str = Field(..., description="The search query to send to Tavily.")
@@ -29,61 +108,139 @@ class WebSearchTool(BaseTool):
             raw_args = {"query": str(list(raw_args.values())[0])}
         return super()._parse_args(raw_args)
 
+    @staticmethod
+    def _normalize_query(query) -> str:
+        # CrewAI sometimes passes a dict instead of string
+        if isinstance(query, dict):
+            # Try to extract the description if present
+            query = query.get("description") or query.get("text") or list(query.values())[0]
+        return query
+
+    @staticmethod
+    def _payload(query: str) -> dict:
+        tavily_api_key = os.getenv("TAVILY_API_KEY")
+        if not tavily_api_key:
+            raise ValueError("Missing TAVILY_API_KEY in environment variables.")
+
+        return {
+            "api_key": tavily_api_key,
+            "query": query,
+            "search_depth": "advanced",  # can be 'basic' or 'advanced'
+            "max_results": 3,
+            "timeout": 10,
+            "include_answer": True,      # return summarized text
+            "include_domains": [],       # optionally restrict domains
+            "include_raw_content": False
+        }
+
+    @staticmethod
+    def _format_results(data: dict) -> str:
+        # Extract answer or summarized text
+        answer = data.get("answer")
+        results = data.get("results", [])
+
+        text_parts = []
+        if answer:
+            text_parts.append(f"**Summary:** {answer}")
+
+        for res in results[:3]:
+            title = res.get("title", "")
+            url = res.get("url", "")
+            content = res.get("content", "")
+            snippet = (content[:200] + "...") if len(content) > 200 else content
+            text_parts.append(f"- {title}: {snippet} ({url})")
+
+        if not text_parts:
+            text_parts.append("No summary available, please refine your query.")
+
+        return "\n".join(text_parts)
+
+    def _search(self, query: str) -> str:
+        response = _session.post(TAVILY_API_URL, json=self._payload(query), timeout=10)
+        response.raise_for_status()
+        return self._format_results(response.json())
+
     def _run(self, query: str) -> str:
         """Perform a Tavily search and return summarized results."""
-        # Handle case where model sends a dict instead of str
-        if isinstance(query, dict):
-            query = query.get("description") or query.get("text") or str(query)
         try:
-            # CrewAI sometimes passes a dict instead of string
-            if isinstance(query, dict):
-                # Try to extract the description if present
-                if "description" in query:
-                    query = query["description"]
-                else:
-                    # fallback to first value in dict
-                    query = list(query.values())[0]
-
-            tavily_api_key = os.getenv("TAVILY_API_KEY")
-            if not tavily_api_key:
-                raise ValueError("Missing TAVILY_API_KEY in environment variables.")
-
-            api_url = "https://api.tavily.com/search"
-
-            payload = {
-                "api_key": tavily_api_key,
-                "query": query,
-                "search_depth": "advanced",  # can be 'basic' or 'advanced'
-                "max_results": 3,
-                "timeout": 10,
-                "include_answer": True,      # return summarized text
-                "include_domains": [],       # optionally restrict domains
-                "include_raw_content": False
-            }
-
-            response = requests.post(api_url, json=payload, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            # Extract answer or summarized text
-            answer = data.get("answer")
-            results = data.get("results", [])
-
-            text_parts = []
-            if answer:
-                text_parts.append(f"**Summary:** {answer}")
-
-            for res in results[:3]:
-                title = res.get("title", "")
-                url = res.get("url", "")
-                content = res.get("content", "")
-                snippet = (content[:200] + "...") if len(content) > 200 else content
-                text_parts.append(f"- {title}: {snippet} ({url})")
-
-            if not text_parts:
-                text_parts.append("No summary available, please refine your query.")
-
-            return "\n".join(text_parts)
+            query = self._normalize_query(query)
+            key = cache_key(query)
+            # Metrics are recorded outside the lock: an update can flush a snapshot file
+            with _lock:
+                cached = _cache_get(key)
+                future = None if cached is not None else _in_flight.get(key)
+                owner = cached is None and future is None
+                if owner:
+                    future = _in_flight[key] = Future()
+            if cached is not None:
+                metrics.CACHE_HITS.inc(cache="web_search")
+                return cached
+
+            if not owner:
+                # The same query is already on the wire; wait for that call instead
+                metrics.CACHE_HITS.inc(cache="web_search_coalesced")
+                return future.result()
+
+            metrics.CACHE_MISSES.inc(cache="web_search")
+            try:
+                text = self._search(query)
+            except Exception as e:
+                with _lock:
+                    _in_flight.pop(key, None)
+                future.set_exception(e)
+                raise
+            with _lock:
+                _cache_put(key, text)
+                _in_flight.pop(key, None)
+            future.set_result(text)
+            return text
+
+        except Exception as e:
+            return f"Web search failed: {str(e)}"
+
+    async def _asearch(self, client: httpx.AsyncClient, query: str) -> str:
+        response = await client.post(TAVILY_API_URL, json=self._payload(query))
+        response.raise_for_status()
+        return self._format_results(response.json())
+
+    async def _arun(self, query: str) -> str:
+        """Async form of _run; shares the result cache and joins identical queries already in flight."""
+        try:
+            query = self._normalize_query(query)
+            key = cache_key(query)
+            state = _async_state()
+            with _lock:
+                cached = _cache_get(key)
+                threaded = None if cached is not None else _in_flight.get(key)
+            if cached is not None:
+                metrics.CACHE_HITS.inc(cache="web_search")
+                return cached
+            if threaded is not None:
+                # A crew thread is fetching it through _run
+                metrics.CACHE_HITS.inc(cache="web_search_coalesced")
+                return await asyncio.wrap_future(threaded)
+
+            # Only this loop touches state.in_flight, so no lock is needed
+            future = state.in_flight.get(key)
+            if future is not None:
+                metrics.CACHE_HITS.inc(cache="web_search_coalesced")
+                return await asyncio.shield(future)
+
+            future = state.in_flight[key] = asyncio.get_running_loop().create_future()
+            metrics.CACHE_MISSES.inc(cache="web_search")
+            try:
+                text = await self._asearch(state.client, query)
+            except BaseException as e:
+                state.in_flight.pop(key, None)
+                future.set_exception(e if isinstance(e, Exception) else RuntimeError("Search was cancelled"))
+                # Mark it retrieved for when no other caller was waiting
+                future.exception()
+                raise
+            with _lock:
+                _cache_put(key, text)
+            state.in_flight.pop(key, None)
+            future.set_result(text)
+            return text
 
         except Exception as e:
             return f"Web search failed: {str(e)}"
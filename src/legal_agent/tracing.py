@@ -0,0 +1,299 @@
+"""
+Opt-in, local tracing for the review hot path.
+
+Spans cover PDF extraction, company name detection, the crew run with one
+child span per task and per LLM call, the summary email and every Google
+Calendar API call. Enable it with:
+
+    LEGAL_AGENT_TRACING=console   # one line per finished span on stdout
+    LEGAL_AGENT_TRACING=file      # OTLP/JSON lines in LEGAL_AGENT_TRACE_FILE
+
+The file exporter writes one OTLP `ExportTraceServiceRequest` JSON document per
+line, the format read by the OpenTelemetry Collector's `otlpjsonfile` receiver,
+so traces can be loaded into any OpenTelemetry backend later. The tracer is
+self-contained because the app forces OTEL_SDK_DISABLED to silence CrewAI's own
+telemetry. With tracing off every call here is a cheap no-op.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import secrets
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+TRACING = os.getenv("LEGAL_AGENT_TRACING", "").strip().lower()
+TRACE_FILE = os.path.abspath(os.getenv(
+    "LEGAL_AGENT_TRACE_FILE", os.path.join(os.getenv("LEGAL_AGENT_DATA_DIR", "data"), "traces.jsonl")
+))
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "legal_agent")
+
+_current_span = contextvars.ContextVar("legal_agent_current_span", default=None)
+
+# OTLP status codes
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    def __init__(self, tracer, name: str, parent: Optional["Span"] = None,
+                 start_time_ns: Optional[int] = None, attributes: Optional[Dict] = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else ""
+        self.start_time_ns = start_time_ns or time.time_ns()
+        self.end_time_ns = None
+        self.attributes = dict(attributes or {})
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def record_error(self, error):
+        self.status_code = STATUS_ERROR
+        self.status_message = str(error)[:500]
+        self.attributes["exception.type"] = type(error).__name__
+
+    def end(self, end_time_ns: Optional[int] = None):
+        if self.end_time_ns is None:
+            self.end_time_ns = end_time_ns or time.time_ns()
+            if self.status_code == STATUS_UNSET:
+                self.status_code = STATUS_OK
+            self.tracer.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_time_ns or time.time_ns()) - self.start_time_ns) / 1e6
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": self.status_code, "message": self.status_message},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+class _NoopSpan:
+    name = ""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def end(self, end_time_ns=None):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    def __init__(self, exporter: str = TRACING, trace_file: str = TRACE_FILE):
+        self.exporter = exporter
+        self.trace_file = trace_file
+        self._lock = threading.Lock()
+        self._resource = {
+            "attributes": [
+                {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                {"key": "host.name", "value": {"stringValue": socket.gethostname()}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]
+        }
+        if exporter == "file":
+            os.makedirs(os.path.dirname(trace_file) or ".", exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter in ("console", "file")
+
+    def start_span(self, name: str, parent=None, start_time_ns: Optional[int] = None,
+                   attributes: Optional[Dict] = None):
+        if not self.enabled:
+            return NOOP_SPAN
+        if parent is None:
+            parent = _current_span.get()
+        if parent is NOOP_SPAN:
+            parent = None
+        return Span(self, name, parent, start_time_ns, attributes)
+
+    def export(self, span: Span):
+        if self.exporter == "console":
+            attrs = " ".join(f"{k}={v}" for k, v in span.attributes.items())
+            status = "❌" if span.status_code == STATUS_ERROR else "🔭"
+            print(f"{status} span {span.name} {span.duration_ms:.1f} ms {attrs}".rstrip())
+        elif self.exporter == "file":
+            document = {
+                "resourceSpans": [{
+                    "resource": self._resource,
+                    "scopeSpans": [{"scope": {"name": "legal_agent"}, "spans": [span.to_otlp()]}],
+                }]
+            }
+            line = json.dumps(document, ensure_ascii=False)
+            with self._lock, open(self.trace_file, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+tracer = Tracer()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Trace a block; nested spans become its children."""
+    current = tracer.start_span(name, attributes=attributes)
+    if current is NOOP_SPAN:
+        yield current
+        return
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def traced(name: str):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    return _current_span.get() or NOOP_SPAN
+
+
+# -------------------------
+# CrewAI instrumentation
+# -------------------------
+# CrewAI dispatches event handlers on a thread pool, so spans are parented
+# explicitly (crew span -> task span -> LLM call span) instead of through the
+# context variable, and timed from the event timestamps.
+_crew_parents: Dict[str, object] = {}
+_open_task_spans: Dict[str, object] = {}
+_open_llm_spans: Dict[tuple, object] = {}
+_instrumented = False
+_instrument_lock = threading.Lock()
+
+
+def _event_time_ns(event) -> int:
+    timestamp = getattr(event, "timestamp", None)
+    return int(timestamp.timestamp() * 1e9) if timestamp else time.time_ns()
+
+
+def bind_crew(crew, parent=None):
+    """Parent the spans of this crew's tasks under `parent` (the current span by default)."""
+    if not tracer.enabled:
+        return
+    instrument_crewai()
+    parent = parent or current_span()
+    for task in crew.tasks:
+        _crew_parents[str(task.id)] = parent
+
+
+def instrument_crewai():
+    """Register CrewAI event bus handlers for task and LLM call spans (once per process)."""
+    global _instrumented
+    with _instrument_lock:
+        if _instrumented or not tracer.enabled:
+            return
+        try:
+            from crewai.events import (
+                crewai_event_bus, TaskStartedEvent, TaskCompletedEvent, TaskFailedEvent,
+                LLMCallStartedEvent, LLMCallCompletedEvent, LLMCallFailedEvent,
+            )
+        except ImportError as e:
+            print(f"Note: CrewAI tracing hooks unavailable: {e}")
+            return
+
+        @crewai_event_bus.on(TaskStartedEvent)
+        def on_task_started(source, event):
+            task = event.task
+            task_id = str(task.id) if task is not None else event.task_id
+            parent = _crew_parents.get(task_id)
+            _open_task_spans[task_id] = tracer.start_span(
+                f"task {getattr(task, 'name', None) or event.task_name}",
+                parent=parent, start_time_ns=_event_time_ns(event),
+                attributes={"crewai.task.name": getattr(task, "name", None) or "",
+                            "crewai.agent.role": getattr(getattr(task, "agent", None), "role", "")},
+            )
+
+        def finish_task(event, error=None):
+            task = event.task
+            task_id = str(task.id) if task is not None else event.task_id
+            task_span = _open_task_spans.pop(task_id, None)
+            _crew_parents.pop(task_id, None)
+            if task_span is not None:
+                if error:
+                    task_span.record_error(RuntimeError(error))
+                else:
+                    task_span.set_attribute("crewai.task.output_chars", len(event.output.raw or ""))
+                task_span.end(_event_time_ns(event))
+
+        @crewai_event_bus.on(TaskCompletedEvent)
+        def on_task_completed(source, event):
+            finish_task(event)
+
+        @crewai_event_bus.on(TaskFailedEvent)
+        def on_task_failed(source, event):
+            finish_task(event, error=event.error)
+
+        @crewai_event_bus.on(LLMCallStartedEvent)
+        def on_llm_started(source, event):
+            key = (event.task_id, event.agent_id)
+            _open_llm_spans[key] = tracer.start_span(
+                "llm call", parent=_open_task_spans.get(event.task_id),
+                start_time_ns=_event_time_ns(event),
+                attributes={"gen_ai.request.model": event.model or "",
+                            "crewai.agent.role": event.agent_role or ""},
+            )
+
+        def finish_llm(event, error=None):
+            llm_span = _open_llm_spans.pop((event.task_id, event.agent_id), None)
+            if llm_span is not None:
+                if error:
+                    llm_span.record_error(RuntimeError(error))
+                llm_span.end(_event_time_ns(event))
+
+        @crewai_event_bus.on(LLMCallCompletedEvent)
+        def on_llm_completed(source, event):
+            finish_llm(event)
+
+        @crewai_event_bus.on(LLMCallFailedEvent)
+        def on_llm_failed(source, event):
+            finish_llm(event, error=event.error)
+
+        _instrumented = True
@@ -0,0 +1,119 @@
+"""
+Memory-bounded upload handling.
+
+Uploads bigger than UPLOAD_SPOOL_THRESHOLD are spooled to a temporary file
+by the web framework instead of being held in memory. Requests bigger than
+MAX_UPLOAD_MB are refused with 413 before the body is read. PDFs with more
+than MAX_PDF_PAGES pages are rejected before any text is extracted. The
+spooled file is streamed into the blob store in fixed-size chunks, and
+extraction reads the stored blob from disk, so a large scan is never fully
+in memory.
+
+memory_accounting() logs the resident set size and the process high-water
+mark around a request. Set LEGAL_AGENT_TRACEMALLOC=1 to also get the Python
+heap peak. That figure is approximate when several requests share a process.
+"""
+
+import os
+import tracemalloc
+from contextlib import contextmanager
+
+import pdfplumber
+
+from src.legal_agent.tracing import current_span
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "25"))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "100"))
+UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(1024 * 1024)))
+
+if os.getenv("LEGAL_AGENT_TRACEMALLOC") == "1" and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+
+class UploadRejected(ValueError):
+    """An upload that breaks a size, type or page limit; carries the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 422):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def check_pdf(source) -> int:
+    """Validate a PDF path or seekable file against the limits without extracting text; returns the page count."""
+    if hasattr(source, "read"):
+        source.seek(0)
+        header = source.read(5)
+        source.seek(0)
+    else:
+        with open(source, "rb") as f:
+            header = f.read(5)
+    if header != b"%PDF-":
+        raise UploadRejected("The uploaded file is not a PDF.", 415)
+
+    try:
+        with pdfplumber.open(source) as pdf:
+            pages = len(pdf.pages)
+    except Exception as e:
+        raise UploadRejected(f"Could not read the PDF: {str(e)}")
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+    if pages > MAX_PDF_PAGES:
+        raise UploadRejected(f"The PDF has {pages} pages; the limit is {MAX_PDF_PAGES}.", 413)
+    return pages
+
+
+# -------------------------
+# Memory accounting
+# -------------------------
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _peak_rss_bytes() -> int:
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def _mb(value: int) -> float:
+    return value / (1024 * 1024)
+
+
+@contextmanager
+def memory_accounting(label: str):
+    """Log how much memory a block used; yields a dict that holds the figures afterwards."""
+    stats = {}
+    rss_before, peak_before = rss_bytes(), _peak_rss_bytes()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        traced_before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    try:
+        yield stats
+    finally:
+        rss_after, peak_after = rss_bytes(), _peak_rss_bytes()
+        stats.update(rss=rss_after, rss_delta=rss_after - rss_before,
+                     peak_rss=peak_after, peak_growth=peak_after - peak_before)
+        message = (f"🧠 {label}: rss {_mb(rss_after):.1f} MB ({_mb(stats['rss_delta']):+.1f}), "
+                   f"process peak {_mb(peak_after):.1f} MB (+{_mb(stats['peak_growth']):.1f})")
+        if tracing:
+            stats["python_peak"] = max(0, tracemalloc.get_traced_memory()[1] - traced_before)
+            message += f", python peak +{_mb(stats['python_peak']):.1f} MB"
+        print(message)
+        span = current_span()
+        for key, value in stats.items():
+            span.set_attribute(f"memory.{key}", value)
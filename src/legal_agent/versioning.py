@@ -0,0 +1,286 @@
+"""
+Contract version store.
+
+Recognizes a new upload as a revision of a contract the same user already had
+reviewed (same parties, similar clause structure), diffs the two versions at
+clause level and keeps the cached analysis of every version so amendments only
+need the changed clauses re-reviewed.
+"""
+
+import difflib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.legal_agent.store import DATA_DIR
+
+VERSIONS_DB = os.path.join(DATA_DIR, "contract_versions.db")
+
+# Minimum structural similarity for an upload to count as a revision
+REVISION_THRESHOLD = float(os.getenv("REVISION_SIMILARITY_THRESHOLD", "0.6"))
+# Two clauses at the same position count as "modified" rather than removed + added above this ratio
+MODIFIED_CLAUSE_THRESHOLD = 0.5
+
+# Numbered headings such as "1.", "2.3", "Section 4.", "ARTICLE IV.", "(a)"
+CLAUSE_HEADING = re.compile(
+    r"^[ \t]*(?:(?:section|article|clause)[ \t]+)?(?:\d+(?:\.\d+)*|[IVXLC]+|\([a-z0-9]+\))[\.\):]?[ \t]+(?=\S)",
+    re.IGNORECASE | re.MULTILINE,
+)
+BLANK_LINES = re.compile(r"\n[ \t]*\n+")
+WHITESPACE = re.compile(r"\s+")
+
+
+# -------------------------
+# Clause helpers
+# -------------------------
+def split_clauses(contract_text: str) -> List[str]:
+    """Split contract text into clauses on numbered headings, falling back to paragraphs."""
+    text = contract_text.strip()
+    if not text:
+        return []
+
+    starts = [m.start() for m in CLAUSE_HEADING.finditer(text)]
+    if len(starts) >= 2:
+        bounds = ([0] if starts[0] > 0 else []) + starts + [len(text)]
+        chunks = [text[a:b] for a, b in zip(bounds, bounds[1:])]
+    else:
+        chunks = BLANK_LINES.split(text)
+
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+
+def normalize_clause(clause: str) -> str:
+    return WHITESPACE.sub(" ", clause).strip().lower()
+
+
+def clause_hash(clause: str) -> str:
+    return hashlib.sha1(normalize_clause(clause).encode("utf-8")).hexdigest()
+
+
+def clause_title(clause: str, limit: int = 80) -> str:
+    first_line = clause.strip().splitlines()[0] if clause.strip() else ""
+    return first_line if len(first_line) <= limit else first_line[:limit].rstrip() + "…"
+
+
+def clause_shape(clause: str) -> str:
+    """Structural key of a clause: its first few normalized words (usually the heading)."""
+    return " ".join(normalize_clause(clause).split()[:4])
+
+
+def structural_similarity(old_clauses: List[str], new_clauses: List[str]) -> float:
+    """Score in [0, 1] combining heading order and exact clause overlap."""
+    if not old_clauses or not new_clauses:
+        return 0.0
+    shape_ratio = difflib.SequenceMatcher(
+        None, [clause_shape(c) for c in old_clauses], [clause_shape(c) for c in new_clauses], autojunk=False
+    ).ratio()
+    old_hashes = {clause_hash(c) for c in old_clauses}
+    new_hashes = {clause_hash(c) for c in new_clauses}
+    overlap = len(old_hashes & new_hashes) / len(old_hashes | new_hashes)
+    return 0.7 * shape_ratio + 0.3 * overlap
+
+
+def same_parties(old_company: str, new_company: str) -> bool:
+    """Parties match when both names normalize to the same string, or either is unknown."""
+    if not old_company or not new_company:
+        return True
+    return normalize_clause(old_company).strip(" .,") == normalize_clause(new_company).strip(" .,")
+
+
+# -------------------------
+# Clause-level diff
+# -------------------------
+@dataclass
+class ClauseDiff:
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    modified: List[Tuple[str, str]] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed or self.modified)
+
+    def describe(self) -> str:
+        return (f"{len(self.modified)} modified, {len(self.added)} added, "
+                f"{len(self.removed)} removed, {self.unchanged} unchanged")
+
+    def changed_text(self) -> str:
+        """Text of the changed clauses only, in the form sent through parse_contract/analyze_risks."""
+        parts = []
+        for old, new in self.modified:
+            parts.append(f"[MODIFIED CLAUSE — previously: \"{clause_title(old)}\"]\n{new}")
+        for clause in self.added:
+            parts.append(f"[NEW CLAUSE]\n{clause}")
+        for clause in self.removed:
+            parts.append(f"[REMOVED CLAUSE — no longer in the contract]\n{clause}")
+        return "\n\n".join(parts)
+
+    def summary(self) -> str:
+        """Markdown "what changed" section."""
+        if not self.changed:
+            return "No clause changes since the previous version."
+        lines = []
+        for old, new in self.modified:
+            lines.append(f"- **Modified:** {clause_title(new)}")
+        for clause in self.added:
+            lines.append(f"- **Added:** {clause_title(clause)}")
+        for clause in self.removed:
+            lines.append(f"- **Removed:** {clause_title(clause)}")
+        lines.append(f"- {self.unchanged} clause(s) unchanged")
+        return "\n".join(lines)
+
+
+def diff_clauses(old_clauses: List[str], new_clauses: List[str]) -> ClauseDiff:
+    """Diff two clause lists, pairing replaced clauses as modifications when they are similar."""
+    diff = ClauseDiff()
+    matcher = difflib.SequenceMatcher(
+        None, [clause_hash(c) for c in old_clauses], [clause_hash(c) for c in new_clauses], autojunk=False
+    )
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            diff.unchanged += i2 - i1
+        elif op == "delete":
+            diff.removed.extend(old_clauses[i1:i2])
+        elif op == "insert":
+            diff.added.extend(new_clauses[j1:j2])
+        else:
+            old_block, new_block = old_clauses[i1:i2], new_clauses[j1:j2]
+            for old, new in zip(old_block, new_block):
+                ratio = difflib.SequenceMatcher(None, normalize_clause(old), normalize_clause(new)).ratio()
+                if ratio >= MODIFIED_CLAUSE_THRESHOLD:
+                    diff.modified.append((old, new))
+                else:
+                    diff.removed.append(old)
+                    diff.added.append(new)
+            diff.removed.extend(old_block[len(new_block):])
+            diff.added.extend(new_block[len(old_block):])
+    return diff
+
+
+def task_outputs_by_name(result) -> Dict[str, str]:
+    """Map task name -> raw output for a finished crew run."""
+    outputs = {}
+    for output in getattr(result, "tasks_output", None) or []:
+        if output.name:
+            outputs[output.name] = output.raw
+    return outputs
+
+
+# -------------------------
+# Version store
+# -------------------------
+@dataclass
+class ContractVersion:
+    id: int
+    family_id: str
+    version: int
+    mode: str
+    user_email: str
+    company_name: str
+    clauses: List[str]
+    analysis: Dict[str, str]
+    created_at: float
+
+
+class ContractVersionStore:
+    """SQLite-backed history of reviewed contracts, grouped into revision families."""
+
+    def __init__(self, path: str = VERSIONS_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS versions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    family_id TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    mode TEXT NOT NULL,
+                    user_email TEXT NOT NULL,
+                    company_name TEXT NOT NULL,
+                    clauses TEXT NOT NULL,
+                    analysis TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_versions_owner ON versions (user_email, mode)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def _row_to_version(row) -> ContractVersion:
+        return ContractVersion(
+            id=row[0], family_id=row[1], version=row[2], mode=row[3], user_email=row[4],
+            company_name=row[5], clauses=json.loads(row[6]), analysis=json.loads(row[7]), created_at=row[8],
+        )
+
+    def latest_versions(self, user_email: str, mode: str) -> List[ContractVersion]:
+        """Latest version of every contract family for this user and mode."""
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute(
+                """
+                SELECT v.* FROM versions v
+                JOIN (SELECT family_id, MAX(version) AS version FROM versions
+                      WHERE user_email = ? AND mode = ? GROUP BY family_id) latest
+                  ON v.family_id = latest.family_id AND v.version = latest.version
+                """,
+                (user_email, mode),
+            ).fetchall()
+        return [self._row_to_version(row) for row in rows]
+
+    def find_revision(self, user_email: str, mode: str, company_name: str,
+                      clauses: List[str]) -> Optional[ContractVersion]:
+        """Return the earlier version this upload most likely revises, if any."""
+        best, best_score = None, REVISION_THRESHOLD
+        for candidate in self.latest_versions(user_email, mode):
+            if not same_parties(candidate.company_name, company_name):
+                continue
+            score = structural_similarity(candidate.clauses, clauses)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def save_version(self, user_email: str, mode: str, company_name: str, clauses: List[str],
+                     analysis: Dict[str, str], previous: Optional[ContractVersion] = None) -> ContractVersion:
+        family_id = previous.family_id if previous else uuid.uuid4().hex
+        version = previous.version + 1 if previous else 1
+        created_at = time.time()
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                """
+                INSERT INTO versions (family_id, version, mode, user_email, company_name, clauses, analysis, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (family_id, version, mode, user_email, company_name,
+                 json.dumps(clauses), json.dumps(analysis), created_at),
+            )
+        return ContractVersion(cursor.lastrowid, family_id, version, mode, user_email,
+                               company_name, clauses, analysis, created_at)
+
+
+def merge_analysis(previous: Optional[ContractVersion], outputs: Dict[str, str],
+                   summary: str, diff: Optional[ClauseDiff] = None) -> Dict[str, str]:
+    """Combine the cached analysis of the previous version with the outputs for the changed clauses."""
+    if previous is None or diff is None:
+        merged = dict(outputs)
+    else:
+        merged = dict(previous.analysis)
+        header = f"## Amendment (version {previous.version + 1})\n"
+        for name, raw in outputs.items():
+            if name in ("parse_contract", "analyze_risks") and merged.get(name):
+                merged[name] = f"{merged[name]}\n\n{header}{raw}"
+            else:
+                merged[name] = raw
+        merged["what_changed"] = diff.summary()
+    merged["summary"] = summary
+    return merged
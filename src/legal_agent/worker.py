@@ -0,0 +1,233 @@
+"""
+Crew worker pool.
+
+Runs contract reviews outside the gunicorn web workers. A dispatcher claims
+queued jobs from the local result store and hands them to a pool of worker
+processes; each child is recycled after a fixed number of jobs so leaks in
+CrewAI, pdfplumber or googleapiclient cannot accumulate. The dispatcher writes
+a heartbeat row the web tier reads from /workers/health.
+
+Start it with `python -m src.legal_agent.worker` or the `worker` command in main.py,
+and set CREW_EXECUTION=queue on the web tier so /upload enqueues instead of
+running the crew inline.
+
+The queue is not claimed in arrival order: short contracts go first, with
+aging so long ones are not starved. See scheduling.py.
+
+Several dispatchers, one per dyno, can share the queue. Each claimed job is
+leased and the lease is renewed with the heartbeat. When a dyno goes away
+mid-job, its leases expire and another dispatcher queues those jobs again.
+See coordination.py.
+"""
+
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.legal_agent import metrics
+from src.legal_agent.coordination import CoordinationStore, coordinator, reassign_expired
+from src.legal_agent.logs import setup_logging
+from src.legal_agent.scheduling import BASE_SECONDS, CALIBRATION_JOBS, calibration, claim_aging
+from src.legal_agent.store import DATA_DIR, ResultStore
+
+WORKER_PROCESSES = int(os.getenv("CREW_WORKER_PROCESSES", "2"))
+MAX_JOBS_PER_CHILD = int(os.getenv("CREW_MAX_JOBS_PER_CHILD", "10"))
+POLL_INTERVAL = float(os.getenv("CREW_WORKER_POLL_INTERVAL", "1.0"))
+HEARTBEAT_INTERVAL = float(os.getenv("CREW_WORKER_HEARTBEAT_INTERVAL", "5.0"))
+# Crew timeout plus slack for delivery; a job still running after this lost its process
+JOB_DEADLINE = float(os.getenv("CREW_JOB_DEADLINE", str(15 * 60 + 120)))
+JOBS_DIR = os.path.join(DATA_DIR, "jobs")
+# Written into the job's workspace by the child running it
+PID_FILE = "worker.pid"
+
+
+def job_workspace(job_id: str) -> str:
+    """Per-job working directory so concurrent crews don't overwrite each other's output files."""
+    path = os.path.join(JOBS_DIR, job_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _init_child():
+    # The dispatcher handles shutdown; children finish their current job
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_logging()
+
+
+def _run_job(job_id: str) -> dict:
+    """Entry point inside a pool process."""
+    # Imported here so the dispatcher itself never loads CrewAI
+    from src.legal_agent.pipeline import process_job
+
+    os.chdir(job_workspace(job_id))
+    # Lets the dispatcher kill this child if the job overruns JOB_DEADLINE
+    with open(PID_FILE, "w") as f:
+        f.write(str(os.getpid()))
+    return process_job(job_id)
+
+
+class WorkerPool:
+    def __init__(self, processes: int = WORKER_PROCESSES, max_jobs_per_child: int = MAX_JOBS_PER_CHILD,
+                 result_store: ResultStore = None, coordination: CoordinationStore = None):
+        self.processes = processes
+        self.max_jobs_per_child = max_jobs_per_child
+        self.result_store = result_store or ResultStore()
+        self.coordination = coordination or coordinator()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.started_at = time.time()
+        self.in_flight = {}
+        self.completed = 0
+        self.failed = 0
+        self._stopping = False
+        self._last_heartbeat = 0.0
+        # Set once a child was killed; its task never completes, so the pool can only be terminated
+        self._killed = False
+
+    def stop(self, *args):
+        print("🛑 Worker pool stopping after in-flight jobs finish")
+        self._stopping = True
+
+    def _heartbeat(self, force: bool = False):
+        now = time.time()
+        if force or now - self._last_heartbeat >= HEARTBEAT_INTERVAL:
+            self.result_store.heartbeat(self.worker_id, self.processes, len(self.in_flight),
+                                        self.completed, self.failed, self.started_at)
+            self._last_heartbeat = now
+            try:
+                self._renew_leases()
+                reassign_expired(self.result_store, self.coordination)
+            except OSError as e:
+                # An unreachable coordination server must not stop the jobs already running here
+                print(f"⚠️ Coordination store unavailable: {e}")
+
+    def _renew_leases(self):
+        held = set(self.coordination.renew(list(self.in_flight), self.worker_id))
+        for job_id in set(self.in_flight) - held:
+            print(f"⚠️ Lease on job {job_id} expired while it was still running here; "
+                  f"another worker may have picked it up")
+
+    def _acquire(self, job_id: str) -> bool:
+        """Lease a claimed job; False if another worker still holds it and is running it."""
+        try:
+            if not self.coordination.acquire(job_id, self.worker_id):
+                print(f"⚠️ Job {job_id} is still leased by another worker, leaving it to that worker")
+                return False
+        except OSError as e:
+            print(f"⚠️ Could not lease job {job_id}, it will not be reassigned if this worker dies: {e}")
+        return True
+
+    def _release(self, job_id: str):
+        try:
+            self.coordination.release(job_id, self.worker_id)
+            self.coordination.release_submission(job_id)
+        except OSError as e:
+            print(f"⚠️ Could not release job {job_id} in the coordination store: {e}")
+
+    def _reap(self):
+        for job_id, (async_result, started) in list(self.in_flight.items()):
+            if async_result.ready():
+                del self.in_flight[job_id]
+                try:
+                    payload = async_result.get()
+                    ok = payload.get("success")
+                except Exception as e:
+                    # The job raised inside the child before it could record its own status
+                    self.result_store.set_status(job_id, "failed", str(e))
+                    ok = False
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._record_duration(job_id, ok)
+                self._release(job_id)
+                print(f"{'✅' if ok else '❌'} Job {job_id} finished")
+            elif time.time() - started > JOB_DEADLINE:
+                # A child that crashed or hung mid-job never reports back; make sure it is gone
+                # before the lease and submission key let anyone else start the same job
+                self._kill_child(job_id)
+                del self.in_flight[job_id]
+                self.failed += 1
+                self.result_store.set_status(job_id, "failed", "Worker process lost")
+                self._release(job_id)
+                print(f"💀 Job {job_id} lost with its worker process")
+
+    def _kill_child(self, job_id: str):
+        path = os.path.join(JOBS_DIR, job_id, PID_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                pid = int(f.read())
+        except (OSError, ValueError):
+            # The job never started in a child
+            return
+        try:
+            os.kill(pid, signal.SIGKILL)
+            self._killed = True
+            print(f"🔪 Killed worker process {pid}, still running job {job_id} past its deadline")
+        except ProcessLookupError:
+            pass
+        os.remove(path)
+
+    def _record_duration(self, job_id: str, ok: bool):
+        timing = self.result_store.finish_job(job_id)
+        if ok and timing and timing["estimated_seconds"]:
+            ratio = timing["actual_seconds"] / timing["estimated_seconds"]
+            metrics.JOB_DURATION_RATIO.observe(ratio, mode=timing["mode"])
+            print(f"⏱️ Job {job_id} took {timing['actual_seconds']:.0f}s, "
+                  f"estimated {timing['estimated_seconds']:.0f}s ({ratio:.2f}x)")
+
+    def serve(self):
+        setup_logging()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        # spawn keeps children free of the dispatcher's threads and SQLite handles
+        ctx = multiprocessing.get_context("spawn")
+        pool = ctx.Pool(self.processes, initializer=_init_child, maxtasksperchild=self.max_jobs_per_child)
+        print(f"👷 Worker {self.worker_id}: {self.processes} processes, "
+              f"{self.max_jobs_per_child} jobs per child")
+        try:
+            while not self._stopping or self.in_flight:
+                self._reap()
+                while not self._stopping and len(self.in_flight) < self.processes:
+                    job_id = self.result_store.claim_next_job(self.worker_id, claim_aging(),
+                                                              BASE_SECONDS["legal"])
+                    if job_id is None:
+                        break
+                    print(f"📥 Claimed job {job_id}")
+                    if not self._acquire(job_id):
+                        continue
+                    self.in_flight[job_id] = (pool.apply_async(_run_job, (job_id,)), time.time())
+                self._heartbeat()
+                time.sleep(POLL_INTERVAL)
+        finally:
+            if self._killed:
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
+            self.result_store.remove_worker(self.worker_id)
+
+
+def worker_health(result_store: ResultStore = None) -> dict:
+    """Snapshot of worker heartbeats for the web tier."""
+    result_store = result_store or ResultStore()
+    now = time.time()
+    workers = result_store.list_workers()
+    for worker in workers:
+        worker["alive"] = now - worker["heartbeat_at"] < 3 * HEARTBEAT_INTERVAL
+    return {
+        "workers": workers,
+        "alive": sum(1 for w in workers if w["alive"]),
+        "capacity": sum(w["processes"] for w in workers if w["alive"]),
+        "in_flight": sum(w["in_flight"] for w in workers if w["alive"]),
+        "queue_depth": result_store.queue_depth(),
+        "estimates": calibration(result_store.duration_samples(CALIBRATION_JOBS)),
+    }
+
+
+if __name__ == "__main__":
+    WorkerPool().serve()
@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from src.legal_agent import admission
+from src.legal_agent.admission import AdmissionController, AdmissionRejected, admitted
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def controller(tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(admission, "ADMIT_BURST", 3.0)
+    monkeypatch.setattr(admission, "ADMIT_RATE_PER_HOUR", 10.0)
+    monkeypatch.setattr(admission, "ADMIT_MAX_GLOBAL", 8)
+    monkeypatch.setattr(admission, "ADMIT_MAX_PER_SESSION", 1)
+    monkeypatch.setattr(admission, "ADMIT_MAX_QUEUE", 20)
+    return AdmissionController(str(tmp_path / "admission.db"))
+
+
+def upload(controller, session="s1", email="a@example.com", queue_depth=0):
+    controller.release(controller.admit(session, email, queue_depth))
+
+
+def test_burst_then_rate_limit(controller):
+    for _ in range(3):
+        upload(controller)
+    with pytest.raises(AdmissionRejected) as rejected:
+        upload(controller)
+    assert rejected.value.reason == "rate_limit"
+    assert rejected.value.status_code == 429
+    # One token comes back every 6 minutes at 10 per hour
+    assert rejected.value.retry_after == 360
+
+
+def test_bucket_refills_over_time_up_to_the_burst(controller, clock):
+    for _ in range(3):
+        upload(controller)
+    clock[0] += 360
+    upload(controller)
+    with pytest.raises(AdmissionRejected):
+        upload(controller)
+
+    clock[0] += 24 * 3600
+    for _ in range(3):
+        upload(controller)
+    with pytest.raises(AdmissionRejected):
+        upload(controller)
+
+
+def test_buckets_are_per_user_and_case_insensitive(controller):
+    for _ in range(3):
+        upload(controller, email="A@Example.com ")
+    with pytest.raises(AdmissionRejected):
+        upload(controller, email="a@example.com")
+    upload(controller, email="b@example.com")
+
+
+def test_rejection_does_not_spend_a_token(controller):
+    lease = controller.admit("s1", "a@example.com")
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("s1", "a@example.com")
+    assert rejected.value.reason == "session_limit"
+    controller.release(lease)
+    # The lease took one token and the refused upload none
+    upload(controller)
+    upload(controller)
+    with pytest.raises(AdmissionRejected):
+        upload(controller)
+
+
+def test_global_cap(controller, monkeypatch):
+    monkeypatch.setattr(admission, "ADMIT_MAX_GLOBAL", 2)
+    leases = [controller.admit(f"s{i}", f"u{i}@example.com") for i in range(2)]
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("s3", "u3@example.com")
+    assert rejected.value.reason == "global_limit"
+    controller.release(leases[0])
+    controller.admit("s3", "u3@example.com")
+
+
+def test_full_queue_is_refused(controller):
+    with pytest.raises(AdmissionRejected) as rejected:
+        upload(controller, queue_depth=20)
+    assert rejected.value.reason == "queue_full"
+    upload(controller, queue_depth=19)
+
+
+def test_abandoned_leases_expire(controller, clock):
+    controller.admit("s1", "a@example.com")
+    assert controller.in_flight() == 1
+    clock[0] += admission.ADMIT_LEASE_TTL + 1
+    assert controller.in_flight() == 0
+    upload(controller)
+
+
+def test_admitted_releases_the_lease(controller):
+    with pytest.raises(RuntimeError):
+        with admitted("s1", "a@example.com", controller=controller):
+            assert controller.in_flight() == 1
+            raise RuntimeError("review failed")
+    assert controller.in_flight() == 0
@@ -0,0 +1,35 @@
+import pytest
+
+from src.legal_agent.parties import detect_company_name, synthetic_contract
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("This Agreement is made by and between Example Media Holdings LLC and the Influencer.",
+     "Example Media Holdings LLC"),
+    ("This contract is between Company A and Client B.", "Company A"),
+    # The influencer is named first, so the company is the other party
+    ("Agreement between the Influencer and Foo LLC.", "Foo LLC"),
+    ("This Agreement is made by and between the Creator and Foo Media Pty Ltd (the Brand).", "Foo Media Pty Ltd"),
+    ("Agreement between the Influencer and Acme, Inc., a Delaware corporation.", "Acme, Inc."),
+    ("Agreement between the Talent and Bank of Example Ltd. (the Bank)", "Bank of Example Ltd."),
+])
+def test_party_phrase(text, expected):
+    assert detect_company_name(text) == expected
+
+
+def test_role_is_never_part_of_the_name():
+    assert detect_company_name("The Influencer and Foo LLC agree as follows.") == "Foo LLC"
+
+
+def test_defined_term_is_not_a_name():
+    assert detect_company_name("Agreement between the Influencer and the Company.") == ""
+
+
+def test_suffix_scan_without_a_party_phrase():
+    assert detect_company_name("Acme Holdings, Inc. (the Brand) shall pay the fee.") == "Acme Holdings, Inc."
+
+
+def test_only_the_preamble_is_searched():
+    text = synthetic_contract(20_000, preamble=False) + " Hidden Corp. shall pay."
+    assert detect_company_name(text) == ""
+    assert detect_company_name(text, window=len(text)) == "Hidden Corp."
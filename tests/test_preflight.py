@@ -0,0 +1,72 @@
+import pytest
+
+from src.legal_agent.preflight import NotAContract, check_contract, classify
+
+CONTRACT = (
+    "This Agreement is entered into as of the Effective Date by and between the parties. WHEREAS the Company "
+    "wishes to engage the Consultant, the parties hereby agree as follows. The Consultant shall indemnify the "
+    "Company against any breach. This Agreement is governed by the governing law of Delaware. Either party may "
+    "terminate this Agreement on notice. IN WITNESS WHEREOF the parties have signed."
+)
+INVOICE = (
+    "INVOICE Invoice number 1042. Bill to: Acme Inc. Qty 3, unit price $100. Subtotal $300. Sales tax $24. "
+    "Amount due $324. Payment due within 30 days. Due date 2026-11-01."
+)
+PITCH_DECK = (
+    "The problem: creators lose money. Our solution: one dashboard. Market size and total addressable market "
+    "are large. Traction: 10k users. Business model: subscriptions. Our team. Competitive landscape. Roadmap. "
+    "Seed round, the ask: $2M. Use of funds."
+)
+CREATOR_CONTRACT = CONTRACT + (
+    " The Influencer shall publish two sponsored Instagram posts and one TikTok video as deliverables for the "
+    "campaign, and grants the brand usage rights for 90 days."
+)
+
+
+def test_contract_passes():
+    result = classify(CONTRACT)
+    assert result.is_contract and result.kind == "contract"
+    assert result.suggested_mode == "legal"
+
+
+@pytest.mark.parametrize("text, kind", [(INVOICE, "invoice"), (PITCH_DECK, "pitch_deck")])
+def test_non_contracts_are_rejected(text, kind):
+    with pytest.raises(NotAContract) as rejected:
+        check_contract(text, "legal")
+    assert rejected.value.kind == kind
+    assert rejected.value.status_code == 422
+
+
+def test_text_without_any_signals_is_other():
+    result = classify("Grocery list: eggs, milk, bread. Call mum on Sunday.")
+    assert not result.is_contract and result.kind == "other"
+
+
+def test_terms_count_once_however_often_they_occur():
+    assert classify("shall " * 1000).signals["contract"] == 1
+    assert not classify("shall " * 1000).is_contract
+
+
+def test_invoice_that_quotes_a_few_contract_terms_is_still_an_invoice():
+    # Three contract terms are enough to pass, unless invoice terms outnumber them
+    text = INVOICE + " Subject to the agreement; late payment is a breach; governing law applies."
+    result = classify(text)
+    assert result.signals["contract"] < result.signals["invoice"]
+    assert not result.is_contract and result.kind == "invoice"
+
+
+def test_contract_with_many_terms_passes_despite_invoice_terms():
+    result = classify(CONTRACT + " " + INVOICE)
+    assert result.is_contract
+
+
+def test_signal_words_inside_other_words_do_not_count():
+    # "shallow", "vatican", "hashtag #adventure" contain signal terms but are not them
+    result = classify("shallow vatican #adventure partyline tamarind")
+    assert result.signals == {"contract": 0, "invoice": 0, "pitch_deck": 0, "creator": 0}
+
+
+def test_creator_terms_suggest_creator_mode_without_switching():
+    result = check_contract(CREATOR_CONTRACT, "legal")
+    assert result.is_contract
+    assert result.suggested_mode == "creator"
@@ -0,0 +1,76 @@
+from datetime import date, timedelta
+
+import pytest
+
+from src.legal_agent.recurrence import base_title, cadence, compress_recurring, rrule
+
+
+def weekly(titles, start=date(2026, 1, 5), **extra):
+    return [{"summary": title, "start_date": (start + timedelta(weeks=i)).isoformat(), **extra}
+            for i, title in enumerate(titles)]
+
+
+@pytest.mark.parametrize("summary, expected", [
+    ("Week 3: Unboxing video", "Unboxing video"),
+    ("Unboxing (3 of 12)", "Unboxing"),
+    ("Reel - Week 4", "Reel"),
+    ("Story Part 2", "Story"),
+    ("TikTok post #3", "TikTok post"),
+    ("Instagram Post 3", "Instagram Post"),
+    ("Review 3/12", "Review"),
+    # A number without a counter label is part of the title
+    ("Top 10", "Top 10"),
+    ("Campaign 2026", "Campaign 2026"),
+    ("Top 10 list #4", "Top 10 list"),
+])
+def test_base_title(summary, expected):
+    assert base_title(summary) == expected
+
+
+def test_cadence():
+    assert cadence([date(2026, 1, 1), date(2026, 1, 15), date(2026, 1, 29)]) == ("WEEKLY", 2)
+    assert cadence([date(2026, 1, 1), date(2026, 1, 4), date(2026, 1, 7)]) == ("DAILY", 3)
+    assert cadence([date(2026, 1, 31), date(2026, 3, 31), date(2026, 5, 31)]) == ("MONTHLY", 2)
+    assert cadence([date(2026, 1, 1), date(2026, 1, 8), date(2026, 1, 20)]) is None
+
+
+def test_weekly_run_becomes_one_event():
+    [event] = compress_recurring(weekly([f"TikTok post #{i}" for i in range(1, 13)]))
+    assert event["summary"] == "TikTok post"
+    assert event["start_date"] == "2026-01-05"
+    assert rrule(event["recurrence"]) == "FREQ=WEEKLY;INTERVAL=1;COUNT=12"
+
+
+def test_incrementing_bare_number_is_a_counter():
+    [event] = compress_recurring(weekly(["TikTok 1", "TikTok 2", "TikTok 3"]))
+    assert event["summary"] == "TikTok"
+    assert event["recurrence"]["count"] == 3
+
+
+def test_repeated_number_stays_in_the_title():
+    [event] = compress_recurring(weekly(["Campaign 2026"] * 4))
+    assert event["summary"] == "Campaign 2026"
+
+
+def test_numbers_that_do_not_count_up_are_not_grouped():
+    deliverables = weekly(["Top 10", "Top 20", "Top 10"])
+    assert compress_recurring(deliverables) == deliverables
+
+
+def test_short_or_irregular_runs_are_kept():
+    assert compress_recurring(weekly(["Reel #1", "Reel #2"])) == weekly(["Reel #1", "Reel #2"])
+    irregular = [{"summary": "Reel", "start_date": day} for day in ("2026-01-01", "2026-01-08", "2026-01-20")]
+    assert compress_recurring(irregular) == irregular
+
+
+def test_different_times_are_separate_series():
+    deliverables = weekly(["Live"] * 3, start_time="10:00") + weekly(["Live"] * 3, start_time="18:00")
+    events = compress_recurring(deliverables)
+    assert [(event["start_time"], event["recurrence"]["count"]) for event in events] == [("10:00", 3), ("18:00", 3)]
+
+
+def test_extraction_order_is_kept():
+    deliverables = [{"summary": "Kickoff call", "start_date": "2026-01-01"}] + weekly(["Reel"] * 3) + \
+        [{"summary": "Final report", "start_date": "2026-01-02"}, {"summary": "No date"}]
+    summaries = [event["summary"] for event in compress_recurring(deliverables)]
+    assert summaries == ["Kickoff call", "Reel", "Final report", "No date"]
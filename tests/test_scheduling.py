@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from src.legal_agent.scheduling import BASE_SECONDS, calibration, estimate_seconds
+from src.legal_agent.store import BlobStore, ResultStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultStore(str(tmp_path / "results.db"), BlobStore(str(tmp_path / "blobs")))
+
+
+@pytest.fixture
+def enqueue(store, monkeypatch):
+    def enqueue(name, estimated_seconds, created_at, mode="legal"):
+        estimate = None if estimated_seconds is None else {"estimated_seconds": estimated_seconds}
+        with monkeypatch.context() as patch:
+            patch.setattr(time, "time", lambda: created_at)
+            return store.create_job(f"{name}@example.com", mode, b"%PDF-1.7", status="queued", estimate=estimate,
+                                    job_id=name)
+    return enqueue
+
+
+def claims(store, aging, default_cost=BASE_SECONDS["legal"]):
+    order = []
+    while (job_id := store.claim_next_job("worker", aging, default_cost)) is not None:
+        order.append(job_id)
+    return order
+
+
+def test_estimate_grows_with_size_and_mode():
+    short, long = estimate_seconds("legal", 2, 4_000), estimate_seconds("legal", 80, 200_000)
+    assert short < long
+    assert estimate_seconds("creator", 2, 4_000) > short
+    # Scanned pages count as text to read plus the OCR itself
+    assert estimate_seconds("legal", 2, 0, ocr_pages=2) > estimate_seconds("legal", 2, 0)
+    assert estimate_seconds("unknown", 2, 4_000) == short
+
+
+def test_fifo_claims_in_arrival_order(store, enqueue):
+    enqueue("msa", 900, created_at=1000)
+    enqueue("letter", 100, created_at=1001)
+    assert claims(store, aging=None) == ["msa", "letter"]
+
+
+def test_shortest_job_first(store, enqueue):
+    enqueue("msa", 900, created_at=1000)
+    enqueue("nda", 300, created_at=1001)
+    enqueue("letter", 100, created_at=1002)
+    assert claims(store, aging=1.0) == ["letter", "nda", "msa"]
+
+
+def test_aging_lets_a_long_job_overtake_newer_short_ones(store, enqueue):
+    # The MSA has waited 850s, more than the 800s it is estimated to take over the letter
+    enqueue("msa", 900, created_at=1000)
+    enqueue("letter", 100, created_at=1850)
+    enqueue("other-letter", 100, created_at=1851)
+    assert claims(store, aging=1.0) == ["msa", "letter", "other-letter"]
+
+
+def test_equal_scores_fall_back_to_arrival_order(store, enqueue):
+    enqueue("first", 100, created_at=1000)
+    enqueue("second", 100, created_at=1000)
+    assert claims(store, aging=1.0) == ["first", "second"]
+
+
+def test_jobs_without_estimate_use_the_default_cost(store, enqueue):
+    enqueue("unknown", None, created_at=1000)
+    enqueue("short", 10, created_at=1001)
+    enqueue("long", 1000, created_at=1002)
+    assert claims(store, aging=1.0, default_cost=500) == ["short", "unknown", "long"]
+
+
+def test_claim_marks_the_job_processing(store, enqueue):
+    enqueue("only", 100, created_at=1000)
+    assert store.claim_next_job("worker-1", 1.0) == "only"
+    job = store.get_job("only")
+    assert job["status"] == "processing"
+    assert store.claim_next_job("worker-2", 1.0) is None
+
+
+def test_calibration_fits_base_and_rate():
+    samples = [{"mode": "legal", "pages": 0, "chars": chars, "ocr_pages": 0, "estimated_seconds": 100.0,
+                "actual_seconds": 50 + 2 * chars / 1000} for chars in (1_000, 10_000, 40_000)]
+    report = calibration(samples)["legal"]
+    assert report["jobs"] == 3
+    assert report["fitted"] == {"base_seconds": 50.0, "seconds_per_kchar": 2.0}
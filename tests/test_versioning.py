@@ -0,0 +1,102 @@
+import pytest
+
+from src.legal_agent.versioning import (
+    ContractVersionStore, diff_clauses, merge_analysis, same_parties, split_clauses, structural_similarity,
+)
+
+ORIGINAL = """MASTER SERVICES AGREEMENT
+
+1. Services. The Consultant shall provide the services in Schedule A.
+2. Fees. The Company shall pay $10,000 per month within 30 days of invoice.
+3. Term. This Agreement runs for twelve months from the Effective Date.
+4. Confidentiality. Each party shall keep the other's information confidential.
+"""
+AMENDED = ORIGINAL.replace("$10,000 per month within 30 days", "$12,000 per month within 45 days") + (
+    "5. Non-solicitation. Neither party shall solicit the other's staff for two years.\n")
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ContractVersionStore(str(tmp_path / "versions.db"))
+
+
+def test_split_clauses_on_numbered_headings():
+    clauses = split_clauses(ORIGINAL)
+    assert clauses[0] == "MASTER SERVICES AGREEMENT"
+    assert [clause.split()[0] for clause in clauses[1:]] == ["1.", "2.", "3.", "4."]
+
+
+def test_split_clauses_falls_back_to_paragraphs():
+    assert split_clauses("First paragraph.\n\nSecond paragraph.\n  \nThird.") == [
+        "First paragraph.", "Second paragraph.", "Third."]
+
+
+def test_diff_pairs_similar_clauses_as_modified():
+    diff = diff_clauses(split_clauses(ORIGINAL), split_clauses(AMENDED))
+    assert [new.split(".")[1].strip() for _, new in diff.modified] == ["Fees"]
+    assert diff.added and "Non-solicitation" in diff.added[0]
+    assert not diff.removed and diff.unchanged == 4
+    assert "[MODIFIED CLAUSE" in diff.changed_text() and "[NEW CLAUSE]" in diff.changed_text()
+
+
+def test_whitespace_only_changes_are_unchanged():
+    diff = diff_clauses(split_clauses(ORIGINAL), split_clauses(ORIGINAL.replace(" ", "  ")))
+    assert not diff.changed
+    assert diff.summary() == "No clause changes since the previous version."
+
+
+def test_same_parties():
+    assert same_parties("Acme Inc.", "acme inc")
+    assert same_parties("", "Acme Inc.")
+    assert not same_parties("Acme Inc.", "Globex LLC")
+
+
+def test_find_revision_matches_family(store):
+    first = store.save_version("a@example.com", "legal", "Acme Inc.", split_clauses(ORIGINAL), {"summary": "v1"})
+    previous = store.find_revision("a@example.com", "legal", "Acme Inc", split_clauses(AMENDED))
+    assert previous is not None and previous.id == first.id
+    assert structural_similarity(first.clauses, split_clauses(AMENDED)) >= 0.6
+
+    second = store.save_version("a@example.com", "legal", "Acme Inc.", split_clauses(AMENDED), {"summary": "v2"},
+                                previous=previous)
+    assert (second.family_id, second.version) == (first.family_id, 2)
+    assert [v.version for v in store.latest_versions("a@example.com", "legal")] == [2]
+
+
+def test_find_revision_ignores_other_users_modes_and_parties(store):
+    store.save_version("a@example.com", "legal", "Acme Inc.", split_clauses(ORIGINAL), {"summary": "v1"})
+    assert store.find_revision("b@example.com", "legal", "Acme Inc.", split_clauses(AMENDED)) is None
+    assert store.find_revision("a@example.com", "creator", "Acme Inc.", split_clauses(AMENDED)) is None
+    assert store.find_revision("a@example.com", "legal", "Globex LLC", split_clauses(AMENDED)) is None
+    assert store.find_revision("a@example.com", "legal", "Acme Inc.", ["1. Something else entirely."]) is None
+
+
+def test_merge_without_previous_version_is_the_new_outputs():
+    merged = merge_analysis(None, {"parse_contract": "parsed"}, "summary")
+    assert merged == {"parse_contract": "parsed", "summary": "summary"}
+
+
+def test_merge_appends_amendment_to_cumulative_tasks(store):
+    previous = store.save_version("a@example.com", "legal", "Acme Inc.", split_clauses(ORIGINAL), {
+        "parse_contract": "Original terms", "analyze_risks": "Original risks", "draft_email": "Old email",
+        "summary": "Old summary", "research": "Kept research",
+    })
+    diff = diff_clauses(previous.clauses, split_clauses(AMENDED))
+    merged = merge_analysis(previous, {"parse_contract": "Fee change", "analyze_risks": "Longer payment terms",
+                                       "draft_email": "New email"}, "New summary", diff)
+
+    assert merged["parse_contract"] == "Original terms\n\n## Amendment (version 2)\nFee change"
+    assert merged["analyze_risks"].startswith("Original risks\n\n## Amendment (version 2)\n")
+    # Other tasks are replaced; tasks that did not run keep their cached output
+    assert merged["draft_email"] == "New email"
+    assert merged["research"] == "Kept research"
+    assert merged["summary"] == "New summary"
+    assert merged["what_changed"] == diff.summary()
+
+
+def test_merge_replaces_an_empty_cumulative_output(store):
+    previous = store.save_version("a@example.com", "legal", "Acme Inc.", split_clauses(ORIGINAL),
+                                  {"analyze_risks": "", "summary": "Old"})
+    diff = diff_clauses(previous.clauses, split_clauses(AMENDED))
+    merged = merge_analysis(previous, {"analyze_risks": "New risks"}, "New", diff)
+    assert merged["analyze_risks"] == "New risks"